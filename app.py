@@ -1,30 +1,100 @@
 # Import the necessary libraries.
-# Playwright is used to crawl the Facebook Marketplace.
-from playwright.sync_api import sync_playwright
 # The os library is used to get the environment variables.
 import os
-# The time library is used to add a delay to the script.
+# The time library is used to time streamed crawls.
 import time
-# The BeautifulSoup library is used to parse the HTML.
-from bs4 import BeautifulSoup
+# The logging library reports what the API is doing, filtered by LOG_LEVEL.
+import logging
+# The asyncio library is used to wait without blocking the event loop.
+import asyncio
 # The FastAPI library is used to create the API.
-from fastapi import HTTPException, FastAPI
+from fastapi import HTTPException, FastAPI, Response
 # The JSON library is used to convert the data to JSON.
 import json
 # The uvicorn library is used to run the API.
 import uvicorn
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 #load credentials from .env file
-from decouple import config
-import re
+from decouple import config, Choices
+from typing import List, Optional
+from pydantic import BaseModel
+# The browser pool keeps logged-in browser contexts warm between requests.
+from browser_pool import BrowserPool, PoolTimeout
+# The cities module maps supported cities to Marketplace search URLs.
+import cities
+# The scheduler fans batches of searches out over the browser pool.
+import scheduler
+# Background crawl jobs, polled by ID.
+import job_queue
+from job_queue import CrawlRequest, JobQueueFull
+# Recent results per search, so repeated searches skip the crawl.
+from result_cache import ResultCache, MISS, STALE
+# The crawl engine drives Playwright asynchronously and parses the listings.
+import crawl_engine
+from crawl_engine import CrawlLimiter, CrawlQueueFull
+# Where listing cards can be parsed, see extraction.py.
+from extraction import BACKENDS
+# Crawled listings are upserted into the SQLite listing store and appended
+# to the Parquet listing dataset.
+from listing_store import ListingStore
+import listing_dataset
+# The latest fitted price model, used to score listings.
+import price_model
+# Prometheus metrics, served at /metrics.
+import metrics
+
+# DEBUG, INFO, WARNING or ERROR.
+logging.basicConfig(level=config('LOG_LEVEL', default='INFO').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger('app')
 
 email = config('EMAIL')
 password = config('PASSWORD')
 
+# Browser pool settings.
+POOL_SIZE = config('POOL_SIZE', default=2, cast=int)
+POOL_HEADLESS = config('POOL_HEADLESS', default=False, cast=bool)
+POOL_MAX_USES = config('POOL_MAX_USES', default=50, cast=int)
+POOL_ACQUIRE_TIMEOUT = config('POOL_ACQUIRE_TIMEOUT', default=120, cast=float)
+# How many crawls run at once, and how many may wait for a slot before we return 503.
+CRAWL_CONCURRENCY = config('CRAWL_CONCURRENCY', default=POOL_SIZE, cast=int)
+CRAWL_QUEUE_LIMIT = config('CRAWL_QUEUE_LIMIT', default=50, cast=int)
+# Navigations per minute to facebook.com across all crawls.
+CRAWL_RATE_PER_MINUTE = config('CRAWL_RATE_PER_MINUTE', default=30, cast=float)
+# Background crawl jobs: how many run at once, how many may wait, and how long finished jobs are kept (seconds).
+JOB_WORKERS = config('JOB_WORKERS', default=POOL_SIZE, cast=int)
+JOB_QUEUE_LIMIT = config('JOB_QUEUE_LIMIT', default=100, cast=int)
+JOB_RETENTION = config('JOB_RETENTION', default=3600, cast=float)
+# Jobs that found no free crawl slot or browser are retried this many times, first after JOB_RETRY_DELAY seconds.
+JOB_RETRIES = config('JOB_RETRIES', default=3, cast=int)
+JOB_RETRY_DELAY = config('JOB_RETRY_DELAY', default=5, cast=float)
+# Result cache: seconds results stay fresh (0 disables the cache), how many searches are kept,
+# seconds expired results may still be served while they are refreshed, and an optional file to persist to.
+RESULT_CACHE_TTL = config('RESULT_CACHE_TTL', default=600, cast=float)
+RESULT_CACHE_SIZE = config('RESULT_CACHE_SIZE', default=256, cast=int)
+RESULT_CACHE_STALE = config('RESULT_CACHE_STALE', default=0, cast=float)
+RESULT_CACHE_FILE = config('RESULT_CACHE_FILE', default='')
+# Where listing cards are parsed: 'bs4', 'lxml', 'selectolax' (Python) or 'dom' (inside the browser).
+EXTRACTION_BACKEND = config('EXTRACTION_BACKEND', default='bs4', cast=Choices(BACKENDS))
 
                  
 # Create an instance of the FastAPI class.
 app = FastAPI()
+# The browser pool is created at startup and closed at shutdown.
+pool = None
+# The limiter queues crawls once CRAWL_CONCURRENCY are in flight.
+limiter = CrawlLimiter(CRAWL_CONCURRENCY, CRAWL_QUEUE_LIMIT)
+# Spaces out batch navigations to the same domain.
+rate_limiter = scheduler.DomainRateLimiter(CRAWL_RATE_PER_MINUTE)
+# Runs the crawls submitted to /jobs; started with the browser pool.
+jobs = None
+# Listings of recent searches, keyed by the normalized search.
+cache = ResultCache(RESULT_CACHE_TTL, RESULT_CACHE_SIZE, RESULT_CACHE_STALE, RESULT_CACHE_FILE or None)
+# Reloads the price model whenever regression.py saves a new one.
+model_cache = price_model.ModelCache()
+# Results of the latest crawl, which /score can reuse.
+last_crawl = []
 # Configure CORS
 origins = [
     "http://localhost",
@@ -41,6 +111,45 @@ app.add_middleware(
 )
 
 
+# Launch the browser pool when the API starts.
+@app.on_event("startup")
+async def start_browser_pool():
+    global pool
+    pool = BrowserPool(
+        email,
+        password,
+        size=POOL_SIZE,
+        headless=POOL_HEADLESS,
+        max_uses=POOL_MAX_USES,
+        acquire_timeout=POOL_ACQUIRE_TIMEOUT,
+    )
+    await pool.start()
+
+# Start the crawl job workers once the pool is up.
+@app.on_event("startup")
+def start_job_queue():
+    global jobs
+    jobs = job_queue.JobQueue(_run_crawl_job, JOB_WORKERS, JOB_QUEUE_LIMIT, JOB_RETENTION,
+                              retry_errors=(CrawlQueueFull, PoolTimeout), max_retries=JOB_RETRIES,
+                              retry_delay=JOB_RETRY_DELAY)
+    jobs.start()
+
+# Load the price model once, so scoring requests don't wait for it.
+@app.on_event("startup")
+def load_price_model():
+    if model_cache.get() is None:
+        logger.warning("No price model at %s yet; /score returns 503 until regression.py saves one.", model_cache.path)
+
+# Close every browser context when the API stops.
+@app.on_event("shutdown")
+async def close_browser_pool():
+    if jobs is not None:
+        await jobs.close()
+    if pool is not None:
+        await pool.close()
+    await cache.flush()
+
+
 # Create a route to the root endpoint.
 @app.get("/")
 # Define a function to be executed when the endpoint is called.
@@ -57,223 +166,262 @@ def root():
 @app.get("/crawl_facebook_marketplace")
 # Define a function to be executed when the endpoint is called.
 # Add a description to the function.
-def crawl_facebook_marketplace(city: str, query: str, max_price: int, min_price: int):
-    # Define dictionary of cities from the facebook marketplace directory for United States.
-    # https://m.facebook.com/marketplace/directory/US/?_se_imp=0oey5sMRMSl7wluQZ
-    # TODO - Add more cities to the dictionary.
-    cities = {
-        'New York': 'nyc',
-        'Los Angeles': 'la',
-        'Las Vegas': 'vegas',
-        'Chicago': 'chicago',
-        'Houston': 'houston',
-        'San Antonio': 'sanantonio',
-        'Miami': 'miami',
-        'Orlando': 'orlando',
-        'San Diego': 'sandiego',
-        'Arlington': 'arlington',
-        'Balitmore': 'baltimore',
-        'Cincinnati': 'cincinnati',
-        'Denver': 'denver',
-        'Fort Worth': 'fortworth',
-        'Jacksonville': 'jacksonville',
-        'Memphis': 'memphis',
-        'Nashville': 'nashville',
-        'Philadelphia': 'philly',
-        'Portland': 'portland',
-        'San Jose': 'sanjose',
-        'Tucson': 'tucson',
-        'Atlanta': 'atlanta',
-        'Boston': 'boston',
-        'Columnbus': 'columbus',
-        'Detroit': 'detroit',
-        'Honolulu': 'honolulu',
-        'Kansas City': 'kansascity',
-        'New Orleans': 'neworleans',
-        'Phoenix': 'phoenix',
-        'Seattle': 'seattle',
-        'Washington DC': 'dc',
-        'Milwaukee': 'milwaukee',
-        'Sacremento': 'sac',
-        'Austin': 'austin',
-        'Charlotte': 'charlotte',
-        'Dallas': 'dallas',
-        'El Paso': 'elpaso',
-        'Indianapolis': 'indianapolis',
-        'Louisville': 'louisville',
-        'Minneapolis': 'minneapolis',
-        'Oaklahoma City' : 'oklahoma',
-        'Pittsburgh': 'pittsburgh',
-        'San Francisco': 'sanfrancisco',
-        'Tampa': 'tampa',
-        'Salt Lake City': 'saltlakecity',
-        'Provo': 'provo',
-    }
-    # If the city is in the cities dictionary...
-    if city in cities:
-        # Get the city location id from the cities dictionary.
-        city = cities[city]
-    # If the city is not in the cities dictionary...
+# refresh=true skips the result cache; the X-Cache header says whether the cache answered (HIT, STALE or MISS).
+async def crawl_facebook_marketplace(response: Response, city: str, query: str, max_price: int, min_price: int,
+                                     max_scrolls: int = 0, max_listings: Optional[int] = None,
+                                     refresh: bool = False):
+    marketplace_url = _search_url(city, query, max_price, min_price, max_scrolls, max_listings)
+    request = CrawlRequest(city, query, min_price, max_price, max_scrolls, max_listings)
+    cached, headers = _cached(request, refresh)
+    response.headers.update(headers)
+    if cached is not None:
+        return cached
+    # Get listings of particular item in a particular city for a particular price.
+    # Wait for a crawl slot, then borrow an already logged-in page from the browser pool.
+    try:
+        async with limiter:
+            async with pool.acquire() as page:
+                result = await crawl_engine.crawl(page, marketplace_url, max_listings, max_scrolls,
+                                                  EXTRACTION_BACKEND)
+    except (CrawlQueueFull, PoolTimeout) as e:
+        # Too many crawls in flight; ask the client to retry later.
+        raise HTTPException(503, str(e))
+    await _save_crawl(result, request)
+    return result
+
+# Media types of the streaming crawl formats.
+STREAM_FORMATS = {'ndjson': 'application/x-ndjson', 'sse': 'text/event-stream'}
+
+# Create a route to the streaming variant of crawl_facebook_marketplace.
+@app.get("/crawl_facebook_marketplace/stream")
+# Send each listing as soon as its batch of cards is parsed, then a summary event.
+# format=ndjson sends one {"event", "data"} JSON object per line, format=sse sends Server-Sent Events.
+async def crawl_facebook_marketplace_stream(city: str, query: str, max_price: int, min_price: int,
+                                            max_scrolls: int = 0, max_listings: Optional[int] = None,
+                                            format: str = 'ndjson', refresh: bool = False):
+    if format not in STREAM_FORMATS:
+        raise HTTPException(422, f'format must be one of {", ".join(STREAM_FORMATS)}.')
+    marketplace_url = _search_url(city, query, max_price, min_price, max_scrolls, max_listings)
+    request = CrawlRequest(city, query, min_price, max_price, max_scrolls, max_listings)
+    cached, headers = _cached(request, refresh)
+    if cached is not None:
+        events = _stream_cached(cached, headers['X-Cache'], format)
     else:
-        # Exit the script if the city is not in the cities dictionary.
+        events = _stream_crawl(marketplace_url, request, format)
+    return StreamingResponse(events, media_type=STREAM_FORMATS[format], headers=headers)
+
+async def _stream_cached(result, state, format):
+    for record in result:
+        yield _stream_event('listing', record, format)
+    yield _stream_event('summary', {'listings': len(result), 'seconds': 0, 'cache': state}, format)
+
+async def _stream_crawl(marketplace_url, request, format):
+    max_listings, max_scrolls = request.max_listings, request.max_scrolls
+    start = time.perf_counter()
+    result = []
+    # The status line has already been sent, so failures become an error event.
+    try:
+        async with limiter:
+            async with pool.acquire() as page:
+                async for records in crawl_engine.iter_crawl(page, marketplace_url, max_listings, max_scrolls,
+                                                             EXTRACTION_BACKEND):
+                    result.extend(records)
+                    for record in records:
+                        yield _stream_event('listing', record, format)
+    except (CrawlQueueFull, PoolTimeout) as e:
+        yield _stream_event('error', {'status': 503, 'detail': str(e)}, format)
+        return
+    except Exception as e:
+        yield _stream_event('error', {'status': 500, 'detail': f'{type(e).__name__}: {e}'}, format)
+        return
+    await _save_crawl(result, request)
+    yield _stream_event('summary', {'listings': len(result), 'seconds': round(time.perf_counter() - start, 2),
+                                    'cache': MISS}, format)
+
+def _stream_event(event, data, format):
+    if format == 'sse':
+        return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+    return json.dumps({'event': event, 'data': data}) + '\n'
+
+# Validate the crawl parameters and build the Marketplace search URL.
+def _search_url(city, query, max_price, min_price, max_scrolls, max_listings):
+    # Look up the Marketplace slug for the city.
+    location = cities.city_slug(city)
+    # If the city is not in the cities dictionary...
+    if location is None:
         # Capitalize only the first letter of the city.
         city = city.capitalize()
         # Raise an HTTPException.
         raise HTTPException (404, f'{city} is not a city we are currently supporting on the Facebook Marketplace. Please reach out to us to add this city in our directory.')
-        # TODO - Try and find a way to get city location ids from Facebook if the city is not in the cities dictionary.
         
+    # Scrolling budget: max_scrolls=0 reads only the first page of results.
+    if max_scrolls < 0 or (max_listings is not None and max_listings < 1):
+        raise HTTPException(422, 'max_scrolls must be >= 0 and max_listings >= 1.')
     # Define the URL to scrape.
-    marketplace_url = f'https://www.facebook.com/marketplace/106066949424984/search/?query={query}&maxPrice={max_price}&minPrice={min_price}&exact=false'
-    initial_url = "https://www.facebook.com/login/device-based/regular/login/"
-    # Get listings of particular item in a particular city for a particular price.
-    # Initialize the session using Playwright.
-    with sync_playwright() as p:
-        # Open a new browser page.
-        browser = p.chromium.launch(headless=False)
-        page = browser.new_page()
-        # Navigate to the URL.
-        page.goto(initial_url)
-        # Wait for the page to load.
-        time.sleep(2)
-        try:
-            email_input = page.wait_for_selector('input[name="email"]').fill(email)
-            password_input = page.wait_for_selector('input[name="pass"]').fill(password)
-            time.sleep(2)
-            login_button = page.wait_for_selector('button[name="login"]').click()
-            time.sleep(5)
-            page.goto(marketplace_url)
-        except:
-            page.goto(marketplace_url)
-        # Wait for the page to load.
-        print("waiting for page to load")
-        time.sleep(5)
-        #find an element with aria-label="Close" and click it
+    return cities.marketplace_search_url(location, query, max_price, min_price)
+
+async def _save_crawl(result, request: CrawlRequest):
+    # save the result to the listing store and dataset, off the event loop
+    await asyncio.to_thread(_store_results, result, request.query, request.city)
+    cache.set(request.key, result)
+    global last_crawl
+    last_crawl = result
+
+# Cached listings for a search (None on a miss) and the X-Cache/Age headers to send.
+def _cached(request: CrawlRequest, refresh: bool):
+    global last_crawl
+    if refresh or not cache.enabled:
+        return None, {'X-Cache': MISS}
+    result, state, age = cache.get(request.key)
+    metrics.CACHE_LOOKUPS.labels(state).inc()
+    if state == STALE:
+        # Answer with the stale listings and recrawl in the background; the job queue
+        # coalesces the refreshes of a search that is requested again meanwhile.
         try:
-            close_button = page.wait_for_selector('div[aria-label="Close"]').click()
-            #find button "Date listed" (x1lliihq x6ikm8r x10wlt62 x1n2onr6 xlyipyv xuxw1ft is class name, then we need to click it)
-            #look for that class as well as the text "Date listed" contained in a span
-            time.sleep(1)
-            date_listed_button = page.locator('span.x1lliihq.x6ikm8r.x10wlt62.x1n2onr6.xlyipyv.xuxw1ft:has-text("Date listed")')
-            date_listed_button.click()
-            #click the "last 7 days" button
-            time.sleep(1)
-            last_7_days_button = page.wait_for_selector('span:has-text("Last 7 days")').click()
-            time.sleep(2)
-            sort_by_button = page.locator('span.x1lliihq.x6ikm8r.x10wlt62.x1n2onr6.xlyipyv.xuxw1ft:has-text("Sort by")')
-            sort_by_button.click()
-            sort_date_listed_button = page.locator('span:has-text("Date listed: Newest first")')
-            sort_date_listed_button.click()
-        except Exception as e:
-            print(e)
-        # Infinite scroll to the bottom of the page until the loop breaks.
-        # for _ in range(5):
-        #     page.keyboard.press('End')
-        #     time.sleep(2)
-        html = page.content()
-        soup = BeautifulSoup(html, 'html.parser')
-        parsed = []
-        listings = soup.find_all('div', class_='x9f619 x78zum5 x1r8uery xdt5ytf x1iyjqo2 xs83m0k x1e558r4 x150jy0e x1iorvi4 xjkvuk6 xnpuxes x291uyu x1uepa24')
-        for listing in listings:
-            print("parsing listing")
-            try:
-                # Get the item image.
-                # image = listing.find('img', class_='xt7dq6l xl1xv1r x6ikm8r x10wlt62 xh8yej3')['src']
-                # Get the item title from span.
-                title = listing.find('span', 'x1lliihq x6ikm8r x10wlt62 x1n2onr6').text
-                # Get the item price.
-                price = listing.find('span', 'x193iq5w xeuugli x13faqbe x1vvkbs x1xmvt09 x1lliihq x1s928wv xhkezso x1gmr53x x1cpjm7i x1fgarty x1943h6x xudqn12 x676frb x1lkfr7t x1lbecb7 x1s688f xzsf02u').text
-                # Get the item URL.
-                post_url = listing.find('a', class_='x1i10hfl xjbqb8w x1ejq31n xd10rxx x1sy0etr x17r0tee x972fbf xcfux6l x1qhh985 xm0m39n x9f619 x1ypdohk xt0psk2 xe8uvvx xdj266r x11i5rnm xat24cr x1mh8g0r xexx8yu x4uap5 x18d9i69 xkhd6sd x16tdsg8 x1hl2dhg xggy1nq x1a2a7pz x1heor9g xkrqix3 x1sur9pj x1s688f x1lku1pv')['href']
-                # Get the item location.
-                subtexts = listing.find_all('span', class_='x1lliihq x6ikm8r x10wlt62 x1n2onr6 xlyipyv xuxw1ft x1j85h84')
-                #miles is equal to a subtext with "miles" in it
-                miles = ""
-                for subtext in subtexts:
-                    if "miles" in subtext.text:
-                        miles = subtext.text
-                        break
-                
-                location = listing.find('span', 'x1lliihq x6ikm8r x10wlt62 x1n2onr6 xlyipyv xuxw1ft x1j85h84').text
-                # Append the parsed data to the list.
-                parsed.append({
-                    # 'image': image,
-                    'title': title,
-                    'price': price,
-                    'post_url': post_url,
-                    'location': location,
-                    'miles': miles
-                })
-                print("appending parsed")
-            except:
-                pass
-        # Close the browser.
-        print("closing browser")
-        browser.close()
-        # Return the parsed data as a JSON.
-        result = []
-        for item in parsed:
-            result.append({
-                'name': item['title'],
-                'price': item['price'],
-                'location': item['location'],
-                'title': item['title'],
-                # 'image': item['image'],
-                'link': item['post_url'],
-                'miles': item['miles']
-            })
-        # save the result to a json file named by the current date and time, and query made
-        sanitized_query = re.sub(r'[^a-zA-Z0-9_]+', '_', query)
-        filename = f'{sanitized_query}_{time.strftime("%Y-%m-%d_%H-%M-%S")}.json'
-
-        with open(filename, 'w') as f:
-            result_json = json.dumps(result, indent=4)
-            f.write(result_json)
-            
-        return result
+            jobs.submit(request)
+        except JobQueueFull:
+            pass
+    headers = {'X-Cache': state}
+    if result is not None:
+        headers['Age'] = str(int(age))
+        last_crawl = result
+    return result, headers
+
+def _store_results(records, query=None, city=None):
+    with metrics.stage('store'), ListingStore() as store:
+        store.upsert(records, query=query, city=city, observe='changed')
+    listing_dataset.write_records(records, query=query, city=city)
+
+# Request body for the jobs endpoint.
+class JobRequest(BaseModel):
+    city: str
+    query: str
+    min_price: int
+    max_price: int
+    max_scrolls: int = 0
+    max_listings: Optional[int] = None
+
+# Create a route to the jobs endpoint.
+@app.post("/jobs", status_code=202)
+# Queue a crawl and return its job ID right away; poll GET /jobs/{job_id} for the results.
+# A crawl of a search that is already queued or running returns that job instead.
+def submit_job(body: JobRequest):
+    _search_url(body.city, body.query, body.max_price, body.min_price, body.max_scrolls, body.max_listings)
+    request = CrawlRequest(body.city, body.query, body.min_price, body.max_price, body.max_scrolls,
+                           body.max_listings)
+    try:
+        job, created = jobs.submit(request)
+    except JobQueueFull as e:
+        raise HTTPException(503, str(e))
+    return {**job.as_dict(results=False), 'created': created}
+
+# Create a route to poll a job.
+@app.get("/jobs/{job_id}")
+# Status of a crawl job, with its listings once it is done.
+def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, f'No job {job_id}; finished jobs are kept for {JOB_RETENTION:g} seconds.')
+    return job.as_dict()
+
+async def _run_crawl_job(request: CrawlRequest):
+    url = cities.marketplace_search_url(cities.city_slug(request.city), request.query, request.max_price,
+                                        request.min_price)
+    await rate_limiter.wait(url)
+    # Jobs share the crawl slots with the foreground endpoints.
+    async with limiter:
+        async with pool.acquire() as page:
+            result = await crawl_engine.crawl(page, url, request.max_listings, request.max_scrolls,
+                                              EXTRACTION_BACKEND)
+    await _save_crawl(result, request)
+    return result
+
+# Request body for the crawl_batch endpoint.
+class BatchJob(BaseModel):
+    city: str
+    query: str
+    min_price: int
+    max_price: int
+
+class BatchRequest(BaseModel):
+    jobs: List[BatchJob]
+    max_scrolls: int = 0
+    max_listings: Optional[int] = None
+
+# Create a route to the crawl_batch endpoint.
+@app.post("/crawl_batch")
+# Crawl many city/query/price jobs in parallel and return the merged listings.
+async def crawl_batch(batch: BatchRequest):
+    unsupported = sorted({job.city for job in batch.jobs if cities.city_slug(job.city) is None})
+    if unsupported:
+        raise HTTPException(404, f'Unsupported cities: {", ".join(unsupported)}')
+    jobs = [scheduler.CrawlJob(job.city, job.query, job.min_price, job.max_price) for job in batch.jobs]
+    result = await scheduler.run_jobs(
+        pool,
+        jobs,
+        rate_limiter=rate_limiter,
+        limiter=limiter,
+        max_listings=batch.max_listings,
+        max_scrolls=batch.max_scrolls,
+        backend=EXTRACTION_BACKEND,
+    )
+    # Listings are tagged with their city and query by the scheduler.
+    await asyncio.to_thread(_store_results, result['results'])
+    return result
+
+# Request body for the score endpoint; without listings the latest crawl's results are scored.
+class ScoreRequest(BaseModel):
+    listings: Optional[List[dict]] = None
+
+# Create a route to the score endpoint.
+@app.post("/score")
+# Predicted price and residual (price - prediction) for a batch of listings, in one vectorized call.
+async def score(request: ScoreRequest):
+    model = model_cache.get()
+    if model is None or price_model.GLOBAL not in model['segments']:
+        raise HTTPException(503, 'No price model has been fitted yet. Run regression.py first.')
+    listings = request.listings if request.listings is not None else last_crawl
+    scores = await asyncio.to_thread(price_model.score_records, listings, model)
+    return {'model_fitted_at': model['fitted_at'], 'scores': scores}
+
+# Create a route to the pool_metrics endpoint.
+@app.get("/pool_metrics")
+# Report browser pool usage, how long requests waited for a context, and the crawl queue.
+def pool_metrics():
+    if pool is None:
+        raise HTTPException(503, 'Browser pool is not running.')
+    return _stats()
+
+# Pool, crawl queue, job queue and cache numbers, also read by /metrics at scrape time.
+def _stats():
+    return {
+        **(pool.metrics() if pool is not None else {}),
+        'crawls_running': limiter.running,
+        'crawls_queued': limiter.waiting,
+        **(jobs.metrics() if jobs is not None else {}),
+        **cache.metrics(),
+    }
+
+metrics.register(metrics.StatsCollector('marketplace', _stats))
+
+# Create a route to the metrics endpoint.
+@app.get("/metrics")
+# Stage timings, listings per crawl, parse failures and pool/queue gauges in the Prometheus text format.
+def prometheus_metrics():
+    body, content_type = metrics.latest()
+    return Response(body, media_type=content_type)
 
 # Create a route to the return_html endpoint.
 @app.get("/return_ip_information")
 # Define a function to be executed when the endpoint is called.
-def return_ip_information():
-    # Initialize the session using Playwright.
-    with sync_playwright() as p:
-        # Open a new browser page.
-        browser = p.chromium.launch()
-        page = browser.new_page()
-        # Navigate to the URL.
-        page.goto('https://www.ipburger.com/')
-        # Wait for the page to load.
-        time.sleep(5)
-        # Get the HTML content of the page.
-        html = page.content()
-        # Beautify the HTML content.
-        soup = BeautifulSoup(html, 'html.parser')
-        # Find the IP address.
-        ip_address = soup.find('span', id='ipaddress1').text
-        # Find the country.
-        country = soup.find('strong', id='country_fullname').text
-        # Find the location.
-        location = soup.find('strong', id='location').text
-        # Find the ISP.
-        isp = soup.find('strong', id='isp').text
-        # Find the Hostname.
-        hostname = soup.find('strong', id='hostname').text
-        # Find the Type.
-        ip_type = soup.find('strong', id='ip_type').text
-        # Find the version.
-        version = soup.find('strong', id='version').text
-        # Close the browser.
-        browser.close()
-        # Return the IP information as JSON.
-        return {
-            'ip_address': ip_address,
-            'country': country,
-            'location': location,
-            'isp': isp,
-            'hostname': hostname,
-            'type': ip_type,
-            'version': version
-        }
+async def return_ip_information():
+    # Borrow a page from the pool so the IP matches the one used for crawling.
+    try:
+        async with pool.acquire() as page:
+            # Return the IP information as JSON.
+            return await crawl_engine.fetch_ip_information(page)
+    except PoolTimeout as e:
+        raise HTTPException(503, str(e))
 
 if __name__ == "__main__":
 
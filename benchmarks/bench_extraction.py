@@ -0,0 +1,79 @@
+"""
+Benchmark the 'bs4' and 'dom' extraction backends on a Marketplace page.
+
+    python -m benchmarks.bench_extraction [--html saved_page.html] [--copies 20] [--repeat 5]
+
+Without --html a synthetic page is rendered from test.json. Each run loads
+the page into headless Chromium, then measures wall time and Python peak
+memory for:
+- bs4: page.content() + BeautifulSoup parsing (what the crawlers used to do)
+- dom: one page.evaluate returning only the fields
+and checks both produce identical result dicts.
+"""
+import argparse
+import time
+import tracemalloc
+
+from playwright.sync_api import sync_playwright
+
+import crawl_engine
+import selector_registry
+from benchmarks import fixtures
+from extraction import COLLECT_NEW_CARD_FIELDS_JS
+from pagination import SEEN_ATTR
+
+
+def run_bs4(page, selector_set) -> list:
+    html = page.content()
+    return crawl_engine.parse_listings(html, 'bs4', selector_set)
+
+
+def run_dom(page, selector_set) -> list:
+    fields = page.evaluate(COLLECT_NEW_CARD_FIELDS_JS, [selector_set.card_selector, SEEN_ATTR, selector_set.spec])
+    return crawl_engine.build_records(fields)
+
+
+def measure(page, html: str, fn, selector_set, repeat: int):
+    times, peaks, result = [], [], None
+    for _ in range(repeat):
+        # Fresh DOM each time so no card is already marked as extracted.
+        page.set_content(html)
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = fn(page, selector_set)
+        times.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return result, min(times), max(peaks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--html', help='captured Marketplace search page')
+    parser.add_argument('--copies', type=int, default=20, help='times to repeat test.json in the synthetic page')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--selector-set', default='grid-v1', help='selector set to render and parse with')
+    args = parser.parse_args()
+
+    selector_set = selector_registry.get_set(args.selector_set)
+    if args.html:
+        html = fixtures.load_html(args.html)
+    else:
+        html = fixtures.render_page(fixtures.load_records(), selector_set.spec, args.copies)
+    print(f"Page size: {len(html) / 1e6:.2f} MB")
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch()
+        page = browser.new_page()
+        bs4_result, bs4_time, bs4_peak = measure(page, html, run_bs4, selector_set, args.repeat)
+        dom_result, dom_time, dom_peak = measure(page, html, run_dom, selector_set, args.repeat)
+        browser.close()
+
+    print(f"{'backend':<8} {'listings':>9} {'best time':>11} {'peak py mem':>12}")
+    print(f"{'bs4':<8} {len(bs4_result):>9} {bs4_time * 1000:>9.1f}ms {bs4_peak / 1e6:>10.2f}MB")
+    print(f"{'dom':<8} {len(dom_result):>9} {dom_time * 1000:>9.1f}ms {dom_peak / 1e6:>10.2f}MB")
+    print("Outputs identical:", bs4_result == dom_result)
+
+
+if __name__ == '__main__':
+    main()
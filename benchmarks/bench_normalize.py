@@ -0,0 +1,124 @@
+"""
+Benchmark price and mileage normalization on a synthetic frame.
+
+    python -m benchmarks.bench_normalize [--rows 1000000] [--seed 0]
+
+Builds a frame of Marketplace-style price and mileage strings with known
+values and times each approach on it, reporting seconds and the share of
+rows parsed to the right value:
+- strip: the old regression parser, strip every non-digit and convert
+- gui loop: the old GUI loop, replace "K" with "000" and int() each row
+- apply: a per-row Python parser (Series.apply) doing what normalize does
+- normalize: the vectorized parsers in normalize.py
+"""
+import argparse
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+import normalize
+
+PRICE_FORMATS = ['${:,}', '${:,}', '${:,}', 'CA${:,}', '${:,} - ${:,}', '${:,}${:,}']
+MILE_FORMATS = ['{}K miles', '{}K miles', '{}K miles', '{:,} miles', '{}K km', '{:.1f}M miles']
+
+
+def synthetic_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Price/mileage strings and the values they should parse to."""
+    rng = np.random.default_rng(seed)
+    prices = rng.integers(2, 600, rows) * 50
+    price_kind = rng.integers(0, len(PRICE_FORMATS) + 1, rows)  # last kind is "Free"
+    thousands = rng.integers(1, 300, rows)
+    mile_kind = rng.integers(0, len(MILE_FORMATS), rows)
+
+    price_text, price_val = [], []
+    for price, kind in zip(prices.tolist(), price_kind.tolist()):
+        if kind == len(PRICE_FORMATS):
+            price_text.append('Free')
+            price_val.append(0.0)
+        else:
+            price_text.append(PRICE_FORMATS[kind].format(price, price + 500))
+            price_val.append(float(price))
+
+    miles_text, miles_val = [], []
+    for k, kind in zip(thousands.tolist(), mile_kind.tolist()):
+        if kind == 3:
+            miles_text.append(MILE_FORMATS[kind].format(k * 1000))
+            miles_val.append(k * 1000.0)
+        elif kind == 4:
+            miles_text.append(MILE_FORMATS[kind].format(k))
+            miles_val.append(k * 1000 * normalize.KM_TO_MILES)
+        elif kind == 5:
+            miles_text.append(MILE_FORMATS[kind].format(k / 100))
+            miles_val.append(round(k / 100, 1) * 1e6)
+        else:
+            miles_text.append(MILE_FORMATS[kind].format(k))
+            miles_val.append(k * 1000.0)
+    return pd.DataFrame({'price': price_text, 'miles': miles_text,
+                         'price_expected': price_val, 'miles_expected': miles_val})
+
+
+def strip(df):
+    return (pd.to_numeric(df['price'].str.replace(r"[^0-9.]", "", regex=True), errors='coerce'),
+            pd.to_numeric(df['miles'].str.replace(r"[^0-9.]", "", regex=True), errors='coerce'))
+
+
+def gui_loop(df):
+    miles = []
+    for text in df['miles']:
+        try:
+            miles.append(float(int(text.replace("K", "000"))))
+        except ValueError:
+            miles.append(np.nan)
+    return pd.Series(np.nan, index=df.index), pd.Series(miles, index=df.index)
+
+
+def _price_one(text):
+    match = normalize.PRICE_RE.search(text)
+    if match is None:
+        return 0.0 if normalize.FREE_RE.search(text) else np.nan
+    amount = float(re.sub(r'[,.](?=\d{3}(?:\D|$))', '', match.group('amount')))
+    return amount * normalize._MULTIPLIERS.get((match.group('suffix') or '').lower(), 1.0)
+
+
+def _miles_one(text):
+    match = normalize.MILES_RE.search(text)
+    if match is None:
+        return np.nan
+    value = float(re.sub(r'[,.](?=\d{3}(?:\D|$))', '', match.group('amount')))
+    value *= normalize._MULTIPLIERS.get((match.group('suffix') or '').lower(), 1.0)
+    return value * normalize.KM_TO_MILES if (match.group('unit') or '').lower().startswith('k') else value
+
+
+def apply(df):
+    return df['price'].apply(_price_one), df['miles'].apply(_miles_one)
+
+
+def vectorized(df):
+    return normalize.parse_prices(df['price']), normalize.parse_miles(df['miles'])
+
+
+def accuracy(parsed: pd.Series, expected: pd.Series) -> float:
+    return float(np.isclose(parsed.to_numpy(dtype=float), expected.to_numpy(), rtol=1e-6).mean())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    df = synthetic_frame(args.rows, args.seed)
+    print(f"{args.rows:,} rows, {df['price'].nunique():,} distinct prices, {df['miles'].nunique():,} distinct mileages")
+    print(f"{'approach':<11} {'seconds':>8} {'price ok':>9} {'miles ok':>9}")
+    for name, fn in (('strip', strip), ('gui loop', gui_loop), ('apply', apply), ('normalize', vectorized)):
+        start = time.perf_counter()
+        prices, miles = fn(df)
+        seconds = time.perf_counter() - start
+        print(f"{name:<11} {seconds:>8.2f} {accuracy(prices, df['price_expected']):>9.1%} "
+              f"{accuracy(miles, df['miles_expected']):>9.1%}")
+
+
+if __name__ == '__main__':
+    main()
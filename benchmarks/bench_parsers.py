@@ -0,0 +1,59 @@
+"""
+Benchmark the HTML parser backends on Marketplace search pages.
+
+    python -m benchmarks.bench_parsers [--html page.html ...] [--sizes 1 10 50] [--repeat 3]
+
+Runs every installed parser (bs4 / lxml / selectolax) over each fixture and
+reports listings/sec and peak Python memory (tracemalloc, so memory held
+inside lxml's and selectolax's C parsers is not counted). Fixtures are the captured pages
+given with --html plus synthetic pages built from test.json at each --sizes
+multiple. Each backend's output is checked against bs4.
+"""
+import argparse
+import time
+import tracemalloc
+
+import selector_registry
+from benchmarks import fixtures
+from parsers import available_parsers, get_parser
+
+
+def bench(parser, html: str, repeat: int):
+    best, peak, result = float('inf'), 0, None
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = parser.parse(html)
+        best = min(best, time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return result, best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--html', nargs='*', default=[], help='captured Marketplace search pages')
+    parser.add_argument('--sizes', nargs='*', type=int, default=[1, 10, 50],
+                        help='synthetic pages with test.json repeated this many times')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--selector-set', default='grid-v1', help='selector set to render and parse with')
+    args = parser.parse_args()
+
+    spec = selector_registry.get_set(args.selector_set).spec
+    records = fixtures.load_records()
+    pages = [(path, fixtures.load_html(path)) for path in args.html]
+    pages += [(f'synthetic x{n}', fixtures.render_page(records, spec, n)) for n in args.sizes]
+
+    print(f"{'fixture':<22} {'parser':<11} {'listings':>9} {'listings/s':>12} {'peak mem':>10} {'matches bs4':>12}")
+    for name, html in pages:
+        reference = None
+        for backend in available_parsers():
+            result, best, peak = bench(get_parser(backend, spec), html, args.repeat)
+            if reference is None:
+                reference = result
+            rate = len(result) / best if best else float('inf')
+            print(f"{name:<22} {backend:<11} {len(result):>9} {rate:>12,.0f} {peak / 1e6:>8.2f}MB {str(result == reference):>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Synthetic Marketplace search pages for the benchmarks.
+
+Pages are rendered from saved results such as test.json using the listing
+card markup described by a selector set (grid-v1 by default), padded with the kind of wrapper
+markup Facebook puts around each card so the HTML size is realistic.
+Captured pages can be used instead via `load_html`.
+"""
+import html as html_lib
+import json
+import re
+from pathlib import Path
+
+from parsers import selector_chain
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_RECORDS = REPO_ROOT / 'test.json'
+
+# Wrapper noise around every card, roughly matching real Marketplace markup.
+_PADDING = ''.join(
+    f'<div class="x1n2onr6 x1ja2u2z x9f619 x78zum5 xdt5ytf x193iq5w x1l7klhg x1iyjqo2 xs83m0k" '
+    f'data-pad="{i}"><div class="x6s0dn4 x78zum5 xl56j7k x1608yet xljgi0e x1e0frkt"></div></div>'
+    for i in range(12)
+)
+
+
+def _class_of(value) -> str:
+    """Class string of the first selector in a chain (`tag[class="..."]` or `tag.a.b`)."""
+    selector = selector_chain(value)[0]
+    match = re.search(r'\[class="([^"]+)"\]', selector)
+    if match:
+        return match.group(1)
+    return ' '.join(selector.split('.')[1:])
+
+
+def render_card(record: dict, spec: dict) -> str:
+    esc = html_lib.escape
+    subtext = _class_of(spec['subtext'])
+    miles = f'<span class="{subtext}">{esc(record["miles"])}</span>' if record.get('miles') else ''
+    return (
+        f'<div class="{_class_of(spec["card"])}">{_PADDING}'
+        f'<a class="{_class_of(spec["link"])}" href="{esc(record["link"])}">'
+        f'<div><span class="{_class_of(spec["price"])}">{esc(record["price"])}</span></div>'
+        f'<div><span class="{_class_of(spec["title"])}">{esc(record["title"])}</span></div>'
+        f'<div><span class="{subtext}">{esc(record["location"])}</span></div>'
+        f'<div>{miles}</div>'
+        f'</a></div>'
+    )
+
+
+def render_page(records: list, spec: dict, copies: int = 1) -> str:
+    """`spec` must use class selectors for every field, as grid-v1 does."""
+    cards = ''.join(render_card(record, spec) for _ in range(copies) for record in records)
+    return f'<!DOCTYPE html><html><head><title>Marketplace</title></head><body><div role="main">{cards}</div></body></html>'
+
+
+def load_records(path: Path = DEFAULT_RECORDS) -> list:
+    with Path(path).open(encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_html(path: Path) -> str:
+    return Path(path).read_text(encoding='utf-8')
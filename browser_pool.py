@@ -0,0 +1,241 @@
+"""
+Pool of long-lived, already logged-in Playwright browser contexts.
+
+The FastAPI app creates one pool at startup and closes it at shutdown.
+Endpoints borrow a page with `async with pool.acquire() as page:` instead of
+launching Chromium and logging in to Facebook on every request.
+
+A context whose login failed is still lent out (logged out), and rebuilt to
+log in again once the login backoff has passed; the backoff doubles with
+every failed login round in a row, so a wrong password does not loop. Logins
+that overlap (the whole pool at startup) are one round.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from playwright.async_api import async_playwright
+
+import metrics
+from readiness import AsyncReadiness
+
+LOGIN_URL = "https://www.facebook.com/login/device-based/regular/login/"
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """Raised when no browser context becomes free within the acquire timeout."""
+
+
+class PoolSlot:
+    """One browser context with its page and bookkeeping."""
+
+    def __init__(self, context, page):
+        self.context = context
+        self.page = page
+        self.created_at = time.monotonic()
+        self.uses = 0
+        self.logged_in = False
+        self.crashed = False
+        # Playwright fires "crash" when the renderer process dies.
+        page.on("crash", lambda _: setattr(self, 'crashed', True))
+
+
+class BrowserPool:
+    def __init__(self, email: str, password: str, size: int = 2, headless: bool = False,
+                 max_uses: int = 50, acquire_timeout: float = 120.0,
+                 login_backoff: float = 60.0, max_login_backoff: float = 3600.0):
+        self.email = email
+        self.password = password
+        self.size = size
+        self.headless = headless
+        # Recycle a context after this many crawls so memory does not creep up.
+        self.max_uses = max_uses
+        self.acquire_timeout = acquire_timeout
+        self.login_backoff = login_backoff
+        self.max_login_backoff = max_login_backoff
+        self._login_failures = 0  # failed login rounds in a row
+        self._next_login = 0.0  # monotonic time from which logged-out slots are rebuilt
+        self._logins_running = 0
+        self._round_failed = False
+
+        self._playwright = None
+        self._browser = None
+        self._idle = asyncio.Queue()
+        self._slots = set()
+        self._relaunch_lock = asyncio.Lock()
+
+        # Metrics
+        self._wait_times = deque(maxlen=1000)
+        self._acquired = 0
+        self._recycled = 0
+        self._timeouts = 0
+        self._max_wait = 0.0
+
+    async def start(self):
+        """Launch Chromium and fill the pool with logged-in contexts."""
+        self._playwright = await async_playwright().start()
+        await self._launch_browser()
+        slots = await asyncio.gather(*(self._new_slot() for _ in range(self.size)))
+        for slot in slots:
+            self._idle.put_nowait(slot)
+        logger.info("Browser pool started with %d context(s).", self.size)
+
+    async def close(self):
+        """Close every context, the browser and Playwright itself."""
+        for slot in list(self._slots):
+            await self._discard(slot)
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def _launch_browser(self):
+        with metrics.stage('browser_launch'):
+            self._browser = await self._playwright.chromium.launch(headless=self.headless)
+
+    async def _ensure_browser(self):
+        # If Chromium itself died every context is gone, so relaunch it once.
+        async with self._relaunch_lock:
+            if self._browser is None or not self._browser.is_connected():
+                logger.warning("Browser disconnected, relaunching.")
+                self._slots.clear()
+                await self._launch_browser()
+
+    async def _new_slot(self) -> PoolSlot:
+        await self._ensure_browser()
+        context = await self._browser.new_context()
+        page = await context.new_page()
+        slot = PoolSlot(context, page)
+        self._slots.add(slot)
+        self._logins_running += 1
+        try:
+            slot.logged_in = await self._login(page)
+        finally:
+            self._logins_running -= 1
+        if slot.logged_in:
+            self._login_failures = 0
+            self._round_failed = False
+        else:
+            # Back off from the first failure on, but count the round once it is over.
+            delay = min(self.max_login_backoff, self.login_backoff * 2 ** self._login_failures)
+            self._next_login = max(self._next_login, time.monotonic() + delay)
+            self._round_failed = True
+        if self._round_failed and not self._logins_running:
+            self._round_failed = False
+            self._login_failures += 1
+            logger.warning("Not logged in (%d failed login round(s) in a row), retrying in %.0fs.",
+                           self._login_failures, self._next_login - time.monotonic())
+        return slot
+
+    async def _login(self, page) -> bool:
+        """Log in to Facebook; a failed login still leaves a usable (logged-out) page."""
+        readiness = AsyncReadiness()
+        with readiness.step('login'):
+            try:
+                await page.goto(LOGIN_URL)
+                await readiness.selector(page, 'input[name="email"]', 'login_form')
+                await page.fill('input[name="email"]', self.email)
+                await page.fill('input[name="pass"]', self.password)
+                await page.click('button[name="login"]')
+                # Facebook redirects away from /login once the credentials are accepted.
+                await readiness.login_complete(page)
+            except Exception as e:
+                logger.warning("Login failed: %s", e)
+        metrics.observe_stages(readiness.timings)
+        logger.info("Login %s", readiness.summary())
+        return await self._has_session(page.context)
+
+    @staticmethod
+    async def _has_session(context) -> bool:
+        # Facebook sets the c_user cookie only for an authenticated session.
+        cookies = await context.cookies("https://www.facebook.com")
+        return any(c['name'] == 'c_user' for c in cookies)
+
+    async def _is_healthy(self, slot: PoolSlot) -> bool:
+        if slot.crashed or slot.page.is_closed():
+            return False
+        if self._browser is None or not self._browser.is_connected():
+            return False
+        if slot.uses >= self.max_uses:
+            return False
+        if not slot.logged_in:
+            return time.monotonic() < self._next_login
+        try:
+            if not await self._has_session(slot.context):
+                return False
+        except Exception:
+            return False
+        return True
+
+    async def _discard(self, slot: PoolSlot):
+        self._slots.discard(slot)
+        try:
+            await slot.context.close()
+        except Exception:
+            pass
+
+    async def _recycle(self, slot: PoolSlot) -> PoolSlot:
+        self._recycled += 1
+        await self._discard(slot)
+        return await self._new_slot()
+
+    @asynccontextmanager
+    async def acquire(self, timeout: float = None):
+        """Borrow a healthy page; it goes back to the pool when the block exits."""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        start = time.monotonic()
+        try:
+            slot = await asyncio.wait_for(self._idle.get(), timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise PoolTimeout(f"No browser context available after {timeout}s")
+        waited = time.monotonic() - start
+        metrics.POOL_WAIT_SECONDS.observe(waited)
+        self._wait_times.append(waited)
+        self._max_wait = max(self._max_wait, waited)
+        self._acquired += 1
+
+        try:
+            if not await self._is_healthy(slot):
+                slot = await self._recycle(slot)
+        except Exception:
+            # Could not build a replacement; hand the slot back so the next
+            # borrower retries the recycle instead of the pool shrinking.
+            self._idle.put_nowait(slot)
+            raise
+
+        slot.uses += 1
+        try:
+            yield slot.page
+        finally:
+            self._idle.put_nowait(slot)
+
+    def metrics(self) -> dict:
+        waits = sorted(self._wait_times)
+
+        def percentile(p):
+            if not waits:
+                return 0.0
+            return waits[min(len(waits) - 1, int(p * len(waits)))]
+
+        return {
+            'size': self.size,
+            'idle': self._idle.qsize(),
+            'in_use': self.size - self._idle.qsize(),
+            'acquired_total': self._acquired,
+            'recycled_total': self._recycled,
+            'timeouts_total': self._timeouts,
+            'login_failures': self._login_failures,
+            'wait_seconds_p50': percentile(0.50),
+            'wait_seconds_p95': percentile(0.95),
+            'wait_seconds_max': self._max_wait,
+        }
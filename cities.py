@@ -0,0 +1,83 @@
+"""
+Supported Marketplace cities and search URL construction.
+
+Marketplace accepts a city slug in place of a numeric location ID, so each
+search goes to the right metro.
+"""
+from urllib.parse import urlencode
+
+# Dictionary of cities from the facebook marketplace directory for United States.
+# https://m.facebook.com/marketplace/directory/US/?_se_imp=0oey5sMRMSl7wluQZ
+# TODO - Add more cities to the dictionary.
+CITIES = {
+    'New York': 'nyc',
+    'Los Angeles': 'la',
+    'Las Vegas': 'vegas',
+    'Chicago': 'chicago',
+    'Houston': 'houston',
+    'San Antonio': 'sanantonio',
+    'Miami': 'miami',
+    'Orlando': 'orlando',
+    'San Diego': 'sandiego',
+    'Arlington': 'arlington',
+    'Balitmore': 'baltimore',
+    'Cincinnati': 'cincinnati',
+    'Denver': 'denver',
+    'Fort Worth': 'fortworth',
+    'Jacksonville': 'jacksonville',
+    'Memphis': 'memphis',
+    'Nashville': 'nashville',
+    'Philadelphia': 'philly',
+    'Portland': 'portland',
+    'San Jose': 'sanjose',
+    'Tucson': 'tucson',
+    'Atlanta': 'atlanta',
+    'Boston': 'boston',
+    'Columnbus': 'columbus',
+    'Detroit': 'detroit',
+    'Honolulu': 'honolulu',
+    'Kansas City': 'kansascity',
+    'New Orleans': 'neworleans',
+    'Phoenix': 'phoenix',
+    'Seattle': 'seattle',
+    'Washington DC': 'dc',
+    'Milwaukee': 'milwaukee',
+    'Sacremento': 'sac',
+    'Austin': 'austin',
+    'Charlotte': 'charlotte',
+    'Dallas': 'dallas',
+    'El Paso': 'elpaso',
+    'Indianapolis': 'indianapolis',
+    'Louisville': 'louisville',
+    'Minneapolis': 'minneapolis',
+    'Oaklahoma City': 'oklahoma',
+    'Pittsburgh': 'pittsburgh',
+    'San Francisco': 'sanfrancisco',
+    'Tampa': 'tampa',
+    'Salt Lake City': 'saltlakecity',
+    'Provo': 'provo',
+}
+
+# Location used before searches were localized, kept as the fallback for
+# cities that are not in CITIES.
+DEFAULT_LOCATION = '106066949424984'
+
+
+def city_slug(city: str):
+    """Marketplace slug for a supported city name, or None."""
+    return CITIES.get(city)
+
+
+def marketplace_search_url(location: str, query: str, max_price: int, min_price: int) -> str:
+    """Search URL for a city slug (or numeric location ID)."""
+    params = urlencode({'query': query, 'maxPrice': max_price, 'minPrice': min_price, 'exact': 'false'})
+    return f'https://www.facebook.com/marketplace/{location}/search/?{params}'
+
+
+def search_key(city: str, query: str, min_price: int, max_price: int) -> tuple:
+    """
+    Normalized identity of a search: the city's slug, the lower-cased query
+    with collapsed whitespace and the price band. Searches with the same key
+    load the same results page.
+    """
+    return (city_slug(city) or city.strip().lower(), ' '.join(query.lower().split()), int(min_price), int(max_price))
@@ -0,0 +1,273 @@
+"""
+Async Playwright crawl engine used by the FastAPI app.
+
+Everything that touches the browser is awaited, so one uvicorn worker can
+drive many crawls at once. CPU-bound HTML parsing runs in a worker thread so
+it does not stall the event loop either.
+
+The crawl scripts (cl_app.py, honda-toyota-search.py) drive a sync
+Playwright page with `iter_crawl_sync`, which builds the same records.
+"""
+import asyncio
+import logging
+
+import metrics
+import normalize
+import selector_registry
+from listing_ids import listing_id
+from pagination import SeenRunFilter, aiter_card_batches, iter_card_batches
+from readiness import AsyncReadiness, Readiness
+from selector_registry import SelectorSet
+
+IP_INFO_URL = 'https://www.ipburger.com/'
+
+FILTER_BUTTON_SELECTOR = 'span.x1lliihq.x6ikm8r.x10wlt62.x1n2onr6.xlyipyv.xuxw1ft'
+
+FACEBOOK_URL = 'https://www.facebook.com'
+
+# Card fields a listing cannot be built without. The crawl scripts keep cards
+# without a link too, with 'No URL' as their link.
+REQUIRED_FIELDS = ('title', 'price', 'href', 'location')
+SCRIPT_REQUIRED_FIELDS = ('title', 'price', 'location')
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlQueueFull(Exception):
+    """Raised when too many crawls are already running or waiting."""
+
+
+class CrawlLimiter:
+    """
+    Caps how many crawls run at once. Extra requests wait in line up to
+    `max_queued`; beyond that they are rejected instead of piling up.
+    """
+
+    def __init__(self, max_concurrent: int, max_queued: int):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.running = 0
+        self.waiting = 0
+
+    async def __aenter__(self):
+        if self._semaphore.locked() and self.waiting >= self.max_queued:
+            raise CrawlQueueFull(f'{self.running} crawls running and {self.waiting} queued, try again later.')
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.running -= 1
+        self._semaphore.release()
+        return False
+
+
+async def open_search(page, marketplace_url: str, readiness: AsyncReadiness = None):
+    """Load a Marketplace search and apply the date filters."""
+    readiness = readiness or AsyncReadiness()
+    with readiness.step('navigation'):
+        await page.goto(marketplace_url)
+    # Wait for the listing grid instead of a fixed delay.
+    await readiness.listing_grid(page)
+    with readiness.step('filters'):
+        try:
+            #close the login/cookie dialog if one is showing
+            close_button = page.locator('div[aria-label="Close"]')
+            if await close_button.count() > 0:
+                await close_button.first.click()
+                await readiness.locator(close_button.first, 'dialog_close', state='hidden')
+            #look for the filter span class as well as the text "Date listed"
+            await page.locator(f'{FILTER_BUTTON_SELECTOR}:has-text("Date listed")').click()
+            #click the "last 7 days" button once the menu has opened
+            last_7_days_option = page.locator('span:has-text("Last 7 days")').first
+            await readiness.locator(last_7_days_option, 'filter_menu')
+            await last_7_days_option.click()
+            await page.locator(f'{FILTER_BUTTON_SELECTOR}:has-text("Sort by")').click()
+            newest_first_option = page.locator('span:has-text("Date listed: Newest first")').first
+            await readiness.locator(newest_first_option, 'filter_menu')
+            await newest_first_option.click()
+            # The grid re-renders with the filtered results.
+            await readiness.network_idle(page, 'results_refresh')
+            await readiness.listing_grid(page)
+        except Exception as e:
+            logger.warning("Could not apply the search filters: %s", e)
+
+
+def build_record(fields: dict, required: tuple = REQUIRED_FIELDS, link_prefix: str = ''):
+    """
+    Shape raw card fields into a result record, or None if one of the
+    `required` fields is missing. The API links to the card's href, the crawl
+    scripts prefix it with FACEBOOK_URL.
+    """
+    missing = [name for name in required if fields[name] is None]
+    if missing:
+        logger.debug("Skipping listing card: missing %s", ', '.join(missing))
+        return None
+    title = fields['title'] or "No Title"
+    return {
+        'name': title,
+        'price': fields['price'] or "No Price",
+        'location': fields['location'] or "No Location",
+        'title': title,
+        'link': link_prefix + fields['href'] if fields['href'] is not None else "No URL",
+        'miles': fields['miles'],
+        'listing_id': listing_id(fields['href']),
+    }
+
+
+def build_records(fields_list: list, selector_set: SelectorSet = None) -> list:
+    """Records for the complete cards; with `selector_set` the missing fields are counted in metrics."""
+    records = []
+    for fields in fields_list:
+        record = build_record(fields)
+        if record is not None:
+            records.append(record)
+        elif selector_set is not None:
+            for name in REQUIRED_FIELDS:
+                if fields[name] is None:
+                    metrics.PARSE_FAILURES.labels(selector_set.name, name).inc()
+    return records
+
+
+def parse_listings(html: str, backend: str = 'bs4', selector_set: SelectorSet = None) -> list:
+    """
+    Parse Marketplace search HTML (a full page or card fragments) into result
+    dicts. Without `selector_set` the matching set is detected from the HTML.
+    """
+    selector_set = selector_set or selector_registry.detect_html(html, backend=backend)
+    return build_records(selector_set.parse(html, backend), selector_set)
+
+
+async def iter_crawl(page, marketplace_url: str, max_listings: int = None, max_scrolls: int = 0,
+                     backend: str = 'bs4'):
+    """
+    Crawl one search, yielding the records of each batch of cards as soon as
+    it is parsed. With `max_scrolls` > 0 the page is scrolled and only the
+    cards added by each scroll are extracted. `backend` picks where the cards
+    are parsed: 'dom' inside the browser, otherwise with that Python parser.
+    """
+    readiness = AsyncReadiness()
+    await open_search(page, marketplace_url, readiness)
+    selector_set = await selector_registry.adetect(page)
+    fields_spec = selector_set.spec if backend == 'dom' else None
+    cards = 0
+    records = 0
+    async for batch in aiter_card_batches(page, selector_set.card_selector, max_listings, max_scrolls,
+                                          readiness, fields_spec):
+        cards += len(batch)
+        with readiness.step('parse'):
+            if fields_spec is not None:
+                parsed = build_records(batch, selector_set)
+            else:
+                parsed = await asyncio.to_thread(parse_listings, ''.join(batch), backend, selector_set)
+        records += len(parsed)
+        if parsed:
+            yield normalize.annotate(parsed)
+    selector_registry.check_yield(selector_set, cards, records)
+    metrics.observe_stages(readiness.timings)
+    metrics.LISTINGS_PER_CRAWL.observe(records)
+    logger.info(readiness.summary())
+
+
+async def crawl(page, marketplace_url: str, max_listings: int = None, max_scrolls: int = 0,
+                backend: str = 'bs4') -> list:
+    """Crawl one search and return all its records (see `iter_crawl`)."""
+    result = []
+    async for records in iter_crawl(page, marketplace_url, max_listings, max_scrolls, backend):
+        result.extend(records)
+    return result
+
+
+def open_search_sync(page, marketplace_url: str, readiness: Readiness = None):
+    """Sync counterpart of `open_search`: load a search, then filter to the last 7 days, newest first."""
+    readiness = readiness or Readiness()
+    with readiness.step('navigation'):
+        page.goto(marketplace_url)
+    logger.debug("Waiting for page to load...")
+    readiness.listing_grid(page)
+    with readiness.step('filters'):
+        try:
+            close_button = page.locator('div[aria-label="Close"]')
+            if close_button.count() > 0:
+                close_button.first.click()
+                readiness.locator(close_button.first, 'dialog_close', state='hidden')
+
+            # 1. Click the "Date listed" button to open its options.
+            #    get_by_role is perfect for buttons.
+            page.get_by_role("button", name="Date listed", exact=True).click()
+            # 2. Select the "Last 7 days" option once the menu has opened.
+            #    get_by_text is great for options in a menu.
+            last_7_days_option = page.get_by_text("Last 7 days", exact=True)
+            readiness.locator(last_7_days_option, 'filter_menu')
+            last_7_days_option.click()
+
+            # 3. Click the "Sort by" button to open its options.
+            page.get_by_role("button", name="Sort by", exact=True).click()
+
+            # 4. Select the sorting method.
+            newest_first_option = page.get_by_text("Date listed: Newest first", exact=True)
+            readiness.locator(newest_first_option, 'filter_menu')
+            newest_first_option.click()
+
+            # 5. Wait for the grid to re-render with the filtered results.
+            readiness.network_idle(page, 'results_refresh')
+            readiness.listing_grid(page)
+        except Exception as e:
+            logger.warning("Error during sorting/filtering: %s", e)
+
+
+def iter_crawl_sync(page, marketplace_url: str, max_listings: int = None, max_scrolls: int = 0,
+                    backend: str = 'bs4', seen_filter: SeenRunFilter = None):
+    """
+    Sync counterpart of `iter_crawl` for the crawl scripts: yields the records
+    of each scroll's batch of cards, with absolute links. With `seen_filter`
+    the cards it drops are skipped and the crawl stops at its stop point.
+    """
+    readiness = Readiness()
+    open_search_sync(page, marketplace_url, readiness)
+    # The 'dom' backend extracts the fields in the browser, the others parse
+    # the card HTML here.
+    selector_set = selector_registry.detect(page)
+    fields_spec = selector_set.spec if backend == 'dom' else None
+    cards = 0
+    records = 0
+    for batch in iter_card_batches(page, selector_set.card_selector, max_listings, max_scrolls,
+                                   readiness, fields_spec):
+        if seen_filter is not None:
+            batch = seen_filter.filter(batch)
+        cards += len(batch)
+        if fields_spec is None and batch:
+            batch = selector_set.parse(''.join(batch), backend)
+        parsed = [record for record in (build_record(fields, SCRIPT_REQUIRED_FIELDS, FACEBOOK_URL)
+                                        for fields in batch) if record is not None]
+        records += len(parsed)
+        if parsed:
+            yield parsed
+        if seen_filter is not None and seen_filter.done:
+            logger.info("Reached %d already-seen listings in a row, stopping.", seen_filter.run_length)
+            break
+    selector_registry.check_yield(selector_set, cards, records)
+    logger.info(readiness.summary())
+
+
+async def fetch_ip_information(page) -> dict:
+    await page.goto(IP_INFO_URL)
+    await page.wait_for_selector('#ipaddress1')
+
+    async def text(selector):
+        return await page.locator(selector).first.inner_text()
+
+    return {
+        'ip_address': await text('span#ipaddress1'),
+        'country': await text('strong#country_fullname'),
+        'location': await text('strong#location'),
+        'isp': await text('strong#isp'),
+        'hostname': await text('strong#hostname'),
+        'type': await text('strong#ip_type'),
+        'version': await text('strong#version'),
+    }
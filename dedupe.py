@@ -0,0 +1,217 @@
+"""
+Near-duplicate detection across reposts.
+
+Sellers repost the same car under a new listing ID, often with a lower
+price. Listings are treated as one vehicle when they share the model year,
+make, model and location, their mileages are within MILES_TOLERANCE, their
+prices within PRICE_TOLERANCE and their titles share at least TITLE_MIN of
+their words (Jaccard similarity).
+
+Nothing is compared pairwise across the whole table: listings are blocked
+by (year, make, model, location), sorted by mileage within each block, and
+each listing is only compared with the next WINDOW listings of its block
+(sorted neighbourhood). Matches are merged with union-find, so a chain of
+reposts becomes one vehicle, identified by its lowest listing ID; a merge
+that would stretch a vehicle's mileages beyond the tolerance is skipped.
+
+Blocks never share a vehicle, so the store keeps each listing's block and
+an update only re-matches the blocks of the listings seen since the last
+one (plus the block a re-sighted listing was in before, in case its title
+changed), rewriting just those listings' rows.
+
+    python dedupe.py    # assign vehicle IDs to every listing in the store
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+import normalize
+import titles
+
+WINDOW = 5
+MILES_TOLERANCE = 0.005  # of the higher mileage
+MILES_SLACK = 1000  # miles, for rounded mileages such as "93K" vs "93,400"
+PRICE_TOLERANCE = 0.35  # of the higher price, reposts are often cheaper
+TITLE_MIN = 0.5
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def _title_words(titles: pd.Series) -> list:
+    """Each title's set of lower-case words, parsed once per distinct title."""
+    codes, uniques = pd.factorize(titles.fillna(''))
+    words = [frozenset(_WORD_RE.findall(title.lower())) for title in uniques]
+    return [words[code] for code in codes]
+
+
+def _location(locations: pd.Series) -> pd.Series:
+    return locations.fillna('').astype(str).str.lower().str.replace(r'\s+', ' ', regex=True).str.strip()
+
+
+def prepare(df: pd.DataFrame) -> pd.DataFrame:
+    """Add the typed and normalized columns matching works on to store-style listings."""
+    df = df.reset_index(drop=True)
+    names = df['title'].astype(object)
+    prepared = pd.DataFrame({
+        'listing_id': df['listing_id'].astype('int64'),
+        'year_val': normalize.parse_years(names),
+        'price_val': normalize.parse_prices(df['price'].astype(object)),
+        'miles_val': normalize.parse_miles(df['miles'].astype(object)),
+        'location': _location(df['location']),
+    })
+    prepared[['make', 'model']] = titles.parse_titles(names)[['make', 'model']]
+    prepared['words'] = _title_words(names)
+    return prepared
+
+
+class _UnionFind:
+    """
+    Union-find that also tracks the mileage range of every set, so a chain
+    of near matches cannot drift into one vehicle spanning many mileages.
+    """
+
+    def __init__(self, miles: np.ndarray):
+        self.parent = np.arange(len(miles))
+        self.low = miles.copy()
+        self.high = miles.copy()
+
+    def find(self, i: int) -> int:
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root:
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, a: int, b: int):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        low, high = min(self.low[a], self.low[b]), max(self.high[a], self.high[b])
+        if not high - low <= _miles_tolerance(high):
+            return
+        root, child = min(a, b), max(a, b)
+        self.parent[child] = root
+        self.low[root], self.high[root] = low, high
+
+
+def block_keys(prepared: pd.DataFrame) -> pd.Series:
+    """
+    Every row's (year, make, model, location) block as one string, '' for
+    listings without a year or make, which are never matched.
+    """
+    ok = prepared[['year_val', 'make', 'miles_val']].notna().all(axis=1)
+    year = prepared['year_val'].astype('Int64').astype(str)
+    keys = year + '|' + prepared['make'].fillna('') + '|' + prepared['model'].fillna('') + '|' + prepared['location']
+    return keys.where(ok, '')
+
+
+def _miles_tolerance(miles):
+    return np.maximum(MILES_SLACK, MILES_TOLERANCE * miles)
+
+
+def _similar_titles(a: frozenset, b: frozenset) -> bool:
+    return bool(a) and len(a & b) >= TITLE_MIN * len(a | b)
+
+
+def candidate_pairs(prepared: pd.DataFrame, window: int = WINDOW) -> np.ndarray:
+    """
+    (i, j) row positions of listings whose block matches and whose mileage
+    and price are close, from comparing each listing with the next `window`
+    listings of its block by mileage.
+    """
+    ok = prepared[['year_val', 'make', 'miles_val']].notna().all(axis=1).to_numpy()
+    rows = np.flatnonzero(ok)
+    if len(rows) < 2:
+        return np.empty((0, 2), dtype=int)
+    sub = prepared.iloc[rows]
+    block = sub.assign(model=sub['model'].fillna('')).groupby(
+        ['year_val', 'make', 'model', 'location'], sort=False).ngroup().to_numpy()
+    miles = sub['miles_val'].to_numpy(float)
+    order = np.lexsort((miles, block))
+    block, miles = block[order], miles[order]
+    price = sub['price_val'].to_numpy(float)[order]
+    rows = rows[order]
+    pairs = []
+    for k in range(1, window + 1):
+        if k >= len(rows):
+            break
+        a, b = slice(None, -k), slice(k, None)
+        high_miles = np.maximum(miles[a], miles[b])
+        high_price = np.maximum(price[a], price[b])
+        with np.errstate(invalid='ignore'):
+            close = (
+                (block[a] == block[b])
+                & (np.abs(miles[a] - miles[b]) <= _miles_tolerance(high_miles))
+                # a missing price does not rule a match out
+                & ~(np.abs(price[a] - price[b]) > PRICE_TOLERANCE * high_price)
+            )
+        pairs.append(np.column_stack([rows[a][close], rows[b][close]]))
+    return np.concatenate(pairs)
+
+
+def vehicle_ids(prepared: pd.DataFrame, window: int = WINDOW) -> pd.Series:
+    """The vehicle ID (lowest listing ID among its reposts) of every row of a `prepare`d frame."""
+    words = prepared['words'].tolist()
+    uf = _UnionFind(prepared['miles_val'].to_numpy(float))
+    for i, j in candidate_pairs(prepared, window):
+        if _similar_titles(words[i], words[j]):
+            uf.union(i, j)
+    roots = np.array([uf.find(i) for i in range(len(prepared))], dtype=int)
+    ids = prepared['listing_id'].to_numpy()
+    lowest = pd.Series(ids).groupby(roots).transform('min').to_numpy()
+    return pd.Series(lowest, index=prepared.index, name='vehicle_id')
+
+
+def update_vehicles(store, since: str = None) -> int:
+    """
+    Assign vehicles to the listings seen at or after `since` by re-matching
+    their blocks, and save the affected rows; every listing in the store
+    when `since` is None or no vehicles are saved yet. Returns the number of
+    listings whose rows were rewritten.
+    """
+    full = since is None or not store.has_vehicles()
+    prepared = prepare(store.listings_frame(None if full else since))
+    if not full:
+        if prepared.empty:
+            return 0
+        seen = prepared['listing_id']
+        blocks = (set(block_keys(prepared)) | store.vehicle_blocks(seen)) - {''}
+        others = prepare(store.block_listings(blocks))
+        prepared = pd.concat([others[~others['listing_id'].isin(seen)], prepared], ignore_index=True)
+    prepared['vehicle_id'] = vehicle_ids(prepared)
+    store.set_vehicles(zip(prepared['listing_id'].tolist(), prepared['vehicle_id'].tolist(),
+                           block_keys(prepared).tolist()), replace=full)
+    return len(prepared)
+
+
+def price_histories(store, vehicles: list) -> dict:
+    """
+    {vehicle_id: [(observed_at, price), ...]} across all of each vehicle's
+    listings, oldest first, keeping only the sightings where the price changed.
+    """
+    history = store.vehicle_observations(vehicles)
+    history['price_val'] = normalize.parse_prices(history['price'])
+    histories = {}
+    for vehicle, rows in history.groupby('vehicle_id', sort=False):
+        prices = rows['price_val']
+        changed = rows[prices.ne(prices.shift()) & prices.notna()]
+        histories[vehicle] = list(zip(changed['observed_at'], changed['price_val']))
+    return histories
+
+
+def format_history(history: list) -> str:
+    """'2025-05-01 $9,000 -> 2025-05-10 $8,500'"""
+    return ' -> '.join(f'{seen[:10]} ${price:,.0f}' for seen, price in history)
+
+
+if __name__ == '__main__':
+    from listing_store import ListingStore
+
+    with ListingStore() as store:
+        update_vehicles(store)
+        vehicles = store.vehicles()
+    reposted = vehicles['vehicle_id'].duplicated(keep=False)
+    print(f"{len(vehicles)} listings are {vehicles['vehicle_id'].nunique()} vehicles; "
+          f"{reposted.sum()} listings belong to a reposted vehicle")
@@ -0,0 +1,273 @@
+"""
+Discord webhook notifier with a persistent outbound queue.
+
+`DiscordNotifier.notify(listings)` turns listings into as many webhook
+messages as Discord's limits need (10 embeds per message, 25 fields per
+embed, 6000 characters of embed text per message), stores them in a SQLite
+outbox and then delivers the outbox in order. A message leaves the outbox
+only once Discord accepted it, so messages that could not be sent (Discord
+down, network errors) go out with the next notification or `flush()`.
+
+Delivery reuses one pooled requests.Session and honors Discord's rate
+limits: a 429 waits for its Retry-After before the same message is retried,
+and when X-RateLimit-Remaining reaches 0 the next message waits for
+X-RateLimit-Reset-After. Other server errors are retried with exponential
+backoff. Messages Discord rejects outright (other 4xx) are kept in the
+outbox as failed, for inspection.
+
+The webhook URL, session and sleep function are constructor arguments, so
+the notifier can be pointed at a local stub webhook server.
+
+    python discord_notifier.py flush    # retry whatever is left in the outbox
+"""
+import argparse
+import json
+import logging
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+
+import requests
+from decouple import config
+from requests.adapters import HTTPAdapter
+
+OUTBOX_PATH = Path(config('DISCORD_OUTBOX', default='discord_outbox.db'))
+
+# Discord's webhook limits.
+MAX_EMBEDS = 10
+MAX_FIELDS = 25
+MAX_MESSAGE_CHARS = 6000
+MAX_CONTENT = 2000
+MAX_TITLE = 256
+MAX_FIELD_NAME = 256
+MAX_FIELD_VALUE = 1024
+
+EMBED_COLOR = 3447003  # A nice blue color
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, id);
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def _truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+
+def listing_field(listing: dict) -> dict:
+    """One listing as an embed field."""
+    price = listing.get('price', 'N/A')
+    miles = f" - {listing.get('miles')}" if listing.get('miles') else ""
+    return {
+        "name": _truncate(f"{listing.get('name') or listing.get('title', 'N/A')} — {price}", MAX_FIELD_NAME),
+        "value": _truncate(f"📍 {listing.get('location', 'N/A')}{miles}\n[View Listing]({listing.get('link', '#')})",
+                           MAX_FIELD_VALUE),
+        "inline": False,
+    }
+
+
+def _field_chars(field: dict) -> int:
+    return len(field['name']) + len(field['value'])
+
+
+def build_messages(listings: list, content: str = None, title: str = None, description: str = None) -> list:
+    """
+    Webhook payloads for `listings`, one field each, split so that every
+    message stays within Discord's embed, field and character limits. The
+    first embed carries the title and description, the first message the
+    content.
+    """
+    title = _truncate(title or f"{len(listings)} new listings", MAX_TITLE)
+    header_chars = len(title) + len(description or '')
+    messages, embeds, fields = [], [], []
+    message_chars = header_chars
+
+    def close_embed():
+        nonlocal fields
+        embed = {"color": EMBED_COLOR, "fields": fields}
+        if not messages and not embeds:
+            embed["title"] = title
+            if description:
+                embed["description"] = description
+        embeds.append(embed)
+        fields = []
+
+    def close_message():
+        nonlocal embeds, message_chars
+        message = {"embeds": embeds}
+        if not messages and content:
+            message["content"] = _truncate(content, MAX_CONTENT)
+        messages.append(message)
+        embeds, message_chars = [], 0
+
+    for listing in listings:
+        field = listing_field(listing)
+        chars = _field_chars(field)
+        if message_chars + chars > MAX_MESSAGE_CHARS:
+            if fields:
+                close_embed()
+            close_message()
+        elif len(fields) == MAX_FIELDS:
+            close_embed()
+            if len(embeds) == MAX_EMBEDS:
+                close_message()
+        fields.append(field)
+        message_chars += chars
+    if fields:
+        close_embed()
+    if embeds:
+        close_message()
+    return messages
+
+
+def new_session(pool_size: int = 4) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def _retry_after(response: requests.Response) -> float:
+    """Seconds to wait after a 429, from the Retry-After header or the JSON body."""
+    try:
+        return float(response.headers['Retry-After'])
+    except (KeyError, ValueError):
+        pass
+    try:
+        return float(response.json().get('retry_after', 1.0))
+    except (ValueError, AttributeError):
+        return 1.0
+
+
+class DiscordNotifier:
+    def __init__(self, webhook_url: str, session: requests.Session = None, outbox_path: Path = OUTBOX_PATH,
+                 max_retries: int = 5, backoff: float = 1.0, timeout: float = 10.0, sleep=time.sleep):
+        self.webhook_url = webhook_url
+        self.session = session or new_session()
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.sleep = sleep
+        self.conn = sqlite3.connect(Path(outbox_path))
+        self.conn.executescript(SCHEMA)
+        # Set from the rate-limit headers of the last response.
+        self._blocked_until = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def enqueue(self, listings: list, content: str = None, title: str = None, description: str = None) -> int:
+        """Add the messages for `listings` to the outbox; returns how many were added."""
+        messages = build_messages(listings, content, title, description)
+        created_at = datetime.now().isoformat(timespec='seconds')
+        with self.conn:
+            self.conn.executemany('INSERT INTO outbox (payload, created_at) VALUES (?, ?)',
+                                  [(json.dumps(message), created_at) for message in messages])
+        return len(messages)
+
+    def pending(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
+
+    def flush(self) -> int:
+        """
+        Deliver the pending messages in order; returns how many were sent.
+        Stops at the first message that still fails after `max_retries`, so
+        the outbox keeps its order for the next flush.
+        """
+        if not self.webhook_url:
+            logger.warning("DISCORD_WEBHOOK_URL is not set. Skipping notification.")
+            return 0
+        sent = 0
+        rows = self.conn.execute("SELECT id, payload FROM outbox WHERE status = 'pending' ORDER BY id").fetchall()
+        for message_id, payload in rows:
+            status, error = self._deliver(json.loads(payload))
+            with self.conn:
+                if status == 'sent':
+                    self.conn.execute('DELETE FROM outbox WHERE id = ?', (message_id,))
+                else:
+                    self.conn.execute('UPDATE outbox SET attempts = attempts + 1, status = ?, last_error = ? '
+                                      'WHERE id = ?', (status, error, message_id))
+            if status == 'sent':
+                sent += 1
+            elif status == 'pending':
+                logger.error("Discord notification not delivered, %d message(s) left in the outbox: %s",
+                             len(rows) - sent, error)
+                break
+            else:
+                logger.error("Discord rejected notification message %d: %s", message_id, error)
+        if sent:
+            logger.info("Sent %d Discord notification message(s).", sent)
+        return sent
+
+    def notify(self, listings: list, content: str = None, title: str = None, description: str = None) -> int:
+        """Queue the messages for `listings` and deliver the outbox."""
+        if listings:
+            self.enqueue(listings, content, title, description)
+        return self.flush()
+
+    def _deliver(self, payload: dict) -> tuple:
+        """('sent' | 'pending' | 'failed', error) for one message."""
+        error = None
+        attempt = 0
+        while attempt <= self.max_retries:
+            wait = self._blocked_until - time.monotonic()
+            if wait > 0:
+                self.sleep(wait)
+            try:
+                response = self.session.post(self.webhook_url, json=payload, params={'wait': 'true'},
+                                             timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                error = f'{type(e).__name__}: {e}'
+            else:
+                self._track_rate_limit(response)
+                if response.ok:
+                    return 'sent', None
+                error = f'{response.status_code}: {response.text[:200]}'
+                if response.status_code == 429:
+                    # Rate limited: wait as long as Discord asks instead of backing off.
+                    self.sleep(_retry_after(response))
+                    attempt += 1
+                    continue
+                if response.status_code < 500:
+                    return 'failed', error
+            self.sleep(self.backoff * 2 ** attempt)
+            attempt += 1
+        return 'pending', error
+
+    def _track_rate_limit(self, response: requests.Response):
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            try:
+                reset_after = float(response.headers.get('X-RateLimit-Reset-After', 0))
+            except ValueError:
+                return
+            self._blocked_until = time.monotonic() + reset_after
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Deliver the Discord notification outbox.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('flush', help='send the messages still waiting in the outbox')
+    parser.add_argument('--outbox', default=str(OUTBOX_PATH))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=config('LOG_LEVEL', default='INFO').upper(), format='%(levelname)s %(name)s: %(message)s')
+    with DiscordNotifier(config('DISCORD_WEBHOOK_URL', default=''), outbox_path=args.outbox) as notifier:
+        notifier.flush()
+        print(f"{notifier.pending()} message(s) still pending in {args.outbox}")
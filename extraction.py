@@ -0,0 +1,65 @@
+"""
+Listing-card extraction backends.
+
+A card spec maps each field of a listing card to a CSS selector or a
+fallback chain of selectors (see selector_registry.py):
+
+    {'card': ..., 'title': ..., 'price': ..., 'link': ..., 'subtext': ...}
+
+Every backend turns cards into the same raw field dicts
+
+    {'title', 'price', 'href', 'location', 'miles'}
+
+where a field is None when its element is missing. Crawlers shape those into
+their own result records, so switching backend never changes the output.
+
+Backends:
+- 'bs4', 'lxml', 'selectolax': parse card HTML in Python with one of the
+  parsers in parsers.py.
+- 'dom': run one `page.evaluate` over the cards inside the browser and return
+  only the fields, skipping HTML serialization and Python-side parsing.
+"""
+from parsers import PARSERS, get_parser
+
+BACKENDS = tuple(PARSERS) + ('dom',)
+
+
+# Extract the fields of cards not extracted yet and mark them.
+COLLECT_NEW_CARD_FIELDS_JS = '''([selector, attr, spec]) => {
+    const chain = value => (Array.isArray(value) ? value : [value]);
+    const first = (card, value) => {
+        for (const sel of chain(value)) {
+            const el = card.querySelector(sel);
+            if (el) return el;
+        }
+        return null;
+    };
+    const all = (card, value) => {
+        for (const sel of chain(value)) {
+            const els = card.querySelectorAll(sel);
+            if (els.length) return Array.from(els);
+        }
+        return [];
+    };
+    const text = el => (el ? el.textContent : null);
+    const fresh = [];
+    for (const card of document.querySelectorAll(selector)) {
+        if (card.hasAttribute(attr)) continue;
+        card.setAttribute(attr, '');
+        const link = first(card, spec.link);
+        const subtexts = all(card, spec.subtext).map(text);
+        fresh.push({
+            title: text(first(card, spec.title)),
+            price: text(first(card, spec.price)),
+            href: link ? link.getAttribute('href') : null,
+            location: subtexts.length ? subtexts[0] : null,
+            miles: subtexts.find(t => t.includes('miles')) || '',
+        });
+    }
+    return fresh;
+}'''
+
+
+def parse_cards(html: str, spec: dict, backend: str = 'bs4') -> list:
+    """Parse a page or concatenated card fragments into raw field dicts."""
+    return get_parser(backend, spec).parse(html)
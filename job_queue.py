@@ -0,0 +1,194 @@
+"""
+In-process queue of background crawl jobs.
+
+`submit()` puts a crawl on the queue and returns its Job straight away; a
+fixed number of workers run the queued jobs one at a time each, so at most
+`workers` crawls from the queue use the browser pool at once. A job's
+status goes queued -> running -> done (with its listings) or failed (with
+the error). A job that could not get a crawl slot or browser in time (one
+of `retry_errors`) goes back to queued after `retry_delay` seconds, doubled
+on every attempt; after `max_retries` such attempts it ends as retry, which
+means the crawl never ran and can simply be submitted again.
+
+A crawl submitted while an identical one (same city, query, price band and
+scroll budget, see cities.search_key) is still queued or running is
+coalesced into it: the caller gets the existing job instead of a second
+crawl of the same search. Finished jobs are kept for `retention` seconds
+so clients can poll for their results.
+"""
+import asyncio
+import time
+import uuid
+from typing import NamedTuple, Optional
+
+import cities
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+RETRY = 'retry'
+
+
+class JobQueueFull(Exception):
+    """Raised when `max_queued` jobs are already waiting."""
+
+
+class CrawlRequest(NamedTuple):
+    city: str
+    query: str
+    min_price: int
+    max_price: int
+    max_scrolls: int = 0
+    max_listings: Optional[int] = None
+
+    @property
+    def key(self) -> tuple:
+        return cities.search_key(self.city, self.query, self.min_price, self.max_price) + (
+            self.max_scrolls, self.max_listings)
+
+
+class Job:
+    def __init__(self, request: CrawlRequest):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.status = QUEUED
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.retries = 0
+        # Later submissions of the same search that were folded into this job.
+        self.coalesced = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED, RETRY)
+
+    def as_dict(self, results: bool = True) -> dict:
+        job = {
+            'job_id': self.id,
+            'status': self.status,
+            **self.request._asdict(),
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'coalesced': self.coalesced,
+            'error': self.error,
+            'retries': self.retries,
+            'retryable': self.status == RETRY,
+        }
+        if self.result is not None:
+            job['listings'] = len(self.result)
+            if results:
+                job['results'] = self.result
+        return job
+
+
+class JobQueue:
+    """
+    Runs `run(request)` (a coroutine function returning the listings) for
+    every submitted CrawlRequest on `workers` worker tasks. Exceptions in
+    `retry_errors` mean the crawl never got to run (no free slot or browser):
+    the job is queued again with a backoff, and ends as RETRY instead of
+    FAILED once `max_retries` are used up.
+    """
+
+    def __init__(self, run, workers: int, max_queued: int = 100, retention: float = 3600, retry_errors: tuple = (),
+                 max_retries: int = 3, retry_delay: float = 5.0):
+        self._run = run
+        self.retry_errors = tuple(retry_errors)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self._queue = asyncio.Queue()
+        self._jobs = {}
+        self._active = {}  # search key -> queued or running job
+        self._tasks = []
+        self._retries = set()  # timer handles of jobs waiting to be queued again
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        for handle in self._retries:
+            handle.cancel()
+        self._retries = set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, request: CrawlRequest) -> tuple:
+        """
+        Queue a crawl, or join the identical one already in flight. Returns
+        (job, created); raises JobQueueFull when too many jobs are waiting.
+        """
+        self._prune()
+        job = self._active.get(request.key)
+        if job is not None:
+            job.coalesced += 1
+            return job, False
+        if self._queue.qsize() >= self.max_queued:
+            raise JobQueueFull(f'{self._queue.qsize()} crawl jobs queued, try again later.')
+        job = Job(request)
+        self._jobs[job.id] = job
+        self._active[request.key] = job
+        self._queue.put_nowait(job)
+        return job, True
+
+    def get(self, job_id: str):
+        """The job with that ID, or None if it is unknown or expired."""
+        self._prune()
+        return self._jobs.get(job_id)
+
+    def metrics(self) -> dict:
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0, RETRY: 0}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return {'job_workers': self.workers, **{f'jobs_{status}': count for status, count in counts.items()}}
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.status = RUNNING
+            job.started_at = time.time()
+            try:
+                job.result = await self._run(job.request)
+                job.status = DONE
+            except self.retry_errors as e:
+                job.error = f'{type(e).__name__}: {e}'
+                if job.retries < self.max_retries:
+                    self._retry_later(job)
+                    continue
+                job.status = RETRY
+            except Exception as e:
+                job.error = f'{type(e).__name__}: {e}'
+                job.status = FAILED
+            finally:
+                self._queue.task_done()
+            job.finished_at = time.time()
+            # Later submissions of this search start a fresh crawl.
+            self._active.pop(job.request.key, None)
+
+    def _retry_later(self, job: Job):
+        # The job stays active, so submissions of its search still join it.
+        delay = self.retry_delay * 2 ** job.retries
+        job.retries += 1
+        job.status = QUEUED
+
+        def requeue():
+            self._retries.discard(handle)
+            self._queue.put_nowait(job)
+
+        handle = asyncio.get_running_loop().call_later(delay, requeue)
+        self._retries.add(handle)
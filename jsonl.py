@@ -0,0 +1,133 @@
+"""
+Append-only JSON Lines files of crawl records.
+
+One record per line, so writers append a run's records without rewriting
+the file, and readers handle one record at a time in constant memory
+instead of loading a whole JSON array. The compression follows the file
+name: `.jsonl` is plain text, `.jsonl.gz` gzip and `.jsonl.zst` zstd (needs
+the optional zstandard package). Every append to a compressed file adds a
+new gzip member / zstd frame, which the reader reads straight through.
+
+    with JsonlWriter('batch_results.jsonl.gz') as out:
+        out.write_many(records)
+
+    for record in iter_records('batch_results.jsonl.gz'):
+        ...
+"""
+import gzip
+import io
+import json
+from itertools import islice
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SUFFIXES = ('.jsonl', '.jsonl.gz', '.jsonl.zst', '.ndjson')
+
+
+def is_jsonl(path) -> bool:
+    return Path(path).name.endswith(SUFFIXES)
+
+
+def _compression(path: Path):
+    if path.suffix == '.gz':
+        return 'gzip'
+    if path.suffix == '.zst':
+        if zstandard is None:
+            raise ImportError("zstd-compressed JSON Lines need zstandard: pip install zstandard")
+        return 'zstd'
+    return None
+
+
+def _open_append(path: Path):
+    compression = _compression(path)
+    if compression == 'gzip':
+        return gzip.open(path, 'at', encoding='utf-8')
+    if compression == 'zstd':
+        raw = path.open('ab')
+        return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(raw, closefd=True), encoding='utf-8')
+    return path.open('a', encoding='utf-8')
+
+
+def _open_read(path: Path):
+    compression = _compression(path)
+    if compression == 'gzip':
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if compression == 'zstd':
+        raw = path.open('rb')
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return io.TextIOWrapper(reader, encoding='utf-8')
+    return path.open('r', encoding='utf-8')
+
+
+class JsonlWriter:
+    """Appends records to a JSON Lines file, creating it if needed."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = _open_append(self.path)
+        self.written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, record: dict):
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.written += 1
+
+    def write_many(self, records) -> int:
+        start = self.written
+        for record in records:
+            self.write(record)
+        return self.written - start
+
+    def close(self):
+        self._file.close()
+
+
+def append_records(path, records) -> int:
+    """Append `records` to the file at `path`; returns how many were written."""
+    with JsonlWriter(path) as out:
+        return out.write_many(records)
+
+
+def iter_records(path):
+    """
+    Yield the records of a JSON Lines file one at a time. Blank lines are
+    skipped; a malformed line raises json.JSONDecodeError with its number.
+    """
+    for _, record in iter_lines(path):
+        yield record
+
+
+def iter_lines(path, start: int = 0):
+    """
+    Yield (line number, record) for the records after the first `start`
+    lines, e.g. to resume reading a file that has been appended to. A
+    malformed last line without its newline is still being written and ends
+    the file.
+    """
+    with _open_read(Path(path)) as f:
+        for number, line in enumerate(f, 1):
+            if number <= start or not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except json.JSONDecodeError as e:
+                if not line.endswith('\n'):
+                    return
+                raise json.JSONDecodeError(f'{path} line {number}: {e.msg}', e.doc, e.pos) from None
+
+
+def batched(records, size: int):
+    """Lists of up to `size` records, for batched writes in constant memory."""
+    records = iter(records)
+    while batch := list(islice(records, size)):
+        yield batch
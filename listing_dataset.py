@@ -0,0 +1,172 @@
+"""
+Partitioned Parquet dataset of scraped listings.
+
+Every crawl appends one row per listing sighting with already-typed columns
+(`listing_id`, `price_val`, `miles_val`, `year_val`, `scraped_at`, plus the
+title, location, query and city), partitioned by scrape date and query:
+
+    listing_dataset/date=2025-05-24/query=car/part-<uuid>-0.parquet
+
+Readers such as the regression memory-map the files and load only the
+columns and partitions they need, instead of re-parsing price and mileage
+strings for every historical record.
+
+Needs pyarrow (optional): `available()` says whether it is installed, and
+the crawlers skip the dataset with a warning when it is not. Listings
+already in the SQLite store are copied over with
+
+    python listing_dataset.py backfill
+"""
+import argparse
+import logging
+import re
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+from decouple import config
+
+import normalize
+from listing_ids import record_id
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+except ImportError:
+    pa = None
+
+DATASET_DIR = Path(config('LISTING_DATASET', default='listing_dataset/'))
+
+PARTITION_COLUMNS = ['date', 'query']
+# Typed columns every reader can rely on.
+TYPED_COLUMNS = ['listing_id', 'price_val', 'miles_val', 'year_val', 'scraped_at']
+
+_warned = False
+
+logger = logging.getLogger(__name__)
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def _schema():
+    return pa.schema([
+        ('listing_id', pa.int64()),
+        ('price_val', pa.float64()),
+        ('miles_val', pa.float64()),
+        ('year_val', pa.float64()),
+        ('scraped_at', pa.timestamp('s')),
+        ('title', pa.string()),
+        ('location', pa.string()),
+        ('city', pa.string()),
+        ('date', pa.string()),
+        ('query', pa.string()),
+    ])
+
+
+def _partitioning():
+    return ds.partitioning(pa.schema([(name, pa.string()) for name in PARTITION_COLUMNS]), flavor='hive')
+
+
+def partition_value(query) -> str:
+    """Query as a partition directory name."""
+    value = re.sub(r'[^\w]+', '_', query or '').strip('_')
+    return value or 'unknown'
+
+
+def typed_frame(records: list, query: str = None, city: str = None, scraped_at: datetime = None) -> pd.DataFrame:
+    """Crawler records as a frame with the dataset's typed columns."""
+    scraped_at = (scraped_at or datetime.now()).replace(microsecond=0)
+    records = [rec for rec in records if record_id(rec) is not None]
+    titles = pd.Series([rec.get('title') or rec.get('name') for rec in records], dtype=object)
+    df = pd.DataFrame({
+        'listing_id': pd.Series([record_id(rec) for rec in records], dtype='int64'),
+        'price_val': normalize.parse_prices(pd.Series([rec.get('price') for rec in records], dtype=object)),
+        'miles_val': normalize.parse_miles(pd.Series([rec.get('miles') for rec in records], dtype=object)),
+        'year_val': normalize.parse_years(titles),
+        'scraped_at': pd.Series([scraped_at] * len(records), dtype='datetime64[s]'),
+        'title': titles,
+        'location': pd.Series([rec.get('location') for rec in records], dtype=object),
+        'city': pd.Series([rec.get('city', city) for rec in records], dtype=object),
+    })
+    df['date'] = scraped_at.strftime('%Y-%m-%d')
+    df['query'] = [partition_value(rec.get('query', query)) for rec in records]
+    return df
+
+
+def write_records(records: list, query: str = None, city: str = None, scraped_at: datetime = None,
+                  root: Path = DATASET_DIR) -> int:
+    """Append one crawl's records to the dataset; returns the rows written."""
+    global _warned
+    if not available():
+        if not _warned:
+            logger.warning("pyarrow is not installed, skipping the Parquet listing dataset.")
+            _warned = True
+        return 0
+    df = typed_frame(records, query, city, scraped_at)
+    if df.empty:
+        return 0
+    table = pa.Table.from_pandas(df, schema=_schema(), preserve_index=False)
+    ds.write_dataset(table, str(root), format='parquet', partitioning=_partitioning(),
+                     basename_template=f'part-{uuid.uuid4().hex}-{{i}}.parquet',
+                     existing_data_behavior='overwrite_or_ignore')
+    return len(df)
+
+
+def read(columns: list = None, since: datetime = None, query: str = None, root: Path = DATASET_DIR) -> pd.DataFrame:
+    """
+    Load the dataset (memory-mapped) as a DataFrame with only `columns`,
+    optionally only rows scraped at or after `since` and for one query.
+    Partitions outside the date range or query are not opened.
+    """
+    if not available():
+        raise ImportError("The listing dataset needs pyarrow: pip install pyarrow")
+    if not Path(root).exists():
+        return pd.DataFrame(columns=columns or _schema().names)
+    dataset = ds.dataset(str(root), format='parquet', partitioning=_partitioning(),
+                         filesystem=fs.LocalFileSystem(use_mmap=True))
+    expression = None
+    if since is not None:
+        expression = (ds.field('date') >= since.strftime('%Y-%m-%d')) & (ds.field('scraped_at') >= pa.scalar(since, pa.timestamp('s')))
+    if query is not None:
+        by_query = ds.field('query') == partition_value(query)
+        expression = by_query if expression is None else expression & by_query
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+def latest(df: pd.DataFrame) -> pd.DataFrame:
+    """The most recent sighting of each listing."""
+    return df.sort_values('scraped_at', kind='stable').drop_duplicates('listing_id', keep='last')
+
+
+def backfill(store, root: Path = DATASET_DIR) -> int:
+    """Write every sighting in the listing store to the dataset, grouped by sighting time."""
+    rows = store.conn.execute(
+        'SELECT o.listing_id, o.observed_at, o.price, l.title, l.location, l.miles, l.query, l.city '
+        'FROM observations o JOIN listings l USING (listing_id) ORDER BY o.observed_at')
+    total, batch, batch_time = 0, [], None
+    for row in rows:
+        if row['observed_at'] != batch_time and batch:
+            total += write_records(batch, scraped_at=datetime.fromisoformat(batch_time), root=root)
+            batch = []
+        batch_time = row['observed_at']
+        batch.append(dict(row))
+    if batch:
+        total += write_records(batch, scraped_at=datetime.fromisoformat(batch_time), root=root)
+    return total
+
+
+if __name__ == '__main__':
+    from listing_store import DB_PATH, ListingStore
+
+    parser = argparse.ArgumentParser(description='Manage the Parquet listing dataset.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('backfill', help='copy every sighting in the SQLite listing store into the dataset')
+    parser.add_argument('--db', default=str(DB_PATH))
+    args = parser.parse_args()
+
+    with ListingStore(args.db) as store:
+        print(f"Wrote {backfill(store)} rows to {DATASET_DIR}")
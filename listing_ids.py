@@ -0,0 +1,75 @@
+"""
+Marketplace listing IDs.
+
+Every listing URL contains `/marketplace/item/<id>/`; the numeric ID is the
+stable identity of a listing no matter which tracking parameters or URL
+prefix the link was scraped with. Crawlers add it to every record as
+`listing_id`, and all seen/alerted state and dedupe is keyed by it. State
+files store the IDs as plain integers.
+"""
+import json
+import re
+from pathlib import Path
+
+LISTING_ID_RE = re.compile(r'/marketplace/item/(\d+)')
+
+
+def listing_id(text: str):
+    """The listing ID in a URL or card HTML as an int, or None."""
+    if not text:
+        return None
+    match = LISTING_ID_RE.search(text)
+    return int(match.group(1)) if match else None
+
+
+def canonical_url(lid: int) -> str:
+    """The tracking-free URL of a listing."""
+    return f'https://www.facebook.com/marketplace/item/{lid}/'
+
+
+def record_id(record: dict):
+    """A record's listing ID, parsed from its link for records saved without one."""
+    lid = record.get('listing_id')
+    return int(lid) if lid is not None else listing_id(record.get('link'))
+
+
+def _as_id(key):
+    # State files used to be keyed by full (or relative) listing URLs.
+    if isinstance(key, int):
+        return key
+    return int(key) if key.isdigit() else listing_id(key)
+
+
+def load_id_set(path: Path) -> set:
+    """
+    Load a set of listing IDs saved by `save_id_set`. Legacy files holding
+    listing URLs are converted on the fly; entries without an ID are dropped.
+    """
+    with Path(path).open(encoding='utf-8') as f:
+        ids = {_as_id(key) for key in json.load(f)}
+    ids.discard(None)
+    return ids
+
+
+def save_id_set(path: Path, ids: set):
+    """Save listing IDs as one compact, sorted JSON array of integers."""
+    with Path(path).open('w', encoding='utf-8') as f:
+        json.dump(sorted(ids), f, separators=(',', ':'))
+
+
+def load_id_map(path: Path) -> dict:
+    """Load a {listing ID: value} dict saved by `save_id_map`, converting legacy URL keys."""
+    with Path(path).open(encoding='utf-8') as f:
+        data = json.load(f)
+    result = {}
+    for key, value in data.items():
+        lid = _as_id(key)
+        if lid is not None:
+            result.setdefault(lid, value)
+    return result
+
+
+def save_id_map(path: Path, mapping: dict):
+    """Save a {listing ID: value} dict; JSON object keys are the IDs as strings."""
+    with Path(path).open('w', encoding='utf-8') as f:
+        json.dump({str(lid): value for lid, value in sorted(mapping.items())}, f, indent=2)
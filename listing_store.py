@@ -0,0 +1,430 @@
+"""
+SQLite listing store.
+
+`listings` has one row per Marketplace listing (keyed by listing ID, see
+listing_ids.py) with its latest price and when it was first and last seen;
+`observations` has one row per sighting of a listing with the price at that
+time (crawlers that revisit the same listings record only the sightings at
+a new price, see price_drops.py), and `vehicles` maps reposts of the same
+car to one vehicle ID (see dedupe.py). Crawlers upsert each run's records in one transaction, and the
+regression reads the listings back instead of re-reading every JSON file.
+
+The database runs in WAL mode so a crawler can write while the regression
+or the API reads.
+
+Import the JSON files written before the store existed, and JSON Lines
+files such as the scheduler's batch results, with
+
+    python listing_store.py import [json_data/ archive/ batch_results.jsonl ...]
+
+JSON Lines files (see jsonl.py) are streamed in batches of IMPORT_BATCH
+records, so their size does not matter. Imported files are remembered with
+how many lines were read, so running the importer again only picks up new
+files and the records appended to JSON Lines files since.
+"""
+import argparse
+import gzip
+import json
+import re
+import sqlite3
+from itertools import groupby
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+from decouple import config
+
+import jsonl
+from listing_ids import canonical_url, record_id
+
+DB_PATH = Path(config('LISTING_DB', default='listings.db'))
+
+# Records upserted per transaction when streaming a JSON Lines import.
+IMPORT_BATCH = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    listing_id INTEGER PRIMARY KEY,
+    title TEXT,
+    price TEXT,
+    location TEXT,
+    miles TEXT,
+    link TEXT,
+    query TEXT,
+    city TEXT,
+    year INTEGER,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS observations (
+    listing_id INTEGER NOT NULL REFERENCES listings (listing_id),
+    observed_at TEXT NOT NULL,
+    price TEXT
+);
+CREATE TABLE IF NOT EXISTS vehicles (
+    listing_id INTEGER PRIMARY KEY REFERENCES listings (listing_id),
+    vehicle_id INTEGER NOT NULL,
+    block TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS imported_files (
+    path TEXT PRIMARY KEY,
+    imported_at TEXT NOT NULL,
+    records INTEGER NOT NULL,
+    lines INTEGER,
+    size INTEGER,
+    mtime REAL
+);
+CREATE INDEX IF NOT EXISTS listings_query ON listings (query);
+CREATE INDEX IF NOT EXISTS listings_city ON listings (city);
+CREATE INDEX IF NOT EXISTS listings_year ON listings (year);
+CREATE INDEX IF NOT EXISTS listings_first_seen ON listings (first_seen);
+CREATE INDEX IF NOT EXISTS listings_last_seen ON listings (last_seen);
+CREATE INDEX IF NOT EXISTS observations_listing ON observations (listing_id, observed_at);
+CREATE INDEX IF NOT EXISTS vehicles_vehicle ON vehicles (vehicle_id);
+CREATE INDEX IF NOT EXISTS vehicles_block ON vehicles (block);
+"""
+
+# The latest sighting's fields win (imports can be older than what is
+# stored); the query and city it was first found with are kept.
+UPSERT_LISTING = """
+INSERT INTO listings (listing_id, title, price, location, miles, link, query, city, year, first_seen, last_seen)
+VALUES (:listing_id, :title, :price, :location, :miles, :link, :query, :city, :year, :seen, :seen)
+ON CONFLICT (listing_id) DO UPDATE SET
+    title = CASE WHEN excluded.last_seen >= listings.last_seen THEN excluded.title ELSE listings.title END,
+    price = CASE WHEN excluded.last_seen >= listings.last_seen THEN excluded.price ELSE listings.price END,
+    location = CASE WHEN excluded.last_seen >= listings.last_seen THEN excluded.location ELSE listings.location END,
+    miles = CASE WHEN excluded.last_seen >= listings.last_seen THEN excluded.miles ELSE listings.miles END,
+    query = COALESCE(listings.query, excluded.query),
+    city = COALESCE(listings.city, excluded.city),
+    year = COALESCE(excluded.year, listings.year),
+    first_seen = MIN(listings.first_seen, excluded.first_seen),
+    last_seen = MAX(listings.last_seen, excluded.last_seen)
+"""
+
+INSERT_OBSERVATION = "INSERT INTO observations (listing_id, observed_at, price) VALUES (:listing_id, :seen, :price)"
+
+# Only for listings that have no sighting yet (see `upsert(observe='new')`).
+INSERT_FIRST_OBSERVATION = """
+INSERT INTO observations (listing_id, observed_at, price)
+SELECT :listing_id, :seen, :price
+WHERE NOT EXISTS (SELECT 1 FROM observations WHERE listing_id = :listing_id)
+"""
+
+# Only when the price differs from the listing's latest sighting (see
+# `upsert(observe='changed')`), so re-sightings only grow the history when
+# the price moved.
+INSERT_CHANGED_OBSERVATION = """
+INSERT INTO observations (listing_id, observed_at, price)
+SELECT :listing_id, :seen, :price
+WHERE :price IS NOT (SELECT price FROM observations WHERE listing_id = :listing_id
+                     ORDER BY observed_at DESC LIMIT 1)
+"""
+
+YEAR_RE = re.compile(r"((?:19|20)\d{2})")
+
+# json_data/<query>_2025-05-24_14-47-02.json and archive/all_records_20250524_144702.json
+FILE_TIMESTAMP_RE = re.compile(r'^(?P<query>.*?)_?(?P<ts>\d{4}-?\d{2}-?\d{2}_\d{2}-?\d{2}-?\d{2})$')
+FILE_SUFFIX_RE = re.compile(r'\.(?:json|jsonl|ndjson)(?:\.gz|\.zst)?$')
+
+
+def now() -> str:
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def _year(title: str):
+    match = YEAR_RE.search(title or '')
+    return int(match.group(1)) if match else None
+
+
+def _chunks(seq: list, size: int = 500):
+    """Consecutive slices of `seq`, one query each, to stay below SQLite's bound-parameter limit."""
+    for start in range(0, len(seq), size):
+        yield seq[start:start + size]
+
+
+class ListingStore:
+    def __init__(self, path: Path = DB_PATH):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        # `vehicles` is derived (see dedupe.py): a table from before it kept
+        # each listing's block is dropped and rebuilt on the next update.
+        columns = [row['name'] for row in self.conn.execute('PRAGMA table_info(vehicles)')]
+        if columns and 'block' not in columns:
+            self.conn.execute('DROP TABLE vehicles')
+        # Files imported before the importer resumed appended files count as fully read.
+        columns = [row['name'] for row in self.conn.execute('PRAGMA table_info(imported_files)')]
+        if columns and 'lines' not in columns:
+            for column in ('lines INTEGER', 'size INTEGER', 'mtime REAL'):
+                self.conn.execute(f'ALTER TABLE imported_files ADD COLUMN {column}')
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def _row(record: dict, seen: str, query: str, city: str):
+        if record.get('name') == 'No Title' and record.get('price') == 'No Price':
+            return None
+        lid = record_id(record)
+        if lid is None:
+            return None
+        title = record.get('title') or record.get('name')
+        return {
+            'listing_id': lid,
+            'title': title,
+            'price': record.get('price'),
+            'location': record.get('location'),
+            'miles': record.get('miles'),
+            'link': canonical_url(lid),
+            'query': record.get('query', query),
+            'city': record.get('city', city),
+            'year': _year(title),
+            'seen': seen,
+        }
+
+    def upsert(self, records: list, query: str = None, city: str = None, seen: str = None,
+               observe: str = 'all') -> int:
+        """
+        Insert or refresh `records` (crawler result dicts) in one transaction
+        and record a sighting of each at `seen` (default now). With
+        `observe='new'` only listings without any sighting get one, for
+        snapshots that repeat earlier sightings; with `observe='changed'`
+        only sightings at a new price are recorded, for crawlers that see
+        the same listings run after run. Returns the number of listings
+        written; records without a listing ID are skipped.
+        """
+        seen = seen or now()
+        rows = [row for row in (self._row(rec, seen, query, city) for rec in records) if row is not None]
+        with self.conn:
+            self.conn.executemany(UPSERT_LISTING, rows)
+            if observe == 'all':
+                self.conn.executemany(INSERT_OBSERVATION, rows)
+            elif observe == 'new':
+                self.conn.executemany(INSERT_FIRST_OBSERVATION, rows)
+            elif observe == 'changed':
+                self.conn.executemany(INSERT_CHANGED_OBSERVATION, rows)
+        return len(rows)
+
+    def records(self, query: str = None, city: str = None, min_year: int = None, since: str = None) -> list:
+        """
+        Listings as crawler-style record dicts, optionally filtered. `since`
+        keeps the listings seen at or after that time.
+        """
+        clauses, params = [], []
+        filters = (('query', '=', query), ('city', '=', city), ('year', '>=', min_year), ('last_seen', '>=', since))
+        for column, op, value in filters:
+            if value is not None:
+                clauses.append(f'{column} {op} ?')
+                params.append(value)
+        return self._select(f" WHERE {' AND '.join(clauses)}" if clauses else '', params)
+
+    def latest_prices(self, ids: list) -> dict:
+        """
+        {listing_id: (price, last_seen)} for the given IDs that are in the
+        store, read from the listings' primary key in one query per 500 IDs.
+        """
+        ids = [int(lid) for lid in ids]
+        latest = {}
+        for chunk in _chunks(ids):
+            rows = self.conn.execute(
+                f"SELECT listing_id, price, last_seen FROM listings WHERE listing_id IN ({', '.join('?' * len(chunk))})",
+                chunk)
+            latest.update((row['listing_id'], (row['price'], row['last_seen'])) for row in rows)
+        return latest
+
+    def price_history(self, lid: int) -> list:
+        """[(observed_at, price), ...] of one listing, oldest first."""
+        rows = self.conn.execute('SELECT observed_at, price FROM observations WHERE listing_id = ? '
+                                 'ORDER BY observed_at', (int(lid),))
+        return [tuple(row) for row in rows]
+
+    def records_by_id(self, ids: list) -> list:
+        """The listings with the given IDs, as record dicts."""
+        ids = [int(lid) for lid in ids]
+        records = []
+        for chunk in _chunks(ids):
+            records += self._select(f" WHERE listing_id IN ({', '.join('?' * len(chunk))})", chunk)
+        return records
+
+    def _select(self, where: str, params: list) -> list:
+        rows = self.conn.execute(
+            'SELECT listing_id, title, price, location, miles, link, query, city, first_seen, last_seen '
+            f'FROM listings{where} ORDER BY first_seen', params)
+        return [{'name': row['title'], **dict(row)} for row in rows]
+
+    def listings_frame(self, since: str = None) -> pd.DataFrame:
+        """The fields dedupe.py matches on, of every listing or the ones seen at or after `since`."""
+        where, params = (' WHERE last_seen >= ?', [since]) if since is not None else ('', [])
+        return pd.read_sql_query(
+            f'SELECT listing_id, title, price, location, miles, last_seen FROM listings{where}', self.conn, params=params)
+
+    def block_listings(self, blocks: list) -> pd.DataFrame:
+        """Like `listings_frame`, for the listings the vehicles table has in the given blocks."""
+        blocks = list(blocks)
+        frames = [pd.DataFrame(columns=['listing_id', 'title', 'price', 'location', 'miles', 'last_seen'])]
+        for chunk in _chunks(blocks):
+            frames.append(pd.read_sql_query(
+                'SELECT l.listing_id, l.title, l.price, l.location, l.miles, l.last_seen FROM listings l '
+                f"JOIN vehicles v USING (listing_id) WHERE v.block IN ({', '.join('?' * len(chunk))})",
+                self.conn, params=chunk))
+        return pd.concat(frames, ignore_index=True)
+
+    def vehicle_blocks(self, ids: list) -> set:
+        """The blocks the vehicles table has for the given listing IDs."""
+        ids = [int(lid) for lid in ids]
+        blocks = set()
+        for chunk in _chunks(ids):
+            rows = self.conn.execute(
+                f"SELECT DISTINCT block FROM vehicles WHERE listing_id IN ({', '.join('?' * len(chunk))})", chunk)
+            blocks.update(row['block'] for row in rows)
+        return blocks
+
+    def has_vehicles(self) -> bool:
+        return self.conn.execute('SELECT EXISTS (SELECT 1 FROM vehicles)').fetchone()[0] == 1
+
+    def set_vehicles(self, rows, replace: bool = True) -> None:
+        """
+        Save `rows` of (listing_id, vehicle_id, block). With `replace` they
+        replace the whole mapping, otherwise only those listings' rows.
+        """
+        with self.conn:
+            if replace:
+                self.conn.execute('DELETE FROM vehicles')
+            self.conn.executemany('INSERT OR REPLACE INTO vehicles (listing_id, vehicle_id, block) VALUES (?, ?, ?)',
+                                  rows)
+
+    def vehicles(self) -> pd.DataFrame:
+        """listing_id, vehicle_id and last_seen of every listing with a vehicle."""
+        return pd.read_sql_query(
+            'SELECT v.listing_id, v.vehicle_id, l.last_seen FROM vehicles v JOIN listings l USING (listing_id)',
+            self.conn)
+
+    def vehicle_observations(self, vehicle_ids: list) -> pd.DataFrame:
+        """Every sighting of the listings of the given vehicles (vehicle_id, listing_id, observed_at, price), oldest first."""
+        ids = [int(vid) for vid in vehicle_ids]
+        if not ids:
+            return pd.DataFrame(columns=['vehicle_id', 'listing_id', 'observed_at', 'price'])
+        frames = []
+        for chunk in _chunks(ids):
+            frames.append(pd.read_sql_query(
+                'SELECT v.vehicle_id, o.listing_id, o.observed_at, o.price FROM observations o '
+                f"JOIN vehicles v USING (listing_id) WHERE v.vehicle_id IN ({', '.join('?' * len(chunk))})",
+                self.conn, params=chunk))
+        return pd.concat(frames, ignore_index=True).sort_values('observed_at', kind='stable')
+
+    def count(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM listings').fetchone()[0]
+
+    def import_start(self, path: Path):
+        """
+        The line to resume importing `path` from: 0 for a new file, None when
+        there is nothing new in it. JSON Lines files that grew since they were
+        imported resume after the lines already read (from the start when
+        they shrank, i.e. were replaced); JSON files are imported once.
+        """
+        path = Path(path)
+        row = self.conn.execute('SELECT lines, size, mtime FROM imported_files WHERE path = ?',
+                                (str(path.resolve()),)).fetchone()
+        if row is None:
+            return 0
+        stat = path.stat()
+        if row['lines'] is None or not jsonl.is_jsonl(path) or (row['size'], row['mtime']) == (stat.st_size, stat.st_mtime):
+            return None
+        return row['lines'] if stat.st_size >= row['size'] else 0
+
+    def import_file(self, path: Path, on_batch=None, start: int = 0) -> int:
+        """
+        Import one crawler JSON file, archive snapshot or JSON Lines file (a
+        JSON Lines file from line `start` on). The sighting time and query come
+        from the file name, falling back to its modification time; JSON Lines
+        records may carry their own `scraped_at`, `query` and `city`.
+        `on_batch(records, query, seen)` is called after every batch written,
+        e.g. to copy it to the listing dataset.
+        """
+        path = Path(path)
+        stat = path.stat()  # before reading, so lines appended meanwhile are picked up next time
+        query, seen = None, datetime.fromtimestamp(path.stat().st_mtime).isoformat(timespec='seconds')
+        match = FILE_TIMESTAMP_RE.match(FILE_SUFFIX_RE.sub('', path.name))
+        if match:
+            digits = re.sub(r'\D', '', match.group('ts'))
+            seen = datetime.strptime(digits, '%Y%m%d%H%M%S').isoformat()
+            query = match.group('query') or None
+        lines = None
+        if jsonl.is_jsonl(path):
+            count, lines = self._import_jsonl(path, query, seen, on_batch, start)
+        else:
+            with path.open(encoding='utf-8') as f:
+                records = json.load(f)
+            snapshot = query == 'all_records'
+            count = self.upsert(records, None if snapshot else query, seen=seen, observe='new' if snapshot else 'all')
+            if on_batch is not None:
+                on_batch(records, query, seen)
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO imported_files (path, imported_at, records, lines, size, mtime) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (path) DO UPDATE SET imported_at = excluded.imported_at, '
+                'records = records + excluded.records, lines = excluded.lines, size = excluded.size, '
+                'mtime = excluded.mtime',
+                (str(path.resolve()), now(), count, lines, stat.st_size, stat.st_mtime))
+        return count
+
+    def _import_jsonl(self, path: Path, query: str, seen: str, on_batch=None, start: int = 0) -> tuple:
+        """Import the records after line `start`; returns the count and the number of lines read."""
+        count, lines = 0, start
+        for batch in jsonl.batched(jsonl.iter_lines(path, start), IMPORT_BATCH):
+            lines = batch[-1][0]
+            # One upsert per run of records with the same sighting time.
+            for scraped_at, records in groupby((rec for _, rec in batch), key=lambda rec: rec.get('scraped_at') or seen):
+                records = list(records)
+                count += self.upsert(records, query, seen=scraped_at)
+                if on_batch is not None:
+                    on_batch(records, query, scraped_at)
+        return count, lines
+
+    def import_paths(self, paths: list, on_batch=None) -> int:
+        """
+        Import every not yet imported JSON (*.json) and JSON Lines (*.jsonl,
+        *.jsonl.gz, *.jsonl.zst) file in the given files and directories, and
+        the records appended to JSON Lines files since they were imported.
+        """
+        files = []
+        for path in map(Path, paths):
+            if path.is_dir():
+                files.extend(sorted(fp for fp in path.iterdir() if fp.suffix == '.json' or jsonl.is_jsonl(fp)))
+            else:
+                files.append(path)
+        total = 0
+        for fp in files:
+            start = self.import_start(fp)
+            if start is None:
+                continue
+            try:
+                count = self.import_file(fp, on_batch, start)
+            except (json.JSONDecodeError, UnicodeDecodeError, EOFError, gzip.BadGzipFile) as e:
+                print(f"Skipping invalid JSON: {fp} ({e})")
+                continue
+            print(f"Imported {count} listings from {fp}" + (f" after line {start}" if start else ''))
+            total += count
+        return total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the SQLite listing store.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    importer = sub.add_parser('import', help='import crawler JSON files and archive snapshots')
+    importer.add_argument('paths', nargs='*', default=['json_data', 'archive'])
+    parser.add_argument('--db', default=str(DB_PATH))
+    args = parser.parse_args()
+
+    with ListingStore(args.db) as store:
+        imported = store.import_paths(args.paths)
+        print(f"Imported {imported} listings; the store now holds {store.count()}.")
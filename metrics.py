@@ -0,0 +1,88 @@
+"""
+Prometheus metrics for the crawl API, served by app.py at /metrics.
+
+- crawl_stage_seconds{stage}: time spent in each step of a crawl, using the
+  step names recorded by readiness.Readiness (browser_launch, login,
+  navigation, listing_grid, filters, extract, scroll_load, parse, store, ...)
+- crawl_listings: listings parsed per crawl
+- crawl_parse_failures_total{selector_set, field}: cards dropped because a
+  required field selector matched nothing
+- browser_pool_wait_seconds: time requests waited for a browser context
+- result_cache_lookups_total{result}: result cache HIT / STALE / MISS
+- point-in-time pool, crawl queue, job queue and cache numbers, read when
+  /metrics is scraped (see StatsCollector)
+"""
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+SECONDS_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+STAGE_SECONDS = Histogram('crawl_stage_seconds', 'Seconds spent in each crawl stage', ['stage'],
+                          buckets=SECONDS_BUCKETS)
+LISTINGS_PER_CRAWL = Histogram('crawl_listings', 'Listings parsed per crawl',
+                               buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000))
+PARSE_FAILURES = Counter('crawl_parse_failures_total',
+                         'Listing cards dropped because a required field selector matched nothing',
+                         ['selector_set', 'field'])
+POOL_WAIT_SECONDS = Histogram('browser_pool_wait_seconds', 'Seconds waited for a free browser context',
+                              buckets=SECONDS_BUCKETS)
+CACHE_LOOKUPS = Counter('result_cache_lookups_total', 'Result cache lookups', ['result'])
+
+
+def observe_stages(timings: dict):
+    """Record a Readiness `timings` dict, one observation per stage."""
+    for stage_name, seconds in timings.items():
+        STAGE_SECONDS.labels(stage_name).observe(seconds)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as one observation of crawl_stage_seconds{stage=name}."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(name).observe(time.perf_counter() - start)
+
+
+class StatsCollector:
+    """
+    Exposes the numbers returned by `read()` (e.g. BrowserPool.metrics()) as
+    `<prefix>_<key>` gauges, or counters for keys ending in `_total`.
+    """
+
+    def __init__(self, prefix: str, read):
+        self.prefix = prefix
+        self.read = read
+
+    def collect(self):
+        for key, value in self.read().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f'{self.prefix}_{key}'
+            family = CounterMetricFamily if key.endswith('_total') else GaugeMetricFamily
+            yield family(name, f'{self.prefix} {key.replace("_", " ")}', value=value)
+
+
+_collectors = {}
+
+
+def register(collector):
+    """
+    Register a StatsCollector, replacing the one registered earlier with the
+    same prefix: `python app.py` runs app.py as __main__ and uvicorn then
+    imports it again as `app`.
+    """
+    previous = _collectors.pop(collector.prefix, None)
+    if previous is not None:
+        REGISTRY.unregister(previous)
+    REGISTRY.register(collector)
+    _collectors[collector.prefix] = collector
+
+
+def latest() -> tuple:
+    """The current metrics in the Prometheus text format, and its content type."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,110 @@
+"""
+Vectorized parsing of Marketplace price, mileage and year strings.
+
+Every parser takes a pandas Series of raw strings and returns a float Series
+(NaN where nothing could be parsed):
+
+- prices: "$1,288", "CA$950", "€1.200", "Free" (0), ranges and price drops
+  such as "$1,000 - $1,500" or "$8,500$9,000" (the first, current price)
+- mileage: "93K miles" (93000), "1.2M miles", "120,000 miles", "150K km"
+  (converted to miles)
+- years: the model year in a title such as "2004 Toyota camry LE"
+
+Makes, models, trims and body styles are parsed from titles in titles.py.
+
+Marketplace strings repeat a lot ("100K miles", "$5,000"), so each parser
+works on the distinct values only and maps the results back.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+KM_TO_MILES = 0.621371
+
+CURRENCIES = {
+    '$': 'USD', 'US$': 'USD', 'CA$': 'CAD', 'C$': 'CAD', 'A$': 'AUD', 'MX$': 'MXN',
+    '€': 'EUR', '£': 'GBP', '¥': 'JPY', '₹': 'INR',
+}
+
+# Amounts use ',' as thousands separator; '.' is a decimal point unless it
+# is followed by exactly three digits ("€1.200").
+_AMOUNT = r'(?P<amount>\d{1,3}(?:[,.]\d{3})+(?:\.\d{1,2})?(?!\d)|\d+(?:\.\d+)?)'
+_SUFFIX = r'(?P<suffix>[KM](?![A-Z]))?'
+PRICE_RE = re.compile(r'(?P<currency>[A-Z]{0,2}\$|[€£¥₹])?\s*' + _AMOUNT + r'\s*' + _SUFFIX, re.IGNORECASE)
+MILES_RE = re.compile(_AMOUNT + r'\s*' + _SUFFIX + r'\s*(?P<unit>km|kilomet\w*|mi\w*)?', re.IGNORECASE)
+YEAR_RE = re.compile(r'(?<!\d)((?:19|20)\d{2})(?!\d)')
+FREE_RE = re.compile(r'\bfree\b', re.IGNORECASE)
+
+_MULTIPLIERS = {'k': 1e3, 'm': 1e6}
+
+
+def _on_uniques(values: pd.Series, parse, dtype=float) -> pd.Series:
+    """Run `parse` on the distinct values of `values` only and broadcast the result."""
+    values = pd.Series(values)
+    codes, uniques = pd.factorize(values)
+    parsed = np.asarray(parse(pd.Series(uniques, dtype=object)), dtype=dtype)
+    # factorize codes missing values as -1; the appended NaN is picked for them
+    result = np.append(parsed, np.array([np.nan], dtype=dtype))[codes]
+    return pd.Series(result, index=values.index, dtype=dtype)
+
+
+def _amounts(text: pd.Series, pattern) -> tuple:
+    parts = text.str.extract(pattern)
+    amount = parts['amount'].str.replace(r'[,.](?=\d{3}(?:\D|$))', '', regex=True)
+    multiplier = parts['suffix'].str.lower().map(_MULTIPLIERS).fillna(1.0)
+    return pd.to_numeric(amount, errors='coerce') * multiplier, parts
+
+
+def _parse_prices(text: pd.Series) -> pd.Series:
+    text = text.astype('string')
+    values, _ = _amounts(text, PRICE_RE)
+    free = text.str.contains(FREE_RE, na=False).astype(bool)
+    return values.mask(free & values.isna(), 0.0)
+
+
+def _parse_currencies(text: pd.Series) -> pd.Series:
+    symbols = text.astype('string').str.extract(PRICE_RE)['currency'].str.upper()
+    return symbols.map(CURRENCIES)
+
+
+def _parse_miles(text: pd.Series) -> pd.Series:
+    values, parts = _amounts(text.astype('string'), MILES_RE)
+    km = parts['unit'].str.lower().str.startswith('k').fillna(False).astype(bool)
+    return values.mask(km, values * KM_TO_MILES)
+
+
+def _parse_years(text: pd.Series) -> pd.Series:
+    return pd.to_numeric(text.astype('string').str.extract(YEAR_RE)[0], errors='coerce')
+
+
+def parse_prices(prices: pd.Series) -> pd.Series:
+    """Price strings to numbers in their own currency (see `parse_currencies`)."""
+    return _on_uniques(prices, _parse_prices)
+
+
+def parse_currencies(prices: pd.Series) -> pd.Series:
+    """ISO code of each price's currency symbol, NaN when there is none."""
+    return _on_uniques(prices, _parse_currencies, dtype=object)
+
+
+def parse_miles(miles: pd.Series) -> pd.Series:
+    """Mileage strings to miles."""
+    return _on_uniques(miles, _parse_miles)
+
+
+def parse_years(titles: pd.Series) -> pd.Series:
+    """The first plausible model year (1900-2099) in each title."""
+    return _on_uniques(titles, _parse_years)
+
+
+def annotate(records: list) -> list:
+    """Add `price_val` and `miles_val` (None when unparseable) to crawler records in place."""
+    if not records:
+        return records
+    prices = parse_prices(pd.Series([rec.get('price') for rec in records], dtype=object))
+    miles = parse_miles(pd.Series([rec.get('miles') for rec in records], dtype=object))
+    for rec, price, mile in zip(records, prices.tolist(), miles.tolist()):
+        rec['price_val'] = None if np.isnan(price) else price
+        rec['miles_val'] = None if np.isnan(mile) else mile
+    return records
@@ -0,0 +1,142 @@
+"""
+Infinite-scroll pagination with incremental extraction.
+
+Listing cards are pulled out of the live page in batches: each batch holds
+only the cards that appeared since the previous scroll, so the growing page
+is never re-serialized with `page.content()` or re-parsed as a whole. Cards
+already handed out are tagged with a data attribute inside the browser.
+
+With `max_scrolls=0` (the default) only the first viewport is read, which
+matches the crawlers' original behaviour. Passing a `fields_spec` switches
+the batches from card HTML to raw field dicts extracted in the browser by
+the 'dom' backend in extraction.py.
+"""
+import logging
+
+from extraction import COLLECT_NEW_CARD_FIELDS_JS
+from listing_ids import listing_id
+from readiness import Readiness, AsyncReadiness
+
+# Attribute set on cards that were already extracted.
+SEEN_ATTR = 'data-fbm-extracted'
+
+# Return the outerHTML of cards not extracted yet and mark them.
+COLLECT_NEW_CARDS_JS = '''([selector, attr]) => {
+    const fresh = [];
+    for (const card of document.querySelectorAll(selector)) {
+        if (card.hasAttribute(attr)) continue;
+        card.setAttribute(attr, '');
+        fresh.push(card.outerHTML);
+    }
+    return fresh;
+}'''
+
+COUNT_CARDS_JS = 'selector => document.querySelectorAll(selector).length'
+SCROLL_TO_BOTTOM_JS = 'window.scrollTo(0, document.body.scrollHeight)'
+
+logger = logging.getLogger(__name__)
+
+
+class SeenRunFilter:
+    """
+    Incremental mode for newest-first searches: drops cards whose listing ID
+    was seen before and flags `done` once `run_length` seen cards appear in a
+    row, meaning everything further down is older and can be skipped. A run
+    rather than the first seen card tolerates promoted listings that are
+    shown out of date order. With `keep_seen` the seen cards before the stop
+    point are kept too, for callers that track re-sightings.
+    """
+
+    def __init__(self, seen_ids: set, run_length: int = 3, keep_seen: bool = False):
+        self.seen_ids = seen_ids
+        self.run_length = run_length
+        self.keep_seen = keep_seen
+        self.run = 0
+        self.skipped = 0
+        self.done = False
+
+    def filter(self, cards: list) -> list:
+        """Keep unseen cards (HTML fragments or field dicts) up to the stop point."""
+        fresh = []
+        for card in cards:
+            lid = listing_id(card if isinstance(card, str) else card.get('href'))
+            if lid is not None and lid in self.seen_ids:
+                self.run += 1
+                if self.run >= self.run_length:
+                    self.done = True
+                    self.skipped += 1
+                    break
+                if self.keep_seen:
+                    fresh.append(card)
+                else:
+                    self.skipped += 1
+                continue
+            self.run = 0
+            fresh.append(card)
+        return fresh
+
+
+def _budget_left(total: int, max_listings) -> bool:
+    return max_listings is None or total < max_listings
+
+
+def _collect_args(card_selector: str, fields_spec):
+    if fields_spec is None:
+        return COLLECT_NEW_CARDS_JS, [card_selector, SEEN_ATTR]
+    return COLLECT_NEW_CARD_FIELDS_JS, [card_selector, SEEN_ATTR, fields_spec]
+
+
+def iter_card_batches(page, card_selector: str, max_listings: int = None, max_scrolls: int = 0,
+                      readiness: Readiness = None, fields_spec: dict = None):
+    """
+    Yield lists of new listing cards, scrolling between batches. Cards are
+    HTML fragments, or raw field dicts when `fields_spec` is given.
+
+    Stops when `max_listings` cards were yielded, after `max_scrolls` scrolls,
+    or as soon as a scroll loads no new cards.
+    """
+    readiness = readiness or Readiness()
+    collect_js, collect_arg = _collect_args(card_selector, fields_spec)
+    total = 0
+    scrolls = 0
+    while True:
+        with readiness.step('extract'):
+            fresh = page.evaluate(collect_js, collect_arg)
+        if max_listings is not None:
+            fresh = fresh[:max_listings - total]
+        if fresh:
+            total += len(fresh)
+            yield fresh
+        if not _budget_left(total, max_listings) or scrolls >= max_scrolls:
+            return
+        count = page.evaluate(COUNT_CARDS_JS, card_selector)
+        page.evaluate(SCROLL_TO_BOTTOM_JS)
+        scrolls += 1
+        if not readiness.more_matches(page, card_selector, count):
+            logger.info("No new listings after scroll %d, stopping.", scrolls)
+            return
+
+
+async def aiter_card_batches(page, card_selector: str, max_listings: int = None, max_scrolls: int = 0,
+                             readiness: AsyncReadiness = None, fields_spec: dict = None):
+    """Async version of `iter_card_batches` for the async crawl engine."""
+    readiness = readiness or AsyncReadiness()
+    collect_js, collect_arg = _collect_args(card_selector, fields_spec)
+    total = 0
+    scrolls = 0
+    while True:
+        with readiness.step('extract'):
+            fresh = await page.evaluate(collect_js, collect_arg)
+        if max_listings is not None:
+            fresh = fresh[:max_listings - total]
+        if fresh:
+            total += len(fresh)
+            yield fresh
+        if not _budget_left(total, max_listings) or scrolls >= max_scrolls:
+            return
+        count = await page.evaluate(COUNT_CARDS_JS, card_selector)
+        await page.evaluate(SCROLL_TO_BOTTOM_JS)
+        scrolls += 1
+        if not await readiness.more_matches(page, card_selector, count):
+            logger.info("No new listings after scroll %d, stopping.", scrolls)
+            return
@@ -0,0 +1,253 @@
+"""
+Pluggable HTML parser backends for listing cards.
+
+Each parser compiles a card spec (see extraction.py) once and turns HTML
+into raw field dicts. The 'lxml' and 'selectolax' parsers walk every card's
+subtree exactly once, matching all fields in that single pass with
+precompiled matchers; 'bs4' is the original BeautifulSoup approach and the
+reference the others must agree with.
+
+Spec values are a single selector or a fallback chain. Cards are the union
+of the card chain; for every other field the first selector in the chain
+that matches inside the card wins.
+
+lxml and selectolax are optional; `available_parsers()` lists what is
+installed.
+"""
+import re
+from abc import ABC, abstractmethod
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+try:
+    from lxml.cssselect import CSSSelector
+except ImportError:
+    CSSSelector = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+FIELDS = ('title', 'price', 'link')
+SPEC_KEYS = ('card',) + FIELDS + ('subtext',)
+
+# tag, tag.a.b, tag[attr], tag[attr="value"] or tag[attr*="value"]
+_SIMPLE_SELECTOR = re.compile(r'^(?P<tag>[a-z][a-z0-9]*)(?:(?P<classes>(?:\.[\w-]+)+)|\[(?P<attr>[\w-]+)(?:(?P<op>\*?=)"(?P<value>[^"]*)")?\])?$')
+
+
+def selector_chain(value) -> tuple:
+    """A spec value is one selector or a fallback chain of them."""
+    return (value,) if isinstance(value, str) else tuple(value)
+
+
+def card_selector(spec: dict) -> str:
+    """CSS selector list matching every card selector in the spec."""
+    return ', '.join(selector_chain(spec['card']))
+
+
+def compile_matcher(selector: str):
+    """
+    Compile a simple selector into `(tag, predicate(attrs))`, or return None
+    if the selector needs a full CSS engine.
+    """
+    match = _SIMPLE_SELECTOR.match(selector.strip())
+    if not match:
+        return None
+    tag = match.group('tag')
+    if match.group('classes'):
+        wanted = set(match.group('classes')[1:].split('.'))
+        return tag, lambda attrs: wanted.issubset((attrs.get('class') or '').split())
+    attr = match.group('attr')
+    if attr is None:
+        return tag, lambda attrs: True
+    value = match.group('value')
+    if value is None:
+        return tag, lambda attrs: attr in attrs
+    if match.group('op') == '*=':
+        return tag, lambda attrs: value in (attrs.get(attr) or '')
+    return tag, lambda attrs: attrs.get(attr) == value
+
+
+def _fields_from(title, price, href, subtexts) -> dict:
+    return {
+        'title': title,
+        'price': price,
+        'href': href,
+        'location': subtexts[0] if subtexts else None,
+        #miles is equal to a subtext with "miles" in it
+        'miles': next((st for st in subtexts if 'miles' in st), ''),
+    }
+
+
+class CardParser(ABC):
+    name = None
+
+    def __init__(self, spec: dict):
+        self.spec = spec
+        self.chains = {key: selector_chain(spec[key]) for key in SPEC_KEYS}
+
+    @abstractmethod
+    def parse(self, html: str) -> list:
+        """Raw field dicts of every card in `html`."""
+
+
+class Bs4Parser(CardParser):
+    name = 'bs4'
+
+    def _first(self, card, field):
+        for selector in self.chains[field]:
+            el = card.select_one(selector)
+            if el is not None:
+                return el
+        return None
+
+    def card_fields(self, card) -> dict:
+        title = self._first(card, 'title')
+        price = self._first(card, 'price')
+        link = self._first(card, 'link')
+        subtexts = next((found for found in (card.select(sel) for sel in self.chains['subtext']) if found), [])
+        return _fields_from(
+            title.text if title is not None else None,
+            price.text if price is not None else None,
+            link.get('href') if link is not None else None,
+            [st.text for st in subtexts],
+        )
+
+    def parse(self, html: str) -> list:
+        soup = BeautifulSoup(html, 'html.parser')
+        return [self.card_fields(card) for card in soup.select(card_selector(self.spec))]
+
+
+class _SinglePassParser(CardParser):
+    """
+    Shared single-pass walk: every element below a card is tested once
+    against the precompiled field matchers.
+    """
+
+    def __init__(self, spec: dict):
+        super().__init__(spec)
+        self.card_matchers = [compile_matcher(sel) for sel in self.chains['card']]
+        self.field_matchers = {
+            name: [compile_matcher(sel) for sel in self.chains[name]]
+            for name in FIELDS + ('subtext',)
+        }
+        if any(m is None for matchers in self.field_matchers.values() for m in matchers):
+            raise ValueError(f"{self.name} parser only supports simple field selectors: {spec}")
+
+    @property
+    def simple_cards(self) -> bool:
+        return all(m is not None for m in self.card_matchers)
+
+    @staticmethod
+    def _rank(matchers, tag, attrs, limit):
+        """Index of the first of `matchers[:limit]` matching the element, or None."""
+        for i in range(limit):
+            m_tag, predicate = matchers[i]
+            if tag == m_tag and predicate(attrs):
+                return i
+        return None
+
+    def _walk(self, elements, text_of, attrs_of, tag_of) -> dict:
+        # Per field keep the match of the highest-priority selector; for the
+        # same selector the first element in document order wins.
+        best = {name: (len(self.field_matchers[name]), None) for name in FIELDS}
+        subtext_matchers = self.field_matchers['subtext']
+        subtexts = [[] for _ in subtext_matchers]
+        for el in elements:
+            tag = tag_of(el)
+            if tag is None:
+                continue
+            attrs = attrs_of(el)
+            for name in FIELDS:
+                rank = self._rank(self.field_matchers[name], tag, attrs, best[name][0])
+                if rank is not None:
+                    best[name] = (rank, attrs.get('href') if name == 'link' else text_of(el))
+            for i, (m_tag, predicate) in enumerate(subtext_matchers):
+                if tag == m_tag and predicate(attrs):
+                    subtexts[i].append(text_of(el))
+        return _fields_from(best['title'][1], best['price'][1], best['link'][1],
+                            next((found for found in subtexts if found), []))
+
+
+class LxmlParser(_SinglePassParser):
+    name = 'lxml'
+
+    def __init__(self, spec: dict):
+        if lxml is None:
+            raise ImportError("The 'lxml' parser needs lxml: pip install lxml")
+        super().__init__(spec)
+        self.card_xpath = None
+        if not self.simple_cards:
+            if CSSSelector is None:
+                raise ImportError("Complex card selectors need cssselect: pip install cssselect")
+            self.card_xpath = CSSSelector(card_selector(spec))
+        self.card_tags = {m[0] for m in self.card_matchers if m is not None}
+
+    @staticmethod
+    def _tag(el):
+        # Comments and processing instructions have a non-string tag.
+        return el.tag if isinstance(el.tag, str) else None
+
+    def _cards(self, root):
+        if self.card_xpath is not None:
+            return self.card_xpath(root)
+        return [el for el in root.iter(*self.card_tags)
+                if any(el.tag == tag and predicate(el.attrib) for tag, predicate in self.card_matchers)]
+
+    def parse(self, html: str) -> list:
+        root = lxml.html.document_fromstring(html)
+        result = []
+        for card in self._cards(root):
+            descendants = card.iterdescendants()
+            result.append(self._walk(descendants, lambda el: el.text_content(),
+                                     lambda el: el.attrib, self._tag))
+        return result
+
+
+class SelectolaxParser(_SinglePassParser):
+    name = 'selectolax'
+
+    def __init__(self, spec: dict):
+        if LexborHTMLParser is None:
+            raise ImportError("The 'selectolax' parser needs selectolax: pip install selectolax")
+        super().__init__(spec)
+
+    @staticmethod
+    def _descendants(card):
+        nodes = card.traverse()
+        next(nodes, None)  # traverse() starts with the card itself
+        return nodes
+
+    def parse(self, html: str) -> list:
+        tree = LexborHTMLParser(html)
+        return [
+            self._walk(self._descendants(card), lambda node: node.text(deep=True),
+                       lambda node: node.attributes, lambda node: node.tag)
+            for card in tree.css(card_selector(self.spec))
+        ]
+
+
+PARSERS = {parser.name: parser for parser in (Bs4Parser, LxmlParser, SelectolaxParser)}
+
+_compiled = {}
+
+
+def get_parser(name: str, spec: dict) -> CardParser:
+    """Return a parser for `spec`, compiling it only the first time."""
+    if name not in PARSERS:
+        raise ValueError(f"Unknown parser '{name}', expected one of {', '.join(PARSERS)}")
+    key = (name, tuple((key, selector_chain(spec[key])) for key in SPEC_KEYS))
+    if key not in _compiled:
+        _compiled[key] = PARSERS[name](spec)
+    return _compiled[key]
+
+
+def available_parsers() -> list:
+    installed = {'bs4': True, 'lxml': lxml is not None, 'selectolax': LexborHTMLParser is not None}
+    return [name for name in PARSERS if installed[name]]
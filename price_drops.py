@@ -0,0 +1,61 @@
+"""
+Price-drop alerts for listings we have already seen.
+
+A seller who cuts the price of a listing does not make it a new listing,
+so crawlers look up the latest stored price of every re-sighted listing
+(`ListingStore.latest_prices`, one batched query per page) before storing
+the new sighting. Listings whose price went down are re-scored with the
+saved price model, and a drop is an alert when it takes the listing's
+residual (price - predicted price) across ALERT_THRESHOLD: the prediction
+does not depend on the price, so the residual before the drop is the new
+residual plus the drop. Listings that already were deals at their old
+price do not alert again.
+
+    previous = store.latest_prices(record['listing_id'] for record in resighted)
+    store.upsert(records, observe='changed')
+    drops = price_drops.detect(resighted, previous, price_model.load_model())
+"""
+import pandas as pd
+from decouple import config
+
+import normalize
+import price_model
+from listing_ids import record_id
+
+ALERT_THRESHOLD = config('ALERT_THRESHOLD', default=-1500, cast=float)  # residual at or below this is a deal
+
+
+def price_drops(records: list, previous: dict) -> list:
+    """
+    The records whose price is lower than their `previous` {listing_id:
+    (price, seen_at)} price, each as a copy with `previous_price`,
+    `previous_seen` and the `drop` amount.
+    """
+    known = [(record, previous[lid]) for record in records
+             if (lid := record_id(record)) is not None and lid in previous]
+    if not known:
+        return []
+    new = normalize.parse_prices(pd.Series([record.get('price') for record, _ in known], dtype=object))
+    old = normalize.parse_prices(pd.Series([price for _, (price, _) in known], dtype=object))
+    return [
+        {**record, 'previous_price': price, 'previous_seen': seen, 'drop': round(old_val - new_val, 2)}
+        for (record, (price, seen)), new_val, old_val in zip(known, new.tolist(), old.tolist())
+        if new_val < old_val  # False for unparseable prices (NaN)
+    ]
+
+
+def detect(records: list, previous: dict, model: dict, threshold: float = ALERT_THRESHOLD) -> list:
+    """
+    Price drops among the re-sighted `records` that made them a deal: the
+    drop records with the model's `predicted_price` and `residual`.
+    """
+    drops = price_drops(records, previous)
+    # A model saved before there were enough listings for a global fit cannot score.
+    if not drops or model is None or price_model.GLOBAL not in model['segments']:
+        return []
+    scores = price_model.score_records(drops, model)
+    return [
+        {**drop, 'predicted_price': score['predicted_price'], 'residual': score['residual']}
+        for drop, score in zip(drops, scores)
+        if score['residual'] is not None and score['residual'] <= threshold < score['residual'] + drop['drop']
+    ]
@@ -0,0 +1,235 @@
+"""
+Segmented used-car price model.
+
+log(price) is fitted by least squares on [1, age, miles in thousands] plus
+one indicator per body style in BODY_FEATURES (sedans and titles without a
+body style are the baseline), separately for every segment: each make/model ("toyota/camry"), each make
+("toyota") and all listings ("*"). A listing is priced by the most specific
+segment with at least MIN_SEGMENT_ROWS listings, falling back to its make
+and then to the global fit. Body-style coefficients are shrunk towards 0 as
+if every style had BODY_SHRINK more listings at the segment's baseline, so
+a single coupe in a segment cannot fit its own price away.
+
+Fits are kept as sufficient statistics (X'X, X'y, n) per segment, so new or
+re-priced listings are folded in without touching the rest, and only the
+segments whose statistics changed are re-solved. The fitted coefficients are
+saved to MODEL_FILE; scoring a crawl is a lookup plus a dot product per
+listing. Long-running readers such as the API keep a ModelCache, which
+picks up a newly saved model on the next request.
+"""
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from decouple import config
+
+import normalize
+import titles
+from listing_ids import record_id
+
+MODEL_FILE = Path(config('PRICE_MODEL_FILE', default='price_model.json'))
+MIN_SEGMENT_ROWS = config('MIN_SEGMENT_ROWS', default=8, cast=int)
+BODY_SHRINK = config('BODY_SHRINK', default=5.0, cast=float)
+MODEL_VERSION = 2
+
+GLOBAL = '*'
+BODY_FEATURES = ('coupe', 'hatchback', 'wagon', 'convertible', 'suv', 'pickup', 'van')
+N_FEATURES = 3 + len(BODY_FEATURES)
+
+logger = logging.getLogger(__name__)
+
+
+def segment_keys(df: pd.DataFrame) -> tuple:
+    """Per row: the make/model key, the make key and the global key, most specific first."""
+    make = df['make'].fillna('').astype(str)
+    model = df['model'].fillna('').astype(str)
+    return (
+        (make + '/' + model).where((make != '') & (model != ''), GLOBAL),
+        make.where(make != '', GLOBAL),
+        pd.Series(GLOBAL, index=df.index),
+    )
+
+
+def add_segments(df: pd.DataFrame, title_column: str = 'title') -> pd.DataFrame:
+    """Add `make`, `model` and `body` columns parsed from the titles."""
+    df = df.copy()
+    df[['make', 'model', 'body']] = titles.parse_titles(df[title_column])[['make', 'model', 'body']]
+    return df
+
+
+def design_matrix(df: pd.DataFrame, current_year: int) -> np.ndarray:
+    age = current_year - df['year_val'].to_numpy(float)
+    body = df['body'].to_numpy(dtype=object) if 'body' in df else np.full(len(df), None, dtype=object)
+    bodies = (body[:, None] == np.array(BODY_FEATURES, dtype=object)).astype(float)
+    return np.column_stack([np.ones(len(df)), age, df['miles_val'].to_numpy(float) / 1000, bodies])
+
+
+def segment_stats(df: pd.DataFrame, current_year: int) -> dict:
+    """{segment: {'xtx', 'xty', 'n'}} for every segment the rows belong to."""
+    if df.empty:
+        return {}
+    X = design_matrix(df, current_year)
+    y = np.log(df['price_val'].to_numpy(float))
+    # One row of summed terms per listing: X'X flattened, X'y and a count,
+    # so every segment's statistics are a single groupby-sum.
+    terms = pd.DataFrame(np.hstack([
+        np.einsum('ni,nj->nij', X, X).reshape(len(X), -1), X * y[:, None], np.ones((len(X), 1)),
+    ]))
+    stats = {}
+    model_keys, make_keys, global_keys = segment_keys(df)
+    for keys in (model_keys, make_keys, global_keys):
+        sums = terms.groupby(keys.to_numpy()).sum()
+        if keys is not global_keys:
+            sums = sums.drop(GLOBAL, errors='ignore')  # rows without a make or model
+        for key, row in zip(sums.index, sums.to_numpy()):
+            stats[key] = {
+                'xtx': row[:N_FEATURES ** 2].reshape(N_FEATURES, N_FEATURES),
+                'xty': row[N_FEATURES ** 2:-1],
+                'n': int(round(row[-1])),
+            }
+    return stats
+
+
+def combine_stats(a: dict, b: dict, sign: int = 1) -> dict:
+    """a + b (or a - b) per segment; segments left without rows are dropped."""
+    combined = dict(a)
+    for key, stats in b.items():
+        if key in combined:
+            base = combined[key]
+            stats = {'xtx': base['xtx'] + sign * stats['xtx'], 'xty': base['xty'] + sign * stats['xty'],
+                     'n': base['n'] + sign * stats['n']}
+        elif sign < 0:
+            continue
+        if stats['n'] > 0:
+            combined[key] = stats
+        else:
+            combined.pop(key, None)
+    return combined
+
+
+def solve(stats: dict) -> np.ndarray:
+    shrink = np.diag([0.0] * (N_FEATURES - len(BODY_FEATURES)) + [BODY_SHRINK] * len(BODY_FEATURES))
+    coef, *_ = np.linalg.lstsq(stats['xtx'] + shrink, stats['xty'], rcond=None)
+    return coef
+
+
+def new_model(current_year: int) -> dict:
+    return {'version': MODEL_VERSION, 'current_year': current_year, 'min_rows': MIN_SEGMENT_ROWS,
+            'fitted_at': None, 'segments': {}}
+
+
+def refit(model: dict, stats: dict, changed: set = None) -> dict:
+    """
+    Re-solve the segments in `changed` (all when None) from their statistics;
+    the other segments keep their cached coefficients. Segments below
+    MIN_SEGMENT_ROWS are left out so their listings fall back to a parent.
+    """
+    segments = dict(model['segments'])
+    keys = stats.keys() if changed is None else changed
+    if changed is None:
+        segments = {}
+    for key in keys:
+        seg = stats.get(key)
+        min_rows = N_FEATURES if key == GLOBAL else model['min_rows']
+        if seg is None or seg['n'] < min_rows:
+            segments.pop(key, None)
+        else:
+            segments[key] = {'coef': solve(seg).tolist(), 'n': seg['n']}
+    return {**model, 'segments': segments, 'fitted_at': datetime.now().isoformat(timespec='seconds')}
+
+
+def save_model(model: dict, path: Path = MODEL_FILE):
+    """Write the model atomically, so readers never see a half-written file."""
+    path = Path(path)
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_text(json.dumps(model, indent=2))
+    os.replace(tmp, path)
+
+
+def load_model(path: Path = MODEL_FILE):
+    """The saved model, or None if there is none or it is from another version."""
+    try:
+        model = json.loads(Path(path).read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return model if model.get('version') == MODEL_VERSION else None
+
+
+def predict(df: pd.DataFrame, model: dict) -> pd.DataFrame:
+    """
+    Add `segment`, `predicted_price` and `residual` (price - prediction) to a
+    frame with price_val, miles_val, year_val, make, model and body columns.
+    """
+    segments = model['segments']
+    if GLOBAL not in segments:
+        raise ValueError('The price model has no global fit yet')
+    df = df.copy()
+    known = pd.Index(list(segments))
+    model_keys, make_keys, keys = segment_keys(df)
+    for level in (make_keys, model_keys):
+        keys = level.where(level.isin(known), keys)
+    coefs = np.array([segments[key]['coef'] for key in known])
+    log_price = (design_matrix(df, model['current_year']) * coefs[known.get_indexer(keys)]).sum(axis=1)
+    df['segment'] = keys
+    df['predicted_price'] = np.exp(log_price)
+    df['residual'] = df['price_val'] - df['predicted_price']
+    return df
+
+
+def score_records(records: list, model: dict) -> list:
+    """
+    Score crawler records in one vectorized pass. Each result has the
+    listing's ID, `segment`, `predicted_price` and `residual`; the last three
+    are None when the price, mileage or year cannot be read.
+    """
+    if not records:
+        return []
+    names = pd.Series([rec.get('title') or rec.get('name') for rec in records], dtype=object)
+    df = pd.DataFrame({
+        'price_val': normalize.parse_prices(pd.Series([rec.get('price') for rec in records], dtype=object)),
+        'miles_val': normalize.parse_miles(pd.Series([rec.get('miles') for rec in records], dtype=object)),
+        'year_val': normalize.parse_years(names),
+    })
+    df[['make', 'model', 'body']] = titles.parse_titles(names)[['make', 'model', 'body']]
+    scored = predict(df, model)
+    valid = scored[['price_val', 'predicted_price']].notna().all(axis=1).to_numpy()
+    return [
+        {
+            'listing_id': record_id(rec),
+            'segment': segment if ok else None,
+            'predicted_price': round(predicted, 2) if ok else None,
+            'residual': round(residual, 2) if ok else None,
+        }
+        for rec, ok, segment, predicted, residual in zip(
+            records, valid, scored['segment'].tolist(), scored['predicted_price'].tolist(),
+            scored['residual'].tolist())
+    ]
+
+
+class ModelCache:
+    """
+    The latest saved model, reloaded when the model file changes. `get()`
+    costs one stat() call while the file is unchanged.
+    """
+
+    def __init__(self, path: Path = MODEL_FILE):
+        self.path = Path(path)
+        self.model = None
+        self._mtime = None
+
+    def get(self):
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return self.model
+        if mtime != self._mtime:
+            model = load_model(self.path)
+            if model is not None:
+                self.model = model
+                logger.info("Loaded price model fitted at %s (%d segments)", model['fitted_at'], len(model['segments']))
+            self._mtime = mtime
+        return self.model
@@ -0,0 +1,166 @@
+"""
+Event-driven page readiness shared by every crawler.
+
+Instead of sleeping a fixed number of seconds, each step waits for a concrete
+signal (the listing grid rendering, the network going idle, a filter menu
+option becoming visible) with its own timeout, and records how long the wait
+really took. `Readiness` is for the sync Playwright scripts and
+`AsyncReadiness` for the async crawl engine.
+"""
+import logging
+import time
+from contextlib import contextmanager
+
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+# Any link to a listing means the results grid has rendered.
+LISTING_GRID_SELECTOR = 'a[href*="/marketplace/item/"]'
+
+# Per-step timeouts in milliseconds.
+DEFAULT_TIMEOUTS = {
+    'login_form': 10000,
+    'login_submit': 15000,
+    'listing_grid': 20000,
+    'network_idle': 5000,
+    'dialog_close': 3000,
+    'filter_menu': 5000,
+    'results_refresh': 10000,
+    'scroll_load': 4000,
+}
+
+# True once more than `count` elements match `selector`.
+MORE_MATCHES_JS = '([selector, count]) => document.querySelectorAll(selector).length > count'
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    def __init__(self, timeouts: dict = None):
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        # step name -> seconds spent waiting (summed if a step repeats)
+        self.timings = {}
+        self.timed_out = set()
+
+    def timeout(self, step: str) -> int:
+        return self.timeouts.get(step, 10000)
+
+    @contextmanager
+    def step(self, name: str):
+        """Time a block and add it to `timings` under `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def _record_timeout(self, step: str):
+        self.timed_out.add(step)
+        logger.warning("Readiness: '%s' not ready after %dms, continuing.", step, self.timeout(step))
+
+    def summary(self) -> str:
+        parts = [f"{name} {secs:.2f}s" for name, secs in self.timings.items()]
+        return "Step timings: " + ", ".join(parts)
+
+    def selector(self, page, selector: str, step: str, state: str = 'visible') -> bool:
+        """Wait for a selector; returns False (and records it) on timeout."""
+        with self.step(step):
+            try:
+                page.wait_for_selector(selector, state=state, timeout=self.timeout(step))
+                return True
+            except PlaywrightTimeoutError:
+                self._record_timeout(step)
+                return False
+
+    def locator(self, locator, step: str, state: str = 'visible') -> bool:
+        with self.step(step):
+            try:
+                locator.wait_for(state=state, timeout=self.timeout(step))
+                return True
+            except PlaywrightTimeoutError:
+                self._record_timeout(step)
+                return False
+
+    def network_idle(self, page, step: str = 'network_idle') -> bool:
+        # Facebook keeps long-polling connections open, so idle may never
+        # arrive; a short timeout here is expected and not an error.
+        with self.step(step):
+            try:
+                page.wait_for_load_state('networkidle', timeout=self.timeout(step))
+                return True
+            except PlaywrightTimeoutError:
+                self.timed_out.add(step)
+                return False
+
+    def listing_grid(self, page) -> bool:
+        return self.selector(page, LISTING_GRID_SELECTOR, 'listing_grid')
+
+    def more_matches(self, page, selector: str, count: int) -> bool:
+        """Wait until more than `count` elements match, e.g. after a scroll."""
+        with self.step('scroll_load'):
+            try:
+                page.wait_for_function(MORE_MATCHES_JS, arg=[selector, count], timeout=self.timeout('scroll_load'))
+                return True
+            except PlaywrightTimeoutError:
+                self.timed_out.add('scroll_load')
+                return False
+
+    def login_complete(self, page) -> bool:
+        with self.step('login_submit'):
+            try:
+                page.wait_for_url(lambda url: '/login' not in url, timeout=self.timeout('login_submit'))
+                return True
+            except PlaywrightTimeoutError:
+                self._record_timeout('login_submit')
+                return False
+
+
+class AsyncReadiness(Readiness):
+    """Same steps as `Readiness`, awaited for async Playwright pages."""
+
+    async def selector(self, page, selector: str, step: str, state: str = 'visible') -> bool:
+        with self.step(step):
+            try:
+                await page.wait_for_selector(selector, state=state, timeout=self.timeout(step))
+                return True
+            except PlaywrightTimeoutError:
+                self._record_timeout(step)
+                return False
+
+    async def locator(self, locator, step: str, state: str = 'visible') -> bool:
+        with self.step(step):
+            try:
+                await locator.wait_for(state=state, timeout=self.timeout(step))
+                return True
+            except PlaywrightTimeoutError:
+                self._record_timeout(step)
+                return False
+
+    async def network_idle(self, page, step: str = 'network_idle') -> bool:
+        with self.step(step):
+            try:
+                await page.wait_for_load_state('networkidle', timeout=self.timeout(step))
+                return True
+            except PlaywrightTimeoutError:
+                self.timed_out.add(step)
+                return False
+
+    async def listing_grid(self, page) -> bool:
+        return await self.selector(page, LISTING_GRID_SELECTOR, 'listing_grid')
+
+    async def more_matches(self, page, selector: str, count: int) -> bool:
+        with self.step('scroll_load'):
+            try:
+                await page.wait_for_function(MORE_MATCHES_JS, arg=[selector, count], timeout=self.timeout('scroll_load'))
+                return True
+            except PlaywrightTimeoutError:
+                self.timed_out.add('scroll_load')
+                return False
+
+    async def login_complete(self, page) -> bool:
+        with self.step('login_submit'):
+            try:
+                await page.wait_for_url(lambda url: '/login' not in url, timeout=self.timeout('login_submit'))
+                return True
+            except PlaywrightTimeoutError:
+                self._record_timeout('login_submit')
+                return False
@@ -1,24 +1,48 @@
 import os
+import argparse
 import json
 import re
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from datetime import datetime
-from sklearn.linear_model import LinearRegression
 import winsound  # for alert sound on Windows
 
+import dedupe
+import listing_dataset
+import listing_ids
+import normalize
+import price_drops
+import price_model
+from listing_store import DB_PATH, ListingStore
+
 # Configuration
 globals = {
-    'JSON_DIR': Path('json_data/'),
-    'ARCHIVE_DIR': Path('archive/'),
+    'DB_PATH': DB_PATH,
     'OUTPUT_DIR': Path('best_deal_output/'),
-    'ALERT_THRESHOLD': -1500,  # residual less than this triggers alert
+    'ALERT_THRESHOLD': price_drops.ALERT_THRESHOLD,  # residual less than this triggers alert
     'CURRENT_YEAR': 2025,
-    'ALERTED_FILE': Path('alerted_deals.json')
+    'ALERTED_FILE': Path('alerted_deals.json'),
+    # incremental runs: checkpoint with the watermark and model statistics,
+    # and the persisted regression dataset
+    'CHECKPOINT_FILE': Path('regression_checkpoint.json'),
+    'DATASET_DIR': Path('regression_data/'),
+    'MAX_CHUNKS': 50,
+    # typed Parquet dataset written by the crawlers, read instead of the store when present
+    'PARQUET_DIR': listing_dataset.DATASET_DIR,
+    # fitted per-segment coefficients, refit only where the data changed
+    'MODEL_FILE': price_model.MODEL_FILE,
 }
 
-globals['ARCHIVE_DIR'].mkdir(exist_ok=True)
+DATASET_COLUMNS = ['listing_id', 'price_val', 'miles_val', 'year_val', 'make', 'model', 'body']
+SEGMENT_COLUMNS = ['make', 'model', 'body']
+# Bumped whenever the dataset's values change meaning, e.g. miles_val went
+# from "93K" -> 93 to 93000 in version 2, and per-segment statistics in 3.
+# Version 4 parses make/model with titles.py and adds body-style features.
+CHECKPOINT_VERSION = 4
+
 globals['OUTPUT_DIR'].mkdir(exist_ok=True)
+globals['DATASET_DIR'].mkdir(exist_ok=True)
 # Initialize alerted file as an empty dict if it doesn't exist
 def init_alerted_file():
     if not globals['ALERTED_FILE'].exists():
@@ -28,65 +52,195 @@ init_alerted_file()
 
 def load_alerted_links():
     try:
-        data = json.loads(globals['ALERTED_FILE'].read_text())
-        # expecting a dict: {link: alerted_at}
-        return data if isinstance(data, dict) else {}
+        # expecting a dict: {listing_id: alerted_at}; old files keyed by link are converted
+        return listing_ids.load_id_map(globals['ALERTED_FILE'])
     except Exception:
         return {}
 
 
 def save_alerted_links(links_dict):
-    with globals['ALERTED_FILE'].open('w', encoding='utf-8') as f:
-        json.dump(links_dict, f, indent=2)
-
-
-def load_records(json_dir):
-    files = json_dir.glob('*.json')
-    records, seen_links = [], set()
-    for fp in files:
-        try:
-            data = json.load(fp.open(encoding='utf-8'))
-        except json.JSONDecodeError:
-            print(f"Skipping invalid JSON: {fp}")
-            continue
-        for rec in data:
-            if rec.get('name') == 'No Title' and rec.get('price') == 'No Price':
-                continue
-            link = rec.get('link')
-            if not link or link in seen_links:
-                continue
-            seen_links.add(link)
-            records.append(rec)
-    return records
+    listing_ids.save_id_map(globals['ALERTED_FILE'], links_dict)
 
 
-def preprocess_df(records):
-    df = pd.DataFrame(records)
-    df['price_val'] = pd.to_numeric(df['price'].str.replace(r"[^0-9.]", "", regex=True), errors='coerce')
-    df['miles_val'] = pd.to_numeric(df['miles'].str.replace(r"[^0-9.]", "", regex=True), errors='coerce')
-    df['year_val'] = pd.to_numeric(df['name'].str.extract(r"((?:19|20)\d{2})")[0], errors='coerce')
+def load_records(db_path, since=None):
+    # One row per listing ID with its latest price, optionally only the ones
+    # seen since a watermark. Crawl JSON files from before the store existed
+    # are added with `python listing_store.py import`.
+    with ListingStore(db_path) as store:
+        return store.records(since=since)
+
+
+def load_new_rows(since=None):
+    """
+    Typed rows (DATASET_COLUMNS plus `seen_at`) for the latest sighting of
+    every listing seen since the watermark. They come column-pruned from the
+    Parquet listing dataset when pyarrow is installed and the dataset exists,
+    otherwise the listing store's strings are parsed here.
+    """
+    if listing_dataset.available() and globals['PARQUET_DIR'].exists():
+        df = listing_dataset.read(listing_dataset.TYPED_COLUMNS + ['title'],
+                                  since=datetime.fromisoformat(since) if since else None, root=globals['PARQUET_DIR'])
+        df = listing_dataset.latest(df)
+        df['seen_at'] = df['scraped_at'].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    else:
+        df = parse_records(load_records(globals['DB_PATH'], since))
+        df = df.rename(columns={'last_seen': 'seen_at'})
+    return price_model.add_segments(df)[DATASET_COLUMNS + ['seen_at']]
+
+
+def parse_records(records):
+    df = pd.DataFrame(records, columns=list(records[0]) if records else ['listing_id', 'name', 'title', 'price', 'miles', 'last_seen'])
+    df['price_val'] = normalize.parse_prices(df['price'])
+    df['miles_val'] = normalize.parse_miles(df['miles'])
+    df['year_val'] = normalize.parse_years(df['name'])
+    return df
+
+
+def usable(df):
     df = df.dropna(subset=['price_val', 'miles_val', 'year_val'])
-    df = df[df['year_val'] >= 2010]
+    # the model fits log-price, so free listings are left out
+    df = df[(df['year_val'] >= 2010) & (df['price_val'] > 0)]
+    return add_age(df)
+
+
+def preprocess_df(records):
+    return usable(parse_records(records))
+
+
+def add_age(df):
+    df = df.copy()
     df['age'] = globals['CURRENT_YEAR'] - df['year_val']
     return df
 
 
-def fit_and_score(df):
-    X = df[['age', 'miles_val']].values
-    y = df['price_val'].values
-    model = LinearRegression().fit(X, y)
-    df['predicted_price'] = model.predict(df[['age', 'miles_val']])
-    df['residual'] = df['price_val'] - df['predicted_price']
-    return df
+# The regression dataset: typed columns of every usable listing, persisted as
+# append-only .npz chunks. A listing seen again is appended to a newer chunk
+# (the newest row wins); a row with a NaN price removes the listing.
+def new_checkpoint():
+    for fp in globals['DATASET_DIR'].glob('*.npz'):
+        fp.unlink()
+    return {'version': CHECKPOINT_VERSION, 'watermark': None, 'current_year': globals['CURRENT_YEAR'],
+            'chunks': [], 'stats': {}}
+
+
+def load_checkpoint():
+    try:
+        data = json.loads(globals['CHECKPOINT_FILE'].read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if data.get('version') != CHECKPOINT_VERSION or data.get('current_year') != globals['CURRENT_YEAR']:
+        return None  # parsing changed or every age did, rebuild from scratch
+    data['stats'] = {
+        key: {'xtx': np.array(stats['xtx']), 'xty': np.array(stats['xty']), 'n': stats['n']}
+        for key, stats in data['stats'].items()
+    }
+    return data
+
+
+def save_checkpoint(checkpoint):
+    stats = {
+        key: {'xtx': seg['xtx'].tolist(), 'xty': seg['xty'].tolist(), 'n': seg['n']}
+        for key, seg in checkpoint['stats'].items()
+    }
+    globals['CHECKPOINT_FILE'].write_text(json.dumps({**checkpoint, 'stats': stats}, indent=2))
+
+
+def load_dataset(chunks):
+    frames = [pd.DataFrame(dict(np.load(globals['DATASET_DIR'] / name))) for name in chunks]
+    if not frames:
+        return add_age(pd.DataFrame({col: pd.Series(dtype=object if col in SEGMENT_COLUMNS else float)
+                                     for col in DATASET_COLUMNS}))
+    df = pd.concat(frames, ignore_index=True).drop_duplicates('listing_id', keep='last')
+    return add_age(df.dropna(subset=['price_val']))
+
+
+def append_chunk(df):
+    name = f"chunk_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.npz"
+    columns = {col: df[col].fillna('').to_numpy(dtype=str) if col in SEGMENT_COLUMNS else df[col].to_numpy()
+               for col in DATASET_COLUMNS}
+    np.savez(globals['DATASET_DIR'] / name, **columns)
+    return name
+
+
+def unchanged(dataset, candidate):
+    """
+    Mask of the `candidate` rows (DATASET_COLUMNS, NaN for unusable
+    listings) that the dataset already holds with the same values, or does
+    not hold and would not.
+    """
+    merged = candidate[DATASET_COLUMNS].merge(dataset[DATASET_COLUMNS], on='listing_id', how='left',
+                                              suffixes=('', '_old'))
+    same = pd.Series(True, index=merged.index)
+    for col in DATASET_COLUMNS[1:]:
+        new, old = merged[col], merged[f'{col}_old']
+        if col in SEGMENT_COLUMNS:  # chunks store a missing segment as ''
+            same &= new.fillna('').astype(str) == old.fillna('').astype(str)
+        else:
+            new, old = new.astype(float), old.astype(float)
+            same &= (new == old) | (new.isna() & old.isna())
+    return same.to_numpy()
+
+
+def update_dataset(checkpoint, rows):
+    """
+    Fold the rows of listings seen since the last run into the dataset and
+    the per-segment statistics. Also returns the segments that changed.
+    """
+    dataset = load_dataset(checkpoint['chunks'])
+    if rows.empty:
+        return dataset, checkpoint, set()
+    watermark = rows['seen_at'].max()
+    new_df = usable(rows)
+    candidate = pd.DataFrame({'listing_id': rows['listing_id'].astype('int64')}).merge(
+        new_df[DATASET_COLUMNS], on='listing_id', how='left')
+    # The watermark's second is read again and backfills repeat sightings:
+    # rows that change nothing must not mark their segments for a refit.
+    candidate = candidate[~unchanged(dataset, candidate)]
+    if candidate.empty:
+        return dataset, {**checkpoint, 'watermark': watermark}, set()
+    touched = candidate['listing_id']
+    new_df = new_df[new_df['listing_id'].astype('int64').isin(touched)]
+
+    replaced = dataset['listing_id'].isin(touched)
+    old_stats = price_model.segment_stats(dataset[replaced], globals['CURRENT_YEAR'])
+    new_stats = price_model.segment_stats(new_df, globals['CURRENT_YEAR'])
+    stats = price_model.combine_stats(checkpoint['stats'], old_stats, sign=-1)
+    stats = price_model.combine_stats(stats, new_stats)
+    changed = set(old_stats) | set(new_stats)
+    chunks = checkpoint['chunks'] + [append_chunk(candidate)]
+    dataset = pd.concat([dataset[~replaced], new_df[dataset.columns]], ignore_index=True)
+
+    if len(chunks) > globals['MAX_CHUNKS']:
+        # Compact into one chunk and recompute the statistics exactly.
+        compacted = append_chunk(dataset)
+        for name in chunks:
+            (globals['DATASET_DIR'] / name).unlink()
+        chunks, stats = [compacted], price_model.segment_stats(dataset, globals['CURRENT_YEAR'])
+
+    return dataset, {**checkpoint, 'watermark': watermark, 'chunks': chunks, 'stats': stats}, changed
+
+
+def update_model(stats, changed, rebuilt):
+    """Refit the segments whose data changed; everything when the cache is stale."""
+    model = price_model.load_model(globals['MODEL_FILE'])
+    if rebuilt or model is None or model['current_year'] != globals['CURRENT_YEAR']:
+        model, changed = price_model.new_model(globals['CURRENT_YEAR']), None
+    elif not changed:
+        return model
+    model = price_model.refit(model, stats, changed)
+    price_model.save_model(model, globals['MODEL_FILE'])
+    return model
 
 
 def alert_if_needed(best_deals, alerted_dict):
     candidates = best_deals[best_deals['residual'] <= globals['ALERT_THRESHOLD']]
     new_deals = {}
-    for link in candidates['link']:
-        if link not in alerted_dict:
-            alerted_dict[link] = datetime.now().isoformat()
-            new_deals[link] = alerted_dict[link]
+    # keyed by vehicle (the lowest listing ID of its reposts), so a repost does not alert again
+    for vid in candidates['vehicle_id']:
+        vid = int(vid)
+        if vid not in alerted_dict:
+            alerted_dict[vid] = datetime.now().isoformat()
+            new_deals[vid] = alerted_dict[vid]
     if new_deals:
         print(f"*** ALERT: {len(new_deals)} new deal(s) found ***")
         for _ in range(3):
@@ -94,23 +248,59 @@ def alert_if_needed(best_deals, alerted_dict):
     return alerted_dict
 
 
-def archive_records(records):
-    ts = datetime.now().strftime('%Y%m%d_%H%M%S')
-    out_path = globals['ARCHIVE_DIR'] / f'all_records_{ts}.json'
-    with out_path.open('w', encoding='utf-8') as f:
-        json.dump(records, f, indent=2)
-    print(f"Archived {len(records)} records to {out_path}")
+def import_files(paths):
+    """
+    Stream crawl results saved as JSON Lines (or JSON) files into the listing
+    store, and the Parquet dataset when it is in use, a batch at a time.
+    Returns the number of listings imported.
+    """
+    use_dataset = listing_dataset.available() and globals['PARQUET_DIR'].exists()
+    with ListingStore(globals['DB_PATH']) as store:
+        return store.import_paths(paths, _write_dataset if use_dataset else None)
+
+
+def _write_dataset(records, query, seen):
+    listing_dataset.write_records(records, query, scraped_at=datetime.fromisoformat(seen), root=globals['PARQUET_DIR'])
 
 
-def main():
-    records = load_records(globals['JSON_DIR'])
-    archive_records(records)
+def main(full=False, imports=None):
+    # Imported sightings can be older than the watermark, so they need a rebuild.
+    if imports and import_files(imports):
+        full = True
+    checkpoint = None if full else load_checkpoint()
+    rebuilt = checkpoint is None
+    if rebuilt:
+        checkpoint = new_checkpoint()
+    # Rows seen in the watermark's second are read again; update_dataset skips the unchanged ones.
+    rows = load_new_rows(checkpoint['watermark'])
+    print(f"Processing {len(rows)} new or updated listings")
+    with ListingStore(globals['DB_PATH']) as store:
+        # Before the watermark moves on, so a failed run re-matches these listings next time.
+        dedupe.update_vehicles(store, checkpoint['watermark'])
+    dataset, checkpoint, changed = update_dataset(checkpoint, rows)
+    save_checkpoint(checkpoint)
+    model = update_model(checkpoint['stats'], changed, rebuilt)
+    if dataset.empty or price_model.GLOBAL not in model['segments']:
+        print("No usable listings to score yet.")
+        return
+    print(f"Price model: {len(model['segments'])} segments, {len(changed)} changed this run")
 
     alerted_links = load_alerted_links()
 
-    df = preprocess_df(records)
-    df = fit_and_score(df)
-    best_deals = df.nsmallest(25, 'residual')
+    df = price_model.predict(dataset, model)
+    with ListingStore(globals['DB_PATH']) as store:
+        # Reposts of the same car count once, as their most recently seen listing.
+        vehicles = store.vehicles()
+        df = df.merge(vehicles, on='listing_id', how='left')
+        df['vehicle_id'] = df['vehicle_id'].fillna(df['listing_id']).astype('int64')
+        df = df.sort_values('last_seen', kind='stable').drop_duplicates('vehicle_id', keep='last')
+        best = df.nsmallest(25, 'residual').drop(columns='last_seen')
+        details = pd.DataFrame(store.records_by_id(best['listing_id']))
+        histories = dedupe.price_histories(store, best['vehicle_id'])
+    best_deals = details.merge(best, on='listing_id').sort_values('residual')
+    best_deals['listings'] = best_deals['vehicle_id'].map(vehicles['vehicle_id'].value_counts()).fillna(1).astype(int)
+    best_deals['price_history'] = best_deals['vehicle_id'].map(
+        lambda vehicle: dedupe.format_history(histories.get(vehicle, [])))
 
     ts = datetime.now().strftime('%Y%m%d_%H%M%S')
     csv_path = globals['OUTPUT_DIR'] / f'{ts}_best_deals.csv'
@@ -121,4 +311,9 @@ def main():
     save_alerted_links(updated)
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Score listings and alert on the best deals.')
+    parser.add_argument('--full', action='store_true', help='rebuild the dataset and model from every listing')
+    parser.add_argument('--import', dest='imports', nargs='+', metavar='PATH',
+                        help='first import crawl results from JSON Lines (.jsonl, .jsonl.gz, .jsonl.zst) or JSON files')
+    args = parser.parse_args()
+    main(args.full, args.imports)
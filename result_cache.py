@@ -0,0 +1,125 @@
+"""
+TTL + LRU cache of crawl results.
+
+Entries are keyed by a normalized search (see job_queue.CrawlRequest.key)
+and are fresh for `ttl` seconds. With `stale_ttl` > 0 an expired entry is
+still returned for that many more seconds, marked stale, so the caller can
+answer straight away and refresh it in the background. At most
+`max_entries` searches are kept; the least recently used one is evicted
+first.
+
+With a `path` the cache is written there (atomically) and reloaded on
+start, so cached results survive an API restart. Inside an event loop the
+writes are debounced: changes within `save_delay` seconds are written
+together, in a worker thread, so a large cache never blocks the loop.
+Call `flush()` before the loop stops to write what is still pending.
+"""
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+HIT = 'HIT'
+STALE = 'STALE'
+MISS = 'MISS'
+
+
+class ResultCache:
+    def __init__(self, ttl: float, max_entries: int = 256, stale_ttl: float = 0, path: Path = None,
+                 save_delay: float = 1.0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self.path = Path(path) if path else None
+        self.save_delay = save_delay
+        self._entries = OrderedDict()  # key -> (stored_at, value), least recently used first
+        self._dirty = False
+        self._save_task = None
+        self._flush_now = asyncio.Event()
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'evictions': 0}
+        if self.path is not None:
+            self._load()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: tuple) -> tuple:
+        """(value, HIT | STALE, age in seconds), or (None, MISS, None)."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, value = entry
+            age = time.time() - stored_at
+            if age < self.ttl + self.stale_ttl:
+                self._entries.move_to_end(key)
+                state = HIT if age < self.ttl else STALE
+                self.stats['hits' if state == HIT else 'stale_hits'] += 1
+                return value, state, age
+            del self._entries[key]
+        self.stats['misses'] += 1
+        return None, MISS, None
+
+    def set(self, key: tuple, value):
+        if not self.enabled:
+            return
+        self._entries[key] = (time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+        if self.path is not None:
+            self._schedule_save()
+
+    def metrics(self) -> dict:
+        return {'cache_entries': len(self._entries), **{f'cache_{name}': count for name, count in self.stats.items()}}
+
+    def _load(self):
+        try:
+            entries = json.loads(self.path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        cutoff = time.time() - self.ttl - self.stale_ttl
+        for key, stored_at, value in entries[-self.max_entries:]:
+            if stored_at > cutoff:
+                self._entries[tuple(key)] = (stored_at, value)
+
+    def _schedule_save(self):
+        self._dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._dirty = False
+            self._write(self._snapshot())  # no event loop to block
+            return
+        if self._save_task is None or self._save_task.done():
+            self._save_task = loop.create_task(self._save_soon())
+
+    async def _save_soon(self):
+        while self._dirty:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), self.save_delay)
+            except asyncio.TimeoutError:
+                pass
+            self._dirty = False
+            await asyncio.to_thread(self._write, self._snapshot())
+
+    async def flush(self):
+        """Write any change not saved yet, without waiting for the debounce."""
+        if self._save_task is not None and not self._save_task.done():
+            self._flush_now.set()
+            await self._save_task
+            self._flush_now.clear()
+
+    def _snapshot(self) -> list:
+        # Taken on the caller's thread, so the writer never sees the dict change under it.
+        return [[list(key), stored_at, value] for key, (stored_at, value) in self._entries.items()]
+
+    def _write(self, entries: list):
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        tmp.write_text(json.dumps(entries))
+        os.replace(tmp, self.path)
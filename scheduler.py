@@ -0,0 +1,155 @@
+"""
+Parallel multi-city / multi-query crawl scheduler.
+
+A batch of (city, query, price range) jobs is fanned out over the contexts
+of a BrowserPool: one worker per context pulls jobs off a queue, so N
+contexts crawl N searches at once. Navigations to the same domain are
+spaced out by a per-domain rate limiter, and the results of every job are
+merged (deduplicated by listing ID) into one list.
+
+Run a batch from the command line with a JSON file of jobs:
+
+    python scheduler.py jobs.json [--workers 3] [--per-minute 20] [--max-scrolls 2]
+
+where jobs.json looks like
+    [{"city": "Provo", "query": "car", "min_price": 2000, "max_price": 8000}, ...]
+
+The merged listings are appended to a JSON Lines file (batch_results.jsonl
+by default; name it .jsonl.gz or .jsonl.zst to compress), one listing per
+line with its `scraped_at` time, ready for `python listing_store.py import`.
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import NamedTuple
+from urllib.parse import urlparse
+
+from decouple import config
+
+import cities
+import crawl_engine
+import jsonl
+from browser_pool import BrowserPool
+from listing_ids import record_id
+
+
+class CrawlJob(NamedTuple):
+    city: str
+    query: str
+    min_price: int
+    max_price: int
+
+    @property
+    def url(self) -> str:
+        location = cities.city_slug(self.city)
+        if location is None:
+            raise ValueError(f"'{self.city}' is not a supported city")
+        return cities.marketplace_search_url(location, self.query, self.max_price, self.min_price)
+
+
+class DomainRateLimiter:
+    """Allows at most `per_minute` navigations per domain, evenly spaced."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next_slot = {}
+        self._lock = asyncio.Lock()
+
+    async def wait(self, url: str):
+        domain = urlparse(url).netloc
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(domain, now))
+            self._next_slot[domain] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+async def run_jobs(pool, jobs: list, workers: int = None, rate_limiter: DomainRateLimiter = None,
+                   limiter: crawl_engine.CrawlLimiter = None, max_listings: int = None,
+                   max_scrolls: int = 0, backend: str = 'bs4') -> dict:
+    """
+    Crawl every job and return {'results': merged listings, 'jobs': per-job summaries}.
+    Each listing is tagged with the city and query that found it. A failed
+    job is reported in its summary and does not stop the batch.
+    """
+    queue = asyncio.Queue()
+    for index, job in enumerate(jobs):
+        queue.put_nowait((index, job))
+    summaries = [None] * len(jobs)
+    job_results = [[] for _ in jobs]
+
+    async def crawl_one(job: CrawlJob) -> list:
+        url = job.url
+        if rate_limiter is not None:
+            await rate_limiter.wait(url)
+        async with pool.acquire() as page:
+            return await crawl_engine.crawl(page, url, max_listings, max_scrolls, backend)
+
+    async def worker():
+        while not queue.empty():
+            index, job = queue.get_nowait()
+            start = time.perf_counter()
+            summary = {**job._asdict(), 'listings': 0, 'error': None}
+            try:
+                if limiter is not None:
+                    async with limiter:
+                        listings = await crawl_one(job)
+                else:
+                    listings = await crawl_one(job)
+                for listing in listings:
+                    listing.update(city=job.city, query=job.query)
+                job_results[index] = listings
+                summary['listings'] = len(listings)
+            except Exception as e:
+                summary['error'] = f'{type(e).__name__}: {e}'
+            summary['seconds'] = round(time.perf_counter() - start, 2)
+            summaries[index] = summary
+
+    workers = workers or pool.size
+    await asyncio.gather(*(worker() for _ in range(min(workers, len(jobs)))))
+
+    merged, seen_ids = [], set()
+    for listings in job_results:
+        for listing in listings:
+            key = record_id(listing) or listing['link']
+            if key in seen_ids:
+                continue
+            seen_ids.add(key)
+            merged.append(listing)
+    return {'results': merged, 'jobs': summaries}
+
+
+def load_jobs(path: str) -> list:
+    with open(path, encoding='utf-8') as f:
+        return [CrawlJob(**job) for job in json.load(f)]
+
+
+async def _main(args):
+    jobs = load_jobs(args.jobs)
+    pool = BrowserPool(config('EMAIL'), config('PASSWORD'), size=args.workers, headless=args.headless)
+    await pool.start()
+    try:
+        batch = await run_jobs(pool, jobs, rate_limiter=DomainRateLimiter(args.per_minute),
+                               max_scrolls=args.max_scrolls)
+    finally:
+        await pool.close()
+    for summary in batch['jobs']:
+        print(summary)
+    scraped_at = datetime.now().isoformat(timespec='seconds')
+    written = jsonl.append_records(args.output, ({**listing, 'scraped_at': scraped_at} for listing in batch['results']))
+    print(f"Appended {written} listings to {args.output}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Crawl a batch of Marketplace searches in parallel.')
+    parser.add_argument('jobs', help='JSON file with a list of {city, query, min_price, max_price}')
+    parser.add_argument('--workers', type=int, default=3, help='browser contexts crawling at once')
+    parser.add_argument('--per-minute', type=float, default=20, help='max navigations per domain per minute')
+    parser.add_argument('--max-scrolls', type=int, default=0)
+    parser.add_argument('--headless', action='store_true')
+    parser.add_argument('--output', default='batch_results.jsonl',
+                        help='JSON Lines file to append to (.jsonl, .jsonl.gz or .jsonl.zst)')
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,111 @@
+"""
+Versioned listing-card selector sets shared by every crawler.
+
+The sets live in selector_sets.json, newest version first. Each set is a card
+spec (see extraction.py) whose fields are fallback chains, so when Facebook
+renames one class the next selector in the chain still matches. When a whole
+layout changes, add a new set to the JSON file; `detect` picks the set that
+matches the page being crawled.
+
+Compiled selectors are cached per set by the parsers (see parsers.get_parser).
+"""
+import json
+import logging
+from pathlib import Path
+
+from extraction import parse_cards
+from parsers import SPEC_KEYS, card_selector, get_parser
+
+SELECTOR_SETS_FILE = Path(__file__).with_name('selector_sets.json')
+
+# Number of cards matched by each card selector list.
+COUNT_CARDS_JS = 'selectors => selectors.map(sel => document.querySelectorAll(sel).length)'
+
+logger = logging.getLogger(__name__)
+
+
+class SelectorSet:
+    def __init__(self, name: str, version: int, spec: dict, description: str = ''):
+        self.name = name
+        self.version = version
+        self.spec = spec
+        self.description = description
+
+    def __repr__(self):
+        return f'SelectorSet({self.name!r}, version={self.version})'
+
+    @property
+    def card_selector(self) -> str:
+        return card_selector(self.spec)
+
+    def parser(self, backend: str = 'bs4'):
+        return get_parser(backend, self.spec)
+
+    def parse(self, html: str, backend: str = 'bs4') -> list:
+        return parse_cards(html, self.spec, backend)
+
+
+def load_sets(path: Path = SELECTOR_SETS_FILE) -> list:
+    """Load selector sets from JSON, newest version first."""
+    with Path(path).open(encoding='utf-8') as f:
+        data = json.load(f)
+    sets = []
+    for entry in data['sets']:
+        missing = [key for key in SPEC_KEYS if key not in entry]
+        if missing:
+            raise ValueError(f"Selector set {entry.get('name')!r} is missing {', '.join(missing)}")
+        spec = {key: entry[key] for key in SPEC_KEYS}
+        sets.append(SelectorSet(entry['name'], entry['version'], spec, entry.get('description', '')))
+    return sorted(sets, key=lambda s: s.version, reverse=True)
+
+
+SELECTOR_SETS = load_sets()
+
+
+def get_set(name: str) -> SelectorSet:
+    for selector_set in SELECTOR_SETS:
+        if selector_set.name == name:
+            return selector_set
+    raise KeyError(f"Unknown selector set '{name}'")
+
+
+def latest() -> SelectorSet:
+    return SELECTOR_SETS[0]
+
+
+def pick_set(counts: list, sets: list = None) -> SelectorSet:
+    """The set matching the most cards; ties go to the newer set."""
+    sets = sets or SELECTOR_SETS
+    best = max(range(len(sets)), key=lambda i: (counts[i], sets[i].version))
+    if counts[best] == 0:
+        logger.warning("No selector set matched any listing cards, falling back to %s. Facebook may have "
+                       "changed its markup; add a new set to %s.", sets[0].name, SELECTOR_SETS_FILE.name)
+        return sets[0]
+    return sets[best]
+
+
+def detect(page, sets: list = None) -> SelectorSet:
+    """Pick the selector set for a live (sync Playwright) page."""
+    sets = sets or SELECTOR_SETS
+    counts = page.evaluate(COUNT_CARDS_JS, [s.card_selector for s in sets])
+    return pick_set(counts, sets)
+
+
+async def adetect(page, sets: list = None) -> SelectorSet:
+    """Pick the selector set for a live async Playwright page."""
+    sets = sets or SELECTOR_SETS
+    counts = await page.evaluate(COUNT_CARDS_JS, [s.card_selector for s in sets])
+    return pick_set(counts, sets)
+
+
+def detect_html(html: str, sets: list = None, backend: str = 'bs4') -> SelectorSet:
+    """Pick the selector set for saved page HTML."""
+    sets = sets or SELECTOR_SETS
+    return pick_set([len(s.parse(html, backend)) for s in sets], sets)
+
+
+def check_yield(selector_set: SelectorSet, cards: int, records: int):
+    """Warn when cards were found but the field selectors produced nothing."""
+    if cards and not records:
+        logger.warning("%d listing cards matched %s but none could be parsed. The field selectors in %s "
+                       "may be out of date.", cards, selector_set.name, SELECTOR_SETS_FILE.name)
@@ -0,0 +1,24 @@
+import importlib.util
+from pathlib import Path
+
+import metrics
+
+APP = Path(__file__).resolve().parent.parent / 'app.py'
+
+
+def load_app(name):
+    spec = importlib.util.spec_from_file_location(name, APP)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_app_can_be_imported_twice(monkeypatch):
+    # `python app.py` runs the module as __main__, then uvicorn imports it as `app`.
+    monkeypatch.setenv('EMAIL', 'a')
+    monkeypatch.setenv('PASSWORD', 'b')
+    load_app('app_main')
+    served = load_app('app_served')
+    body, _ = metrics.latest()
+    assert body.count(b'# TYPE marketplace_crawls_running gauge') == 1
+    assert metrics._collectors['marketplace'].read is served._stats
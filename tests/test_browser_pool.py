@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+from browser_pool import BrowserPool
+
+
+class StubPage:
+    def on(self, event, handler):
+        pass
+
+    def is_closed(self):
+        return False
+
+
+class StubContext:
+    async def new_page(self):
+        return StubPage()
+
+    async def close(self):
+        pass
+
+
+class StubBrowser:
+    def is_connected(self):
+        return True
+
+    async def new_context(self):
+        return StubContext()
+
+
+def stub_pool(size, logged_in=False):
+    pool = BrowserPool('a', 'b', size=size, login_backoff=60, max_login_backoff=3600)
+    pool._browser = StubBrowser()
+
+    async def login(page):
+        await asyncio.sleep(0.01)
+        return logged_in
+
+    async def ensure_browser():
+        pass
+
+    pool._login = login
+    pool._ensure_browser = ensure_browser
+    return pool
+
+
+def test_parallel_failed_logins_count_as_one_round():
+    async def main():
+        pool = stub_pool(4)
+        slots = await asyncio.gather(*(pool._new_slot() for _ in range(pool.size)))
+        first = (pool._login_failures, pool._next_login - time.monotonic())
+        # Logged-out slots keep being lent out until the backoff has passed.
+        healthy = await pool._is_healthy(slots[0])
+        pool._next_login = 0.0
+        rebuild = not await pool._is_healthy(slots[0])
+        await pool._recycle(slots[0])
+        return first, healthy, rebuild, (pool._login_failures, pool._next_login - time.monotonic())
+
+    (failures, delay), healthy, rebuild, (failures_after, delay_after) = asyncio.run(main())
+    assert failures == 1 and 59 < delay <= 60
+    assert healthy and rebuild
+    assert failures_after == 2 and 119 < delay_after <= 120
+
+
+def test_a_successful_login_resets_the_backoff():
+    async def main():
+        pool = stub_pool(1, logged_in=True)
+        pool._login_failures = 3
+        slot = await pool._new_slot()
+        return pool._login_failures, slot.logged_in
+
+    assert asyncio.run(main()) == (0, True)
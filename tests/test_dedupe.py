@@ -0,0 +1,57 @@
+import sqlite3
+
+import numpy as np
+
+import dedupe
+from listing_store import ListingStore
+
+
+def records(rng, start, count):
+    makes = ['Toyota Camry', 'Honda Civic', 'Honda Accord']
+    cities = ['Provo, UT', 'Orem, UT']
+    out = []
+    for lid in range(start, start + count):
+        year = 2010 + lid % 4
+        miles = (50 + lid % 7 * 20) * 1000 + int(rng.integers(0, 300))
+        out.append({
+            'listing_id': lid, 'title': f'{year} {makes[lid % 3]} LE',
+            'price': f'${9000 - int(rng.integers(0, 2000)):,}', 'miles': f'{miles:,} miles',
+            'location': cities[lid % 2],
+        })
+    return out
+
+
+def mapping(store):
+    return dict(store.conn.execute('SELECT listing_id, vehicle_id FROM vehicles').fetchall())
+
+
+def test_incremental_update_matches_a_full_rebuild(tmp_path):
+    rng = np.random.default_rng(0)
+    with ListingStore(tmp_path / 'listings.db') as store:
+        store.upsert(records(rng, 1000, 150), seen='2025-05-01T00:00:00')
+        assert dedupe.update_vehicles(store, '2025-05-01T00:00:00') == 150  # nothing saved yet: full
+        # Reposts of existing cars, and one listing whose title moved it to another block.
+        reposts = records(rng, 2000, 40)
+        moved = dict(records(rng, 1001, 1)[0], title='2012 Toyota Camry LE')
+        store.upsert(reposts + [moved], seen='2025-05-02T00:00:00')
+        rewritten = dedupe.update_vehicles(store, '2025-05-02T00:00:00')
+        assert rewritten < 191
+        incremental = mapping(store)
+
+        dedupe.update_vehicles(store)
+        assert incremental == mapping(store)
+        assert len(set(incremental.values())) < len(incremental)
+
+
+def test_vehicles_table_without_blocks_is_rebuilt(tmp_path):
+    path = tmp_path / 'listings.db'
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE vehicles (listing_id INTEGER PRIMARY KEY, vehicle_id INTEGER NOT NULL)')
+    conn.execute('INSERT INTO vehicles VALUES (1, 1)')
+    conn.commit()
+    conn.close()
+    with ListingStore(path) as store:
+        assert not store.has_vehicles()
+        store.upsert(records(np.random.default_rng(0), 1, 5))
+        dedupe.update_vehicles(store, '2025-05-01T00:00:00')
+        assert len(store.vehicles()) == 5
@@ -0,0 +1,102 @@
+import json
+
+import requests
+
+import discord_notifier
+from discord_notifier import DiscordNotifier
+
+
+class StubResponse:
+    def __init__(self, status_code=204, headers=None, body=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.headers = headers or {}
+        self.text = json.dumps(body) if body is not None else ''
+        self._body = body
+
+    def json(self):
+        if self._body is None:
+            raise ValueError('no body')
+        return self._body
+
+
+class StubSession:
+    """Answers posts with the queued responses (or exceptions), then with 204s."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.posted = []
+
+    def post(self, url, json=None, params=None, timeout=None):
+        self.posted.append(json)
+        response = self.responses.pop(0) if self.responses else StubResponse()
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def listings(count, name_chars=200):
+    return [{'name': f'{i} ' + 'x' * name_chars, 'price': '$9,000', 'miles': '120K miles',
+             'location': 'Provo, UT', 'link': f'https://www.facebook.com/marketplace/item/{i}/'}
+            for i in range(count)]
+
+
+def embed_chars(message):
+    return sum(len(embed.get('title', '')) + len(embed.get('description', ''))
+               + sum(len(field['name']) + len(field['value']) for field in embed['fields'])
+               for embed in message['embeds'])
+
+
+def notifier(tmp_path, session, sleeps=None):
+    return DiscordNotifier('https://discord.test/webhook', session=session, outbox_path=tmp_path / 'outbox.db',
+                           max_retries=3, sleep=(sleeps.append if sleeps is not None else lambda _: None))
+
+
+def test_long_field_lists_are_split_within_discords_limits():
+    messages = discord_notifier.build_messages(listings(120), content='New deals', description='Provo')
+    assert len(messages) > 1
+    fields = [field for message in messages for embed in message['embeds'] for field in embed['fields']]
+    assert len(fields) == 120
+    for message in messages:
+        assert len(message['embeds']) <= discord_notifier.MAX_EMBEDS
+        assert all(len(embed['fields']) <= discord_notifier.MAX_FIELDS for embed in message['embeds'])
+        assert embed_chars(message) <= discord_notifier.MAX_MESSAGE_CHARS
+    assert messages[0]['content'] == 'New deals'
+    assert 'content' not in messages[1]
+
+
+def test_many_short_fields_fill_embeds_of_25():
+    messages = discord_notifier.build_messages(listings(40, name_chars=5))
+    assert [len(embed['fields']) for embed in messages[0]['embeds']] == [25, 15]
+
+
+def test_rate_limits_and_server_errors_are_retried_then_the_outbox_is_cleared(tmp_path):
+    session = StubSession(StubResponse(429, body={'retry_after': 2.5}), StubResponse(502),
+                          requests.exceptions.ConnectionError('reset'))
+    sleeps = []
+    with notifier(tmp_path, session, sleeps) as n:
+        assert n.notify(listings(3)) == 1
+        assert n.pending() == 0
+    assert len(session.posted) == 4
+    assert sleeps == [2.5, 2.0, 4.0]  # Retry-After, then exponential backoff
+
+
+def test_undelivered_messages_stay_pending_until_the_next_flush(tmp_path):
+    down = StubSession(*[StubResponse(503)] * 4)
+    with notifier(tmp_path, down) as n:
+        n.enqueue(listings(30, name_chars=300))
+        queued = n.pending()
+        assert queued > 1
+        assert n.flush() == 0
+        assert n.pending() == queued
+        n.session = StubSession()
+        assert n.flush() == queued
+        assert n.pending() == 0
+        assert len(n.session.posted) == queued
+
+
+def test_rejected_messages_are_kept_as_failed(tmp_path):
+    with notifier(tmp_path, StubSession(StubResponse(400, body={'message': 'Invalid Form Body'}))) as n:
+        assert n.notify(listings(1)) == 0
+        assert n.pending() == 0
+        assert n.conn.execute("SELECT status FROM outbox").fetchone()[0] == 'failed'
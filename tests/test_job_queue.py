@@ -0,0 +1,86 @@
+import asyncio
+
+import job_queue
+from browser_pool import PoolTimeout
+from job_queue import CrawlRequest, JobQueue
+
+REQUEST = CrawlRequest('provo', 'camry', 1000, 9000)
+
+
+def run_queue(run, **options):
+    async def main():
+        queue = JobQueue(run, workers=1, retry_errors=(PoolTimeout,), retry_delay=0.01, **options)
+        queue.start()
+        job, _ = queue.submit(REQUEST)
+        while not job.finished:
+            await asyncio.sleep(0.005)
+        again, created = queue.submit(REQUEST)
+        await queue.close()
+        return job, again, created, queue.metrics()
+    return asyncio.run(main())
+
+
+def test_pool_timeouts_are_retried_until_the_crawl_runs():
+    calls = []
+
+    async def run(request):
+        calls.append(request)
+        if len(calls) < 3:
+            raise PoolTimeout('no browser')
+        return [{'listing_id': 1}]
+
+    job, _, _, _ = run_queue(run)
+    assert job.status == job_queue.DONE
+    assert job.retries == 2
+    assert job.as_dict()['results'] == [{'listing_id': 1}]
+
+
+def test_a_job_that_never_gets_a_browser_ends_retryable():
+    async def run(request):
+        raise PoolTimeout('no browser')
+
+    job, again, created, metrics = run_queue(run, max_retries=2)
+    assert job.status == job_queue.RETRY
+    assert job.as_dict()['retryable'] and job.retries == 2
+    assert metrics['jobs_retry'] == 1
+    # A finished retry job is not coalesced into: submitting again starts a new crawl.
+    assert created and again is not job
+
+
+def test_other_errors_fail_without_retrying():
+    calls = []
+
+    async def run(request):
+        calls.append(request)
+        raise ValueError('boom')
+
+    job, _, _, _ = run_queue(run)
+    assert job.status == job_queue.FAILED
+    assert not job.as_dict()['retryable']
+    assert len(calls) == 1
+
+
+def test_submissions_join_a_job_waiting_to_be_retried():
+    async def main():
+        attempts = []
+
+        async def run(request):
+            attempts.append(request)
+            if len(attempts) == 1:
+                raise PoolTimeout('no browser')
+            return []
+
+        queue = JobQueue(run, workers=1, retry_errors=(PoolTimeout,), retry_delay=0.05)
+        queue.start()
+        job, _ = queue.submit(REQUEST)
+        while job.retries == 0:
+            await asyncio.sleep(0.005)
+        joined, created = queue.submit(REQUEST)
+        while not job.finished:
+            await asyncio.sleep(0.005)
+        await queue.close()
+        return job, joined, created, attempts
+
+    job, joined, created, attempts = asyncio.run(main())
+    assert joined is job and not created
+    assert job.status == job_queue.DONE and len(attempts) == 2
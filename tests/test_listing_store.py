@@ -0,0 +1,33 @@
+import jsonl
+from listing_store import ListingStore
+
+
+def record(lid, price='$9,000'):
+    return {'listing_id': lid, 'title': '2015 Toyota Camry LE', 'price': price, 'miles': '120K miles',
+            'location': 'Provo, UT', 'scraped_at': '2025-05-01T00:00:00'}
+
+
+def test_import_resumes_appended_jsonl(tmp_path):
+    path = tmp_path / 'batch_results.jsonl'
+    jsonl.append_records(path, [record(1), record(2)])
+    with ListingStore(tmp_path / 'listings.db') as store:
+        assert store.import_paths([path]) == 2
+        assert store.import_paths([path]) == 0
+        jsonl.append_records(path, [record(3), record(4)])
+        assert store.import_paths([path]) == 2
+        assert store.count() == 4
+        # Only the appended lines were read again: listing 1 has one sighting.
+        assert len(store.price_history(1)) == 1
+
+
+def test_import_stops_at_a_line_still_being_written(tmp_path):
+    path = tmp_path / 'batch_results.jsonl'
+    jsonl.append_records(path, [record(1)])
+    with path.open('a') as f:
+        f.write('{"listing_id": 2, "ti')
+    with ListingStore(tmp_path / 'listings.db') as store:
+        assert store.import_paths([path]) == 1
+        with path.open('a') as f:
+            f.write('tle": "2016 Honda Civic", "price": "$7,000", "scraped_at": "2025-05-02T00:00:00"}\n')
+        assert store.import_paths([path]) == 1
+        assert store.count() == 2
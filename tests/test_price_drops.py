@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+import price_drops
+import price_model
+
+RECORD = {'listing_id': 1, 'title': '2015 Toyota Camry LE', 'price': '$5,000', 'miles': '120K miles'}
+PREVIOUS = {1: ('$9,000', '2025-05-01T00:00:00')}
+
+
+def fitted_model():
+    rng = np.random.default_rng(0)
+    years = rng.integers(2008, 2022, 200)
+    miles = rng.integers(30, 200, 200) * 1000
+    df = pd.DataFrame({
+        'year_val': years.astype(float), 'miles_val': miles.astype(float),
+        'price_val': np.exp(10.3 - 0.07 * (2025 - years) - 0.003 * miles / 1000),
+        'title': [f'{year} Toyota Camry LE' for year in years],
+    })
+    df = price_model.add_segments(df)
+    return price_model.refit(price_model.new_model(2025), price_model.segment_stats(df, 2025))
+
+
+def test_price_drops_only_keeps_lower_prices():
+    same = dict(RECORD, listing_id=2, price='$9,000')
+    unknown = dict(RECORD, listing_id=3)
+    drops = price_drops.price_drops([RECORD, same, unknown], {**PREVIOUS, 2: ('$9,000', 'x')})
+    assert [drop['listing_id'] for drop in drops] == [1]
+    assert drops[0]['drop'] == 4000
+
+
+def test_detect_alerts_when_the_drop_crosses_the_threshold():
+    deals = price_drops.detect([RECORD], PREVIOUS, fitted_model(), threshold=-1500)
+    assert [deal['listing_id'] for deal in deals] == [1]
+    assert deals[0]['residual'] <= -1500
+
+
+def test_detect_without_a_model():
+    assert price_drops.detect([RECORD], PREVIOUS, None) == []
+
+
+def test_detect_with_a_model_without_global_segment():
+    # What regression.update_model saves while there are too few listings.
+    model = price_model.new_model(2025)
+    assert price_drops.detect([RECORD], PREVIOUS, model) == []
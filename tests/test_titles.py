@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+import titles
+
+
+def old_filter_by_make(title: str) -> bool:
+    """The substring check the Honda/Toyota crawler used before titles.py."""
+    title = title.lower()
+    return 'honda' in title or 'toyota' in title
+
+
+PARITY_TITLES = [
+    '2021 Toyota corolla L Sedan 4D',
+    '2015 Honda CR-V EX-L Sport Utility 4D',
+    '2008 honda accord',
+    'Honda Civic 2015',
+    'HONDA ACCORD EX-L 2008',
+    'Toyota 2015 Camry',
+    'Toyota Tacoma TRD Off Road 2019',
+    '2005 Honda',
+    'Looking for a honda',
+    '2012 Ford f150 super cab XLT Pickup 4D',
+    '2014 Chevy Silverado 1500 LT',
+    'Nissan Altima 2013',
+    '2005 Saab 9-3 Aero',
+]
+
+
+@pytest.mark.parametrize('title', PARITY_TITLES)
+def test_default_filter_matches_old_make_check(title):
+    vehicle_filter = titles.VehicleFilter(makes=['honda', 'toyota'])
+    assert vehicle_filter.matches([{'title': title}]) == [old_filter_by_make(title)]
+
+
+@pytest.mark.parametrize('title, expected', [
+    ('2021 Toyota corolla L Sedan 4D', (2021, 'toyota', 'corolla', 'l', 'sedan')),
+    ('2015 Honda CR-V EX-L Sport Utility 4D', (2015, 'honda', 'cr-v', 'ex-l', 'suv')),
+    ('2012 Ford f150 super cab XLT Pickup 4D', (2012, 'ford', 'f-150', 'xlt', 'pickup')),
+    ('Honda Civic 2015', (2015, 'honda', 'civic', None, None)),
+    ('HONDA ACCORD EX-L 2008', (2008, 'honda', 'accord', 'ex-l', None)),
+    ('Toyota 2015 Camry', (2015, 'toyota', 'camry', None, None)),
+    ('2012 Camry LE', (2012, 'toyota', 'camry', 'le', None)),
+    ('2005 Saab 9-3 Aero', (2005, 'saab', '9-3', None, None)),
+])
+def test_parse_title(title, expected):
+    parsed = titles.parse_title(title)
+    assert tuple(parsed[column] for column in titles.COLUMNS) == expected
+
+
+def test_parse_titles_keeps_index_and_missing_titles():
+    parsed = titles.parse_titles(pd.Series(['2015 Ram 1500', None, '2015 Ram 1500'], index=[7, 8, 9]))
+    assert list(parsed.index) == [7, 8, 9]
+    assert parsed.loc[[7, 9], 'make'].tolist() == ['ram', 'ram']
+    assert parsed.loc[8].isna().all()
+
+
+def test_filter_resolves_aliases_and_years():
+    vehicle_filter = titles.VehicleFilter(makes=['Chevy'], models=['silverado'], min_year=2010)
+    records = [{'title': '2014 Chevrolet Silverado 1500 LT'}, {'title': '2008 Chevy Silverado'},
+               {'name': '2014 Chevy Malibu'}]
+    assert vehicle_filter.matches(records) == [True, False, False]
@@ -0,0 +1,329 @@
+"""
+Vehicle titles: year, make, model, trim and body style.
+
+Marketplace vehicle titles mostly follow "<year> <make> <model> <trim>
+<body> <doors>", e.g. "2021 Toyota corolla L Sedan 4D" -> 2021, toyota,
+corolla, l, sedan. Makes, models and body styles are looked up in a token
+trie compiled once from MAKES, MODELS and BODY_STYLES, aliases included
+("chevy", "crv", "f150", "crew cab"), with the longest match winning, so
+"grand cherokee" beats "grand" and "cr v" is a CR-V. A model the
+dictionary only knows under one make also gives the make ("2012 Camry
+LE"), and titles that put the year last ("Honda Civic 2015") are read
+too. Makes and models missing from the dictionary fall back to the words
+after the year, so every title gets the make/model segment it used to.
+
+`parse_titles` parses the distinct titles of a Series once each and
+returns a DataFrame; `VehicleFilter` turns make/model/year/body predicates
+into one vectorized mask over a batch of records.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['year', 'make', 'model', 'trim', 'body']
+
+# canonical make: aliases, '|'-separated
+MAKES = {
+    'acura': 'acura', 'alfa-romeo': 'alfa romeo|alfa', 'audi': 'audi', 'bmw': 'bmw', 'buick': 'buick',
+    'cadillac': 'cadillac', 'chevrolet': 'chevrolet|chevy|chev', 'chrysler': 'chrysler', 'dodge': 'dodge',
+    'fiat': 'fiat', 'ford': 'ford', 'genesis': 'genesis', 'gmc': 'gmc', 'honda': 'honda', 'hyundai': 'hyundai',
+    'infiniti': 'infiniti', 'jaguar': 'jaguar', 'jeep': 'jeep', 'kia': 'kia',
+    'land-rover': 'land rover|landrover', 'lexus': 'lexus', 'lincoln': 'lincoln', 'mazda': 'mazda',
+    'mercedes-benz': 'mercedes benz|mercedes|benz|mb', 'mini': 'mini', 'mitsubishi': 'mitsubishi',
+    'nissan': 'nissan', 'pontiac': 'pontiac', 'porsche': 'porsche', 'ram': 'ram', 'saturn': 'saturn',
+    'scion': 'scion', 'subaru': 'subaru', 'tesla': 'tesla', 'toyota': 'toyota', 'volkswagen': 'volkswagen|vw',
+    'volvo': 'volvo',
+}
+
+# make: models, each '|'-separated with the canonical name first
+MODELS = {
+    'acura': ['mdx', 'rdx', 'tlx', 'tl', 'tsx', 'ilx', 'rsx', 'integra'],
+    'audi': ['a3', 'a4', 'a5', 'a6', 'q3', 'q5', 'q7'],
+    'bmw': ['3 series|3-series', '5 series|5-series', 'x1', 'x3', 'x5'],
+    'buick': ['enclave', 'encore', 'lacrosse', 'regal', 'lesabre'],
+    'cadillac': ['escalade', 'cts', 'srx', 'xt5'],
+    'chevrolet': ['silverado 1500|silverado', 'silverado 2500|silverado 2500hd', 'colorado', 'tahoe', 'suburban',
+                  'equinox', 'traverse', 'malibu', 'impala', 'cruze', 'camaro', 'corvette', 'trailblazer', 'sonic',
+                  'spark', 'express', 'avalanche', 'blazer'],
+    'chrysler': ['town & country|town and country|town country', '200', '300', 'pacifica', 'pt cruiser'],
+    'dodge': ['ram 1500|ram', 'ram 2500', 'grand caravan', 'caravan', 'charger', 'challenger', 'durango', 'journey',
+              'dart', 'dakota', 'avenger'],
+    'ford': ['f-150|f150|f 150', 'f-250|f250|f 250|f-250 super duty', 'f-350|f350|f 350', 'ranger', 'explorer',
+             'escape', 'edge', 'expedition', 'fusion', 'focus', 'fiesta', 'mustang', 'taurus', 'transit',
+             'e-series|econoline', 'bronco', 'flex', 'maverick'],
+    'gmc': ['sierra 1500|sierra', 'sierra 2500|sierra 2500hd', 'yukon', 'acadia', 'terrain', 'canyon', 'savana'],
+    'honda': ['accord', 'civic', 'cr-v|crv', 'hr-v|hrv', 'pilot', 'odyssey', 'fit', 'ridgeline', 'element',
+              'passport', 'insight', 'crosstour'],
+    'hyundai': ['elantra', 'sonata', 'santa fe', 'tucson', 'accent', 'kona', 'veloster', 'palisade'],
+    'infiniti': ['g35', 'g37', 'q50', 'qx60', 'fx35'],
+    'jeep': ['grand cherokee', 'cherokee', 'wrangler unlimited', 'wrangler', 'liberty', 'compass', 'patriot',
+             'renegade', 'gladiator'],
+    'kia': ['optima', 'sorento', 'sportage', 'soul', 'forte', 'rio', 'sedona', 'telluride'],
+    'land-rover': ['range rover sport', 'range rover', 'discovery', 'lr4'],
+    'lexus': ['rx 350|rx350|rx', 'es 350|es350|es', 'is 250|is250', 'gx 460|gx460|gx', 'ls 460|ls460'],
+    'lincoln': ['mkz', 'mkx', 'navigator', 'town car'],
+    'mazda': ['mazda3|3', 'mazda6|6', 'cx-5|cx5', 'cx-9|cx9', 'mx-5 miata|miata|mx-5|mx5'],
+    'mercedes-benz': ['c-class|c class', 'e-class|e class', 'gl-class|gl class', 'm-class|m class'],
+    'mini': ['cooper'],
+    'mitsubishi': ['outlander', 'lancer', 'eclipse', 'mirage', 'galant'],
+    'nissan': ['altima', 'sentra', 'maxima', 'rogue', 'pathfinder', 'frontier', 'titan', 'murano', 'versa', 'leaf',
+               'xterra', 'armada', 'quest', '350z'],
+    'pontiac': ['g6', 'grand prix', 'vibe'],
+    'ram': ['1500', '2500', '3500', 'promaster'],
+    'saturn': ['vue', 'ion', 'outlook'],
+    'scion': ['tc', 'xb', 'xd', 'fr-s|frs'],
+    'subaru': ['outback', 'forester', 'impreza', 'legacy', 'crosstrek|xv crosstrek', 'wrx', 'ascent'],
+    'tesla': ['model 3', 'model s', 'model x', 'model y'],
+    'toyota': ['camry', 'corolla', 'rav4|rav 4|rav-4', 'tacoma', 'tundra', '4runner|4 runner', 'highlander',
+               'sienna', 'prius', 'avalon', 'sequoia', 'land cruiser', 'fj cruiser', 'yaris', 'matrix', 'venza',
+               'c-hr|chr', 'celica', 'solara'],
+    'volkswagen': ['jetta', 'passat', 'golf', 'gti', 'beetle', 'tiguan', 'atlas'],
+    'volvo': ['xc90', 'xc60', 's60', 'v70'],
+}
+
+BODY_STYLES = {
+    'sedan': 'sedan|saloon',
+    'coupe': 'coupe',
+    'hatchback': 'hatchback|hatch',
+    'wagon': 'wagon|estate',
+    'convertible': 'convertible|cabriolet|roadster',
+    'suv': 'suv|sport utility|crossover',
+    'pickup': 'pickup|pickup truck|truck|crew cab|crewmax|supercrew|super crew|supercab|super cab|double cab|'
+              'quad cab|extended cab|access cab|regular cab|king cab',
+    'van': 'van|minivan|mini van|passenger van|cargo van',
+}
+
+MAX_TRIM_WORDS = 3
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+_YEAR_RE = re.compile(r'^(?:19|20)\d{2}$')
+_DOORS_RE = re.compile(r'^\d(?:d|dr|-?doors?)$', re.IGNORECASE)
+_END = None  # trie key of a match's value
+
+
+def _tokens(text: str) -> tuple:
+    return tuple(_TOKEN_RE.findall(text.lower()))
+
+
+def _add(trie: dict, phrase: str, value):
+    node = trie
+    for token in _tokens(phrase):
+        node = node.setdefault(token, {})
+    node.setdefault(_END, value)
+
+
+def _compile(entries) -> dict:
+    """A token trie of (aliases, value) entries; aliases are '|'-separated phrases."""
+    trie = {}
+    for aliases, value in entries:
+        for phrase in aliases.split('|'):
+            _add(trie, phrase, value)
+    return trie
+
+
+def _unique_models() -> dict:
+    """A trie of the model names only one make uses, to (make, model)."""
+    makes = {}
+    for make, models in MODELS.items():
+        for aliases in models:
+            for phrase in aliases.split('|'):
+                makes.setdefault(_tokens(phrase), set()).add((make, aliases.split('|')[0]))
+    trie = {}
+    for tokens, matches in makes.items():
+        # bare numbers ("3", "1500") say nothing without a make
+        if len(matches) == 1 and not tokens[0].isdigit():
+            _add(trie, ' '.join(tokens), matches.pop())
+    return trie
+
+
+_MAKE_TRIE = _compile((aliases, make) for make, aliases in MAKES.items())
+_MODEL_TRIES = {make: _compile((aliases, aliases.split('|')[0]) for aliases in models)
+                for make, models in MODELS.items()}
+_ANY_MODEL_TRIE = _unique_models()
+_BODY_TRIE = _compile((aliases, body) for body, aliases in BODY_STYLES.items())
+
+
+def _longest(trie: dict, tokens: tuple, start: int):
+    """(end, value) of the longest phrase of `trie` starting at tokens[start], or None."""
+    node, match = trie, None
+    for i in range(start, len(tokens)):
+        node = node.get(tokens[i])
+        if node is None:
+            break
+        if _END in node:
+            match = (i + 1, node[_END])
+    return match
+
+
+def _scan(trie: dict, tokens: tuple, start: int = 0):
+    """(start, end, value) of the first phrase of `trie` at or after `start`, or None."""
+    for i in range(start, len(tokens)):
+        match = _longest(trie, tokens, i)
+        if match is not None:
+            return (i,) + match
+    return None
+
+
+def _lookup(tries: list, name: str) -> str:
+    """The value of the first trie that has all of `name` as a phrase, else `name`."""
+    tokens = _tokens(name)
+    for trie in tries:
+        match = _longest(trie, tokens, 0)
+        if match is not None and match[0] == len(tokens):
+            return match[1]
+    return name
+
+
+def _word(word: str):
+    word = word.lower().strip('.,;:!?()[]"\'')
+    return word if word[:1].isalnum() else None
+
+
+def parse_title(title: str) -> dict:
+    """Year, make, model, trim and body style of one title; None for the parts not found."""
+    parsed = dict.fromkeys(COLUMNS)
+    if not isinstance(title, str):
+        return parsed
+    words = title.split()
+    tokens, word_of = [], []
+    for index, word in enumerate(words):
+        for token in _tokens(word):
+            tokens.append(token)
+            word_of.append(index)
+    tokens = tuple(tokens)
+
+    year_at = next((i for i, token in enumerate(tokens) if _YEAR_RE.match(token)), None)
+    start = 0 if year_at is None else year_at + 1
+    if year_at is not None:
+        parsed['year'] = int(tokens[year_at])
+
+    # The make usually follows the year; "Honda Civic 2015" puts it first.
+    make = _scan(_MAKE_TRIE, tokens, start) or (start and _scan(_MAKE_TRIE, tokens)) or None
+    model = None
+    if make is not None:
+        parsed['make'] = make[2]
+        model_at = make[1] + (make[1] == year_at)  # "Toyota 2015 Camry"
+        model = _longest(_MODEL_TRIES.get(make[2], {}), tokens, model_at)
+        model = model and (model_at,) + model
+    else:
+        model = _scan(_ANY_MODEL_TRIE, tokens, start) or (start and _scan(_ANY_MODEL_TRIE, tokens)) or None
+        if model is not None:
+            parsed['make'], model = model[2][0], model[:2] + (model[2][1],)
+        elif year_at is not None and word_of[year_at] + 1 < len(words):
+            # Not in the dictionary: the two words after the year, as before.
+            after = word_of[year_at] + 1
+            make_word = _word(words[after])
+            if make_word and make_word[0].isalpha():
+                parsed['make'] = make_word
+                if after + 1 < len(words):
+                    parsed['model'] = _word(words[after + 1])
+            return parsed
+
+    if model is not None:
+        parsed['model'] = model[2]
+        rest = word_of[model[1] - 1] + 1
+    elif make is not None:
+        rest = _skip_year(words, word_of[make[1] - 1] + 1)
+        if rest < len(words):
+            parsed['model'] = _word(words[rest])
+            rest += 1
+    else:
+        return parsed
+
+    rest = _skip_year(words, rest)
+    body = _scan(_BODY_TRIE, tokens, _first_token(word_of, rest))
+    if body is not None:
+        parsed['body'] = body[2]
+    end = _trim_end(words, word_of, body, rest)
+    if end == rest and body is not None:
+        # "f150 super cab XLT Pickup 4D": the trim follows a cab style
+        rest = word_of[body[1] - 1] + 1
+        end = _trim_end(words, word_of, _scan(_BODY_TRIE, tokens, body[1]), rest)
+    trim = words[rest:end]
+    if end < len(words):
+        if 1 <= len(trim) <= MAX_TRIM_WORDS:
+            parsed['trim'] = ' '.join(trim).lower()
+    elif trim and trim[0].isupper() and len(trim[0]) <= 6:
+        # Nothing ends it: only a short all-caps word such as "LE" or "EX-L".
+        parsed['trim'] = trim[0].lower()
+    return parsed
+
+
+def _skip_year(words: list, index: int) -> int:
+    """`index`, or the word after it when that word is the year."""
+    return index + 1 if index < len(words) and _YEAR_RE.match(words[index]) else index
+
+
+def _first_token(word_of: list, word: int) -> int:
+    return next((i for i, index in enumerate(word_of) if index >= word), len(word_of))
+
+
+def _trim_end(words: list, word_of: list, body, rest: int) -> int:
+    """The word that ends a trim starting at `rest`: the body style, door count or a trailing year."""
+    end = next((index for index in range(rest, len(words))
+                if _DOORS_RE.match(words[index]) or _YEAR_RE.match(words[index])), len(words))
+    return end if body is None else min(end, word_of[body[0]])
+
+
+def parse_titles(titles: pd.Series) -> pd.DataFrame:
+    """
+    `parse_title` over a Series, one parse per distinct title: a DataFrame
+    with COLUMNS on the same index, NaN where a part was not found.
+    """
+    values = pd.Series(titles)
+    codes, uniques = pd.factorize(values)
+    parsed = pd.DataFrame([parse_title(title) for title in uniques] + [dict.fromkeys(COLUMNS)],
+                          columns=COLUMNS, dtype=object)
+    # factorize codes missing titles as -1, which picks the empty last row
+    result = parsed.iloc[codes].set_axis(values.index)
+    result = result.where(result.notna(), np.nan)
+    result['year'] = result['year'].astype(float)
+    return result
+
+
+class VehicleFilter:
+    """
+    Crawl-time predicate on what a title describes. Every given condition
+    must hold: the make is one of `makes`, the model one of `models`, the
+    year within [min_year, max_year], the body style one of `bodies`, and
+    `where(parsed)` (a boolean mask over `parse_titles` output) for anything
+    else. Names are compared after alias resolution, so "chevy" matches
+    chevrolet.
+    """
+
+    def __init__(self, makes=None, models=None, min_year: int = None, max_year: int = None, bodies=None,
+                 where=None):
+        self.makes = self._names(makes, [_MAKE_TRIE])
+        self.models = self._names(models, list(_MODEL_TRIES.values()))
+        self.min_year = min_year
+        self.max_year = max_year
+        self.bodies = self._names(bodies, [_BODY_TRIE])
+        self.where = where
+
+    @staticmethod
+    def _names(names, tries: list):
+        """The canonical names of `names` ("chevy" -> "chevrolet"), None when empty."""
+        if not names:
+            return None
+        return {_lookup(tries, name.strip().lower()) for name in names}
+
+    def mask(self, parsed: pd.DataFrame) -> np.ndarray:
+        keep = np.ones(len(parsed), dtype=bool)
+        for column, allowed in (('make', self.makes), ('model', self.models), ('body', self.bodies)):
+            if allowed is not None:
+                keep &= parsed[column].isin(allowed).to_numpy()
+        if self.min_year is not None:
+            keep &= (parsed['year'] >= self.min_year).to_numpy()
+        if self.max_year is not None:
+            keep &= (parsed['year'] <= self.max_year).to_numpy()
+        if self.where is not None:
+            keep &= np.asarray(self.where(parsed), dtype=bool)
+        return keep
+
+    def matches(self, records: list) -> list:
+        """Per record, whether its title passes; all titles are parsed in one batch."""
+        if not records:
+            return []
+        titles = pd.Series([rec.get('title') or rec.get('name') for rec in records], dtype=object)
+        return self.mask(parse_titles(titles)).tolist()